@@ -131,11 +131,14 @@ class ContainersController(controllers.ACLMixin):
     def on_get(self, project_id, **kw):
         LOG.debug('Start containers on_get for project-ID %s:', project_id)
 
+        total_mode = repo.clean_total_mode(kw.get('total'))
         result = self.container_repo.get_by_create_date(
             project_id,
             offset_arg=kw.get('offset', 0),
             limit_arg=kw.get('limit', None),
-            suppress_exception=True
+            suppress_exception=True,
+            marker_arg=kw.get('marker'),
+            total_arg=total_mode
         )
 
         containers, offset, limit, total = result
@@ -157,10 +160,14 @@ class ContainersController(controllers.ACLMixin):
                 offset,
                 limit,
                 total,
-                {'containers': resp_ctrs}
+                {'containers': resp_ctrs},
+                marker=repo.encode_paging_marker(containers[-1])
             )
             resp_ctrs_overall.update({'total': total})
 
+        if total_mode == repo.TOTAL_NONE:
+            del resp_ctrs_overall['total']
+
         LOG.info(u._LI('Retrieved container list for project: %s'), project_id)
         return resp_ctrs_overall
 
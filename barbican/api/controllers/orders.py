@@ -156,9 +156,11 @@ class OrdersController(controllers.ACLMixin):
         LOG.debug('Start orders on_get '
                   'for project-ID %s:', external_project_id)
 
+        total_mode = repo.clean_total_mode(kw.get('total'))
         result = self.order_repo.get_by_create_date(
             external_project_id, offset_arg=kw.get('offset', 0),
-            limit_arg=kw.get('limit', None), suppress_exception=True)
+            limit_arg=kw.get('limit', None), suppress_exception=True,
+            marker_arg=kw.get('marker'), total_arg=total_mode)
         orders, offset, limit, total = result
 
         if not orders:
@@ -169,11 +171,15 @@ class OrdersController(controllers.ACLMixin):
                 hrefs.convert_to_hrefs(o.to_dict_fields())
                 for o in orders
             ]
-            orders_resp_overall = hrefs.add_nav_hrefs('orders',
-                                                      offset, limit, total,
-                                                      {'orders': orders_resp})
+            orders_resp_overall = hrefs.add_nav_hrefs(
+                'orders', offset, limit, total,
+                {'orders': orders_resp},
+                marker=repo.encode_paging_marker(orders[-1]))
             orders_resp_overall.update({'total': total})
 
+        if total_mode == repo.TOTAL_NONE:
+            del orders_resp_overall['total']
+
         return orders_resp_overall
 
     @index.when(method='PUT', template='json')
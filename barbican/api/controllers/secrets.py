@@ -64,10 +64,20 @@ class SecretController(controllers.ACLMixin):
 
     def get_acl_tuple(self, req, **kwargs):
         d = self.get_acl_dict_for_user(req, self.secret.secret_acls)
-        d['project_id'] = self.secret.project_assocs[0].projects.external_id
+        d['project_id'] = self._get_secret_project().external_id
         d['creator_id'] = self.secret.creator_id
         return 'secret', d
 
+    def _get_secret_project(self):
+        # The project is usually loaded along with the secret, but secrets
+        # stored before it was recorded on them only reference it through
+        # their project association.
+        if self.secret.project is not None:
+            return self.secret.project
+        external_project_id = (
+            self.secret.project_assocs[0].projects.external_id)
+        return res.get_or_create_project(external_project_id)
+
     @pecan.expose()
     def _lookup(self, sub_resource, *remainder):
         if sub_resource == 'acls':
@@ -124,8 +134,7 @@ class SecretController(controllers.ACLMixin):
         # project associated with secret. The lookup project_id needs to be
         # derived from the secret's data considering authorization is already
         # done.
-        external_project_id = secret.project_assocs[0].projects.external_id
-        project = res.get_or_create_project(external_project_id)
+        project = self._get_secret_project()
 
         pecan.override_template('', pecan.request.accept.header_value)
 
@@ -217,6 +226,149 @@ class SecretController(controllers.ACLMixin):
         LOG.info(u._LI('Deleted secret for project: %s'), external_project_id)
 
 
+class SecretPayloadsController(controllers.ACLMixin):
+    """Handles bulk Secret payload retrieval requests."""
+
+    def __init__(self):
+        LOG.debug('Creating SecretPayloadsController')
+        self.validator = validators.SecretRefsValidator()
+        self.secret_repo = repo.get_secret_repository()
+
+    @pecan.expose(generic=True)
+    def index(self, **kwargs):
+        pecan.abort(405)  # HTTP 405 Method Not Allowed as default
+
+    @index.when(method='POST', template='json')
+    @controllers.handle_exceptions(u._('Secret payloads retrieval'))
+    @controllers.enforce_rbac('secrets:get')
+    @controllers.enforce_content_types(['application/json'])
+    def on_post(self, external_project_id, **kwargs):
+        """Retrieves the payloads of the referenced secrets.
+
+        Each secret is authorized as for a payload GET of it on its own, and
+        its payload, or the error retrieving it, is returned in the order of
+        the requested refs. Payloads are returned as stored, base64 encoded,
+        along with their content type. Transport key wrapping is not
+        supported.
+        """
+        data = api.load_body(pecan.request, validator=self.validator)
+        secret_refs = data['secret_refs']
+        secret_ids = [hrefs.get_secret_id_from_ref(secret_ref)
+                      for secret_ref in secret_refs]
+
+        secrets = self.secret_repo.get_secrets_for_retrieval(secret_ids)
+
+        resp_items = [None] * len(secret_refs)
+        authorized = []  # The index and controller of authorized secrets.
+        ctxt = controllers._get_barbican_context(pecan.request)
+        for index, secret_id in enumerate(secret_ids):
+            secret = secrets.get(secret_id)
+            if secret is None:
+                resp_items[index] = _secret_payload_error(
+                    secret_refs[index], 404,
+                    u._('Not Found. Sorry but your secret is in another '
+                        'castle.'))
+                continue
+
+            secret_controller = SecretController(secret)
+            try:
+                controllers._do_enforce_rbac(secret_controller, pecan.request,
+                                             'secret:decrypt', ctxt)
+                authorized.append(
+                    (index, secret_controller,
+                     secret_controller._get_secret_project()))
+            except Exception as e:
+                resp_items[index] = _secret_payload_exception_error(
+                    secret_refs[index], e)
+
+        if authorized:
+            indexes, secret_controllers, projects = zip(*authorized)
+            results = plugin.get_secrets(
+                [c.secret for c in secret_controllers], projects)
+            for index, result in zip(indexes, results):
+                if isinstance(result, Exception):
+                    resp_items[index] = _secret_payload_exception_error(
+                        secret_refs[index], result)
+                else:
+                    resp_items[index] = {
+                        'secret_ref': secret_refs[index],
+                        'payload': result.secret,
+                        'payload_content_type': result.content_type,
+                        'payload_content_encoding': 'base64'
+                    }
+
+        LOG.info(u._LI('Retrieved %(count)s secret payloads for project: '
+                       '%(project)s'),
+                 {'count': len(authorized), 'project': external_project_id})
+        return {'secrets': resp_items}
+
+
+def _secret_payload_error(secret_ref, status, message):
+    return {'secret_ref': secret_ref,
+            'error': {'code': status, 'description': message}}
+
+
+def _secret_payload_exception_error(secret_ref, excep):
+    status, message = api.generate_safe_exception_message(
+        u._('Secret payload retrieval'), excep)
+    LOG.error(u._LE('%(message)s (secret ref: %(secret_ref)s): %(error)s'),
+              {'message': message, 'secret_ref': secret_ref, 'error': excep})
+    return _secret_payload_error(secret_ref, status, message)
+
+
+class SecretsBulkController(controllers.ACLMixin):
+    """Handles bulk Secret creation requests."""
+
+    def __init__(self):
+        LOG.debug('Creating SecretsBulkController')
+        self.validator = validators.NewSecretsValidator()
+
+    @pecan.expose(generic=True)
+    def index(self, **kwargs):
+        pecan.abort(405)  # HTTP 405 Method Not Allowed as default
+
+    @index.when(method='POST', template='json')
+    @controllers.handle_exceptions(u._('Secrets creation'))
+    @controllers.enforce_rbac('secrets:post')
+    @controllers.enforce_content_types(['application/json'])
+    def on_post(self, external_project_id, **kwargs):
+        """Creates the given secrets, in one database transaction.
+
+        Each secret is given as for a single secret creation, except that
+        transport keys are not supported. The refs of the created secrets
+        are returned in the same order. Secrets stored in their own backend
+        by a failed request are only deleted from it on a best effort basis
+        (see plugin.resources.store_secrets()).
+        """
+        LOG.debug('Start bulk on_post for project-ID %s:...',
+                  external_project_id)
+
+        data = api.load_body(pecan.request, validator=self.validator)
+        project = res.get_or_create_project(external_project_id)
+
+        ctxt = controllers._get_barbican_context(pecan.request)
+        new_secrets = []
+        for secret_data in data['secrets']:
+            if ctxt:  # in authenticated pipleline case, use auth token user
+                secret_data['creator_id'] = ctxt.user
+            new_secrets.append((
+                models.Secret(secret_data),
+                secret_data.get('payload'),
+                secret_data.get('payload_content_type',
+                                'application/octet-stream'),
+                secret_data.get('payload_content_encoding')))
+
+        new_secret_models = plugin.store_secrets(new_secrets, project)
+
+        pecan.response.status = 201
+
+        LOG.info(u._LI('Created %(count)s secrets for project: %(project)s'),
+                 {'count': len(new_secret_models),
+                  'project': external_project_id})
+        return {'secret_refs': [hrefs.convert_secret_to_href(s.id)
+                                for s in new_secret_models]}
+
+
 class SecretsController(controllers.ACLMixin):
     """Handles Secret creation requests."""
 
@@ -224,6 +376,8 @@ class SecretsController(controllers.ACLMixin):
         LOG.debug('Creating SecretsController')
         self.validator = validators.NewSecretValidator()
         self.secret_repo = repo.get_secret_repository()
+        self.payloads = SecretPayloadsController()
+        self.bulk = SecretsBulkController()
 
     @pecan.expose()
     def _lookup(self, secret_id, *remainder):
@@ -233,7 +387,7 @@ class SecretsController(controllers.ACLMixin):
         # previously successful.
         controllers.assert_is_valid_uuid_from_uri(secret_id)
 
-        secret = self.secret_repo.get_secret_by_id(
+        secret = self.secret_repo.get_secret_for_retrieval(
             entity_id=secret_id, suppress_exception=True)
         if not secret:
             _secret_not_found()
@@ -258,6 +412,10 @@ class SecretsController(controllers.ACLMixin):
         if name:
             name = urllib.unquote_plus(name)
 
+        name_prefix = kw.get('name_prefix', '')
+        if name_prefix:
+            name_prefix = urllib.unquote_plus(name_prefix)
+
         bits = kw.get('bits', 0)
         try:
             bits = int(bits)
@@ -266,15 +424,19 @@ class SecretsController(controllers.ACLMixin):
             # the default should be used.
             bits = 0
 
+        total_mode = repo.clean_total_mode(kw.get('total'))
         result = self.secret_repo.get_by_create_date(
             external_project_id,
             offset_arg=kw.get('offset', 0),
             limit_arg=kw.get('limit', None),
             name=name,
+            name_prefix=name_prefix,
             alg=kw.get('alg'),
             mode=kw.get('mode'),
             bits=bits,
-            suppress_exception=True
+            suppress_exception=True,
+            marker_arg=kw.get('marker'),
+            total_arg=total_mode
         )
 
         secrets, offset, limit, total = result
@@ -289,10 +451,14 @@ class SecretsController(controllers.ACLMixin):
             ]
             secrets_resp_overall = hrefs.add_nav_hrefs(
                 'secrets', offset, limit, total,
-                {'secrets': secrets_resp}
+                {'secrets': secrets_resp},
+                marker=repo.encode_paging_marker(secrets[-1])
             )
             secrets_resp_overall.update({'total': total})
 
+        if total_mode == repo.TOTAL_NONE:
+            del secrets_resp_overall['total']
+
         LOG.info(u._LI('Retrieved secret list for project: %s'),
                  external_project_id)
         return secrets_resp_overall
@@ -18,6 +18,8 @@ import webob
 from barbican.model import repositories
 from barbican.openstack.common import jsonutils
 
+QUERY_STATS_KEY = 'barbican.query_stats'
+
 
 class JSONErrorHook(pecan.hooks.PecanHook):
     def on_error(self, state, exc):
@@ -41,3 +43,44 @@ class BarbicanTransactionHook(pecan.hooks.TransactionHook):
             rollback=repositories.rollback,
             clear=repositories.clear
         )
+
+    def on_route(self, state):
+        """Starts the request's database session before it is routed.
+
+        Read-only requests that can tolerate slightly stale data, namely
+        listings and metadata retrievals, may be served by a read replica.
+        Secret payloads are read from the primary database, as clients
+        commonly retrieve them right after storing them.
+
+        The replica is chosen, and checked to be reachable, when the session
+        starts. A replica that fails later on fails the request rather than
+        being retried against the primary database.
+
+        Statistics on the request's database queries are collected in the
+        request environ's 'barbican.query_stats' entry.
+        """
+        state.request.error = False
+        state.request.environ[QUERY_STATS_KEY] = (
+            repositories.start_query_stats())
+        if self.is_transactional(state):
+            state.request.transactional = True
+            self.start()
+        else:
+            state.request.transactional = False
+            repositories.start_read_only(
+                use_replica=self._is_replica_safe(state.request))
+
+    def after(self, state):
+        try:
+            super(BarbicanTransactionHook, self).after(state)
+        finally:
+            stats = state.request.environ.get(QUERY_STATS_KEY)
+            if stats is not None:
+                repositories.stop_query_stats(stats)
+
+    def _is_replica_safe(self, request):
+        if request.path.rstrip('/').endswith('/payload'):
+            return False
+        # Secret payloads are also retrieved via non-JSON accept types.
+        return (not request.accept
+                or request.accept.header_value in ('application/json', '*/*'))
@@ -16,6 +16,7 @@ import uuid
 
 import webob.exc
 
+from barbican.api import hooks
 from barbican.api import middleware as mw
 from barbican.common import config
 from barbican.common import utils
@@ -34,8 +35,16 @@ class BaseContextMiddleware(mw.Middleware):
 
         resp.headers['x-openstack-request-id'] = request_id
 
-        LOG.info('%s | %s: %s - %s %s', request_id, u._LI('Processed request'),
-                 resp.status, resp.request.method, resp.request.url)
+        stats = resp.request.environ.get(hooks.QUERY_STATS_KEY)
+        if stats is None:
+            LOG.info('%s | %s: %s - %s %s', request_id,
+                     u._LI('Processed request'), resp.status,
+                     resp.request.method, resp.request.url)
+        else:
+            LOG.info('%s | %s: %s - %s %s | queries: %d (%d duplicate), '
+                     '%.1f ms', request_id, u._LI('Processed request'),
+                     resp.status, resp.request.method, resp.request.url,
+                     stats.count, stats.duplicates, stats.duration * 1000)
         return resp
 
 
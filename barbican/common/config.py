@@ -28,6 +28,7 @@ import barbican.version
 
 MAX_BYTES_REQUEST_INPUT_ACCEPTED = 15000
 DEFAULT_MAX_SECRET_BYTES = 10000
+DEFAULT_MAX_SECRETS_PER_BULK_REQUEST = 100
 KS_NOTIFICATIONS_GRP_NAME = 'keystone_notifications'
 
 help_for_backdoor_port = (
@@ -54,6 +55,10 @@ common_opts = [
                default=MAX_BYTES_REQUEST_INPUT_ACCEPTED),
     cfg.IntOpt('max_allowed_secret_in_bytes',
                default=DEFAULT_MAX_SECRET_BYTES),
+    cfg.IntOpt('max_secrets_per_bulk_request',
+               default=DEFAULT_MAX_SECRETS_PER_BULK_REQUEST,
+               help=u._('Maximum number of secrets that a single bulk '
+                        'secret request may refer to or create.')),
 ]
 
 host_opts = [
@@ -65,6 +70,24 @@ db_opts = [
     cfg.IntOpt('sql_idle_timeout', default=3600),
     cfg.IntOpt('sql_max_retries', default=60),
     cfg.IntOpt('sql_retry_interval', default=1),
+    cfg.IntOpt('sql_max_retry_interval', default=10,
+               help=u._('Maximum seconds between database connection '
+                        'retries, which back off exponentially from '
+                        'sql_retry_interval.')),
+    cfg.BoolOpt('sql_pool_pre_ping', default=True,
+                help=u._('Test pooled database connections as they are '
+                         'checked out, replacing those that have been '
+                         'disconnected, such as after a database failover.')),
+    cfg.BoolOpt('sql_query_cache', default=True,
+                help=u._('Compile frequently run lookup queries once per '
+                         'process and reuse them, rather than compiling '
+                         'them again on every request.')),
+    cfg.StrOpt('sql_id_scheme', default='random',
+               choices=['random', 'time_ordered'],
+               help=u._('How the IDs of new rows are generated: random '
+                        '(version 4) UUIDs, or time_ordered (version 7) '
+                        'UUIDs, which are inserted at the end of primary '
+                        'key indexes rather than scattered across them.')),
     cfg.BoolOpt('db_auto_create', default=True),
     cfg.IntOpt('max_limit_paging', default=100),
     cfg.IntOpt('default_limit_paging', default=10),
@@ -72,6 +95,35 @@ db_opts = [
     cfg.BoolOpt('sql_pool_logging', default=False),
     cfg.IntOpt('sql_pool_size', default=None),
     cfg.IntOpt('sql_pool_max_overflow', default=None),
+    cfg.ListOpt('sql_read_connection', default=[],
+                help=u._('SQLAlchemy connection strings of read replicas of '
+                         'the sql_connection database. If set, listings and '
+                         'metadata retrievals are served by one of these.')),
+    cfg.IntOpt('sql_read_retry_interval', default=30,
+               help=u._('Seconds that a read replica which could not be '
+                        'connected to is skipped for, in favor of the other '
+                        'replicas or of the sql_connection database.')),
+    cfg.IntOpt('project_cache_size', default=1000,
+               help=u._('Maximum number of projects cached per process, by '
+                        'their Keystone project ID. Set to 0 to disable the '
+                        'project cache.')),
+    cfg.IntOpt('project_cache_ttl', default=300,
+               help=u._('Seconds a cached project is used before it is '
+                        'looked up in the database again. Only the Keystone '
+                        'listener drops deleted projects from its cache, so '
+                        'API processes may keep using a deleted project for '
+                        'up to this long.')),
+    cfg.IntOpt('kek_cache_size', default=1000,
+               help=u._('Maximum number of projects whose bound KEK data '
+                        'are cached per process. Set to 0 to disable the '
+                        'KEK datum cache.')),
+    cfg.IntOpt('kek_cache_ttl', default=300,
+               help=u._('Seconds cached KEK data are used before they are '
+                        'looked up in the database again.')),
+    cfg.IntOpt('project_cleanup_chunk_size', default=1000,
+               help=u._('Number of rows of each table soft deleted per '
+                        'transaction when cleaning up a deleted Keystone '
+                        'project.')),
 ]
 
 eventlet_backdoor_opts = [
@@ -111,6 +163,17 @@ retry_opts = [
     cfg.FloatOpt(
         'periodic_interval_max_seconds', default=10.0,
         help=u._('Seconds (float) to wait between periodic schedule events')),
+    cfg.FloatOpt(
+        'expiration_sweep_interval_seconds', default=60.0,
+        help=u._('Seconds (float) to wait between sweeps that delete '
+                 'expired secrets. Set to 0 to disable the sweeps.')),
+    cfg.IntOpt(
+        'expiration_sweep_batch_size', default=100,
+        help=u._('Maximum number of expired secrets deleted per sweep.')),
+    cfg.FloatOpt(
+        'expiration_sweep_retry_seconds', default=3600.0,
+        help=u._('Seconds (float) to wait before sweeps retry deleting an '
+                 'expired secret that could not be deleted.')),
 ]
 
 queue_opt_group = cfg.OptGroup(name='queue',
@@ -112,14 +112,18 @@ def convert_to_hrefs(fields):
     return fields
 
 
-def convert_list_to_href(resources_name, offset, limit):
+def convert_list_to_href(resources_name, offset, limit, marker=None):
     """Supports pretty output of paged-list hrefs.
 
     Convert the offset/limit info to a HATEOS-style href
-    suitable for use in a list navigation paging interface.
+    suitable for use in a list navigation paging interface. If a paging
+    marker is provided, it is added to the href as well so that the next
+    page can be retrieved without scanning past the previous rows.
     """
     resource = '{0}?limit={1}&offset={2}'.format(resources_name, limit,
                                                  offset)
+    if marker:
+        resource = '{0}&marker={1}'.format(resource, marker)
     return utils.hostname_for_refs(resource=resource)
 
 
@@ -134,7 +138,7 @@ def previous_href(resources_name, offset, limit):
     return convert_list_to_href(resources_name, offset, limit)
 
 
-def next_href(resources_name, offset, limit):
+def next_href(resources_name, offset, limit, marker=None):
     """Supports pretty output of next-page hrefs.
 
     Create a HATEOS-style 'next' href suitable for use in a list
@@ -142,17 +146,19 @@ def next_href(resources_name, offset, limit):
     currently viewed page.
     """
     offset = offset + limit
-    return convert_list_to_href(resources_name, offset, limit)
+    return convert_list_to_href(resources_name, offset, limit, marker)
 
 
 def add_nav_hrefs(resources_name, offset, limit,
-                  total_elements, data):
+                  total_elements, data, marker=None):
     """Adds next and/or previous hrefs to paged list responses.
 
     :param resources_name: Name of api resource
     :param offset: Element number (ie. index) where current page starts
     :param limit: Max amount of elements listed on current page
     :param num_elements: Total number of elements
+    :param marker: Optional paging marker for the last element of the
+                   current page, added to the 'next' href
     :returns: augmented dictionary with next and/or previous hrefs
     """
     if offset > 0:
@@ -162,7 +168,8 @@ def add_nav_hrefs(resources_name, offset, limit,
     if total_elements > (offset + limit):
         data.update({'next': next_href(resources_name,
                                        offset,
-                                       limit)})
+                                       limit,
+                                       marker)})
     return data
 
 
@@ -182,8 +189,11 @@ def get_container_id_from_ref(container_ref):
 def get_secret_id_from_ref(secret_ref):
     """Parse a secret reference and return the secret ID
 
-    TODO(Dave) Implement this, or make one generic ID from REF function
+    The secret ID is the right-most element of the URL, ignoring any
+    trailing slash.
 
     :param secret_ref: HTTP reference of secret
     :return: a string containing the ID of the secret
     """
+    secret_id = secret_ref.rstrip('/').rsplit('/', 1)[-1]
+    return secret_id
@@ -17,7 +17,6 @@
 Shared business logic.
 """
 from barbican.common import utils
-from barbican.model import models
 from barbican.model import repositories
 
 
@@ -37,8 +36,6 @@ def get_or_create_project(project_id):
                                                        suppress_exception=True)
     if not project:
         LOG.debug('Creating project for %s', project_id)
-        project = models.Project()
-        project.external_id = project_id
-        project.status = models.States.ACTIVE
-        project_repo.create_from(project)
+        project = project_repo.create_or_find_by_external_project_id(
+            project_id)
     return project
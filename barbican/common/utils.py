@@ -19,6 +19,9 @@ Common utilities for Barbican.
 import collections
 import importlib
 import mimetypes
+import random
+import threading
+import time
 import uuid
 
 from oslo_log import log
@@ -30,6 +33,8 @@ from barbican import i18n as u
 
 CONF = config.CONF
 
+_SYSTEM_RANDOM = random.SystemRandom()
+
 
 # Current API version
 API_VERSION = 'v1'
@@ -142,4 +147,93 @@ def get_class_for(module_name, class_name):
 
 
 def generate_uuid():
+    """Returns a new entity ID, as per the sql_id_scheme option."""
+    if CONF.sql_id_scheme == 'time_ordered':
+        return str(generate_time_ordered_uuid())
     return str(uuid.uuid4())
+
+
+def generate_time_ordered_uuid(timestamp=None):
+    """Returns a version 7 UUID, which sorts by its creation time.
+
+    Its first 48 bits are the Unix time in milliseconds, followed by the
+    version and variant bits, and 74 random bits.
+    """
+    if timestamp is None:
+        timestamp = time.time()
+    timestamp_ms = int(timestamp * 1000) & 0xffffffffffff
+
+    value = timestamp_ms << 80
+    value |= 0x7 << 76
+    value |= _SYSTEM_RANDOM.getrandbits(12) << 64
+    value |= 0x2 << 62
+    value |= _SYSTEM_RANDOM.getrandbits(62)
+    return uuid.UUID(int=value)
+
+
+class LRUCache(object):
+    """A thread-safe, size bounded cache with optional entry expiry.
+
+    The least recently used entry is evicted once max_size entries are
+    held. Entries older than ttl seconds are treated as missing; a ttl of
+    None means entries never expire. A max_size of 0 disables the cache.
+
+    If given, on_evict is called with each value the cache drops, whether
+    evicted, expired, replaced, cleared or not cached at all, such as to
+    wipe sensitive values. It is not called for values removed via pop().
+    """
+
+    def __init__(self, max_size, ttl=None, on_evict=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Returns the value cached for key, or default if there is none."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return default
+            value, stored_at = entry
+            if self.ttl is not None and time.time() - stored_at > self.ttl:
+                self._evict(value)
+                return default
+            # Re-insert to mark the entry as the most recently used one.
+            self._entries[key] = entry
+            return value
+
+    def put(self, key, value):
+        """Caches value for key, evicting the least recently used entry."""
+        if self.max_size <= 0:
+            self._evict(value)
+            return
+        with self._lock:
+            replaced = self._entries.pop(key, None)
+            if replaced is not None and replaced[0] is not value:
+                self._evict(replaced[0])
+            while len(self._entries) >= self.max_size:
+                self._evict(self._entries.popitem(last=False)[1][0])
+            self._entries[key] = (value, time.time())
+
+    def pop(self, key, default=None):
+        """Removes key from the cache, returning its value if it was there."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        """Removes all entries from the cache."""
+        with self._lock:
+            for value, _ in self._entries.values():
+                self._evict(value)
+            self._entries.clear()
+
+    def _evict(self, value):
+        if self.on_evict is not None:
+            self.on_evict(value)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
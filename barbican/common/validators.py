@@ -347,6 +347,59 @@ class NewSecretValidator(ValidatorBase):
         return payload.strip()
 
 
+class NewSecretsValidator(ValidatorBase):
+    """Validate new secrets, to be created in bulk."""
+
+    def __init__(self):
+        self.name = 'Secrets'
+        self.secret_validator = NewSecretValidator()
+        self.schema = {
+            "type": "object",
+            "properties": {
+                "secrets": {
+                    "type": "array",
+                    "items": {"type": "object"},
+                    "minItems": 1,
+                    "maxItems": CONF.max_secrets_per_bulk_request
+                }
+            },
+            "required": ["secrets"]
+        }
+
+    def validate(self, json_data, parent_schema=None):
+        """Validate the input JSON, and each secret in it as a new secret."""
+        schema_name = self._full_name(parent_schema)
+        self._assert_schema_is_valid(json_data, schema_name)
+
+        for index, secret_data in enumerate(json_data['secrets']):
+            # Errors name the secret's position in the list, as in
+            # "Secret' within 'secrets[3]".
+            item_name = 'secrets[{0}]'.format(index)
+            self.secret_validator.validate(secret_data,
+                                           parent_schema=item_name)
+            item_schema_name = self.secret_validator._full_name(item_name)
+            # Unlike a secret within an order, a secret created in bulk is
+            # stored as it is, so it needs a payload for its content type.
+            self._assert_validity(
+                'payload' in secret_data or
+                'payload_content_type' not in secret_data,
+                item_schema_name,
+                u._("payload must be provided when payload_content_type is "
+                    "specified"),
+                "payload")
+            transport_key_needed = secret_data.get('transport_key_needed',
+                                                   'false').lower() == 'true'
+            self._assert_validity(
+                not (secret_data.get('transport_key_id') or
+                     transport_key_needed),
+                item_schema_name,
+                u._("Transport keys are not supported when creating secrets "
+                    "in bulk"),
+                "transport_key_id")
+
+        return json_data
+
+
 # TODO(atiwari) - Split this validator module and unit tests
 # into smaller modules
 class TypeOrderValidator(ValidatorBase):
@@ -670,6 +723,31 @@ class ContainerConsumerValidator(ValidatorBase):
         return json_data
 
 
+class SecretRefsValidator(ValidatorBase):
+    """Validate a list of secret references, as for bulk retrieval."""
+
+    def __init__(self):
+        self.name = 'SecretRefs'
+        self.schema = {
+            "type": "object",
+            "properties": {
+                "secret_refs": {
+                    "type": "array",
+                    "items": {"type": "string", "minLength": 1},
+                    "minItems": 1,
+                    "maxItems": CONF.max_secrets_per_bulk_request
+                }
+            },
+            "required": ["secret_refs"]
+        }
+
+    def validate(self, json_data, parent_schema=None):
+        schema_name = self._full_name(parent_schema)
+
+        self._assert_schema_is_valid(json_data, schema_name)
+        return json_data
+
+
 class ContainerValidator(ValidatorBase):
     """Validator for all types of Container."""
 
@@ -0,0 +1,29 @@
+"""add deleted to the containers paging index
+
+Revision ID: 0169faf50776
+Revises: 46b98cde536
+Create Date: 2015-06-18 14:02:51.310477
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '0169faf50776'
+down_revision = '46b98cde536'
+
+from alembic import op
+
+
+def upgrade():
+    op.create_index('containers_project_deleted_created_at_id_idx',
+                    'containers',
+                    ['project_id', 'deleted', 'created_at', 'id'],
+                    unique=False)
+    op.drop_index('containers_project_created_at_id_idx',
+                  table_name='containers')
+
+
+def downgrade():
+    op.create_index('containers_project_created_at_id_idx', 'containers',
+                    ['project_id', 'created_at', 'id'], unique=False)
+    op.drop_index('containers_project_deleted_created_at_id_idx',
+                  table_name='containers')
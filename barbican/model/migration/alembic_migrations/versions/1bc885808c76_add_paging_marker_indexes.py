@@ -0,0 +1,29 @@
+"""add paging marker indexes
+
+Revision ID: 1bc885808c76
+Revises: 30dba269cc64
+Create Date: 2015-05-20 14:22:41.310561
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '1bc885808c76'
+down_revision = '30dba269cc64'
+
+from alembic import op
+
+
+def upgrade():
+    op.create_index('secrets_created_at_id_idx', 'secrets',
+                    ['created_at', 'id'], unique=False)
+    op.create_index('orders_project_created_at_id_idx', 'orders',
+                    ['project_id', 'created_at', 'id'], unique=False)
+    op.create_index('containers_project_created_at_id_idx', 'containers',
+                    ['project_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('containers_project_created_at_id_idx',
+                  table_name='containers')
+    op.drop_index('orders_project_created_at_id_idx', table_name='orders')
+    op.drop_index('secrets_created_at_id_idx', table_name='secrets')
@@ -0,0 +1,44 @@
+"""add indexes for list queries
+
+Revision ID: 2e1bc7d0c5a1
+Revises: 4ecde3a3a72a
+Create Date: 2015-06-09 10:12:44.583094
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '2e1bc7d0c5a1'
+down_revision = '4ecde3a3a72a'
+
+from alembic import op
+
+
+def upgrade():
+    op.create_index('secrets_project_deleted_created_at_id_idx', 'secrets',
+                    ['project_id', 'deleted', 'created_at', 'id'],
+                    unique=False)
+    op.drop_index('secrets_project_created_at_id_idx', table_name='secrets')
+
+    op.create_index('orders_project_deleted_created_at_id_idx', 'orders',
+                    ['project_id', 'deleted', 'created_at', 'id'],
+                    unique=False)
+    op.drop_index('orders_project_created_at_id_idx', table_name='orders')
+
+    op.create_index('order_retry_tasks_deleted_retry_at_idx',
+                    'order_retry_tasks', ['deleted', 'retry_at'],
+                    unique=False)
+
+
+def downgrade():
+    op.drop_index('order_retry_tasks_deleted_retry_at_idx',
+                  table_name='order_retry_tasks')
+
+    op.create_index('orders_project_created_at_id_idx', 'orders',
+                    ['project_id', 'created_at', 'id'], unique=False)
+    op.drop_index('orders_project_deleted_created_at_id_idx',
+                  table_name='orders')
+
+    op.create_index('secrets_project_created_at_id_idx', 'secrets',
+                    ['project_id', 'created_at', 'id'], unique=False)
+    op.drop_index('secrets_project_deleted_created_at_id_idx',
+                  table_name='secrets')
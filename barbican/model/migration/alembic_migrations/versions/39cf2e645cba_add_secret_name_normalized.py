@@ -0,0 +1,35 @@
+"""add name_normalized to secrets
+
+Revision ID: 39cf2e645cba
+Revises: 2e1bc7d0c5a1
+Create Date: 2015-06-11 15:47:03.120571
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '39cf2e645cba'
+down_revision = '2e1bc7d0c5a1'
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.sql import column
+from sqlalchemy.sql import table
+
+
+def upgrade():
+    op.add_column('secrets', sa.Column('name_normalized',
+                                       sa.String(length=255), nullable=True))
+
+    # Backfill, normalizing names as models.normalize_secret_name() does.
+    secrets = table('secrets', column('name'), column('name_normalized'))
+    op.execute(secrets.update().values(
+        name_normalized=sa.func.lower(secrets.c.name)))
+
+    op.create_index('secrets_project_deleted_name_idx', 'secrets',
+                    ['project_id', 'deleted', 'name_normalized'],
+                    unique=False)
+
+
+def downgrade():
+    op.drop_index('secrets_project_deleted_name_idx', table_name='secrets')
+    op.drop_column('secrets', 'name_normalized')
@@ -0,0 +1,107 @@
+"""add project entity counts table
+
+Revision ID: 3c3b04040bfe
+Revises: 1bc885808c76
+Create Date: 2015-05-27 09:41:12.806233
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3c3b04040bfe'
+down_revision = '1bc885808c76'
+
+import datetime
+import uuid
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.sql import column
+from sqlalchemy.sql import table
+
+
+def upgrade():
+    op.create_table(
+        'project_entity_counts',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=True),
+        sa.Column('deleted', sa.Boolean(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('project_id', sa.String(length=36), nullable=False),
+        sa.Column('entity_type', sa.String(length=255), nullable=False),
+        sa.Column('entity_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['project_id'], ['projects.id'],
+                                name='project_entity_counts_project_fk'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('project_id', 'entity_type',
+                            name='_project_entity_count_uc'),
+        mysql_engine='InnoDB'
+    )
+    op.create_index(op.f('ix_project_entity_counts_project_id'),
+                    'project_entity_counts', ['project_id'], unique=False)
+
+    _backfill_project_entity_counts()
+
+
+def _backfill_project_entity_counts():
+    """Seeds the counts of the existing projects from their entities."""
+    con = op.get_bind()
+
+    projects = table('projects', column('id'), column('deleted'))
+    project_secret = table('project_secret', column('project_id'),
+                           column('secret_id'), column('deleted'))
+    secrets = table('secrets', column('id'), column('deleted'))
+    orders = table('orders', column('project_id'), column('deleted'))
+    containers = table('containers', column('project_id'),
+                       column('deleted'))
+
+    counts = {
+        'secrets': sa.select(
+            [project_secret.c.project_id, sa.func.count()]
+        ).select_from(
+            project_secret.join(secrets,
+                                project_secret.c.secret_id == secrets.c.id)
+        ).where(sa.and_(project_secret.c.deleted == sa.false(),
+                        secrets.c.deleted == sa.false())
+                ).group_by(project_secret.c.project_id),
+        'orders': sa.select(
+            [orders.c.project_id, sa.func.count()]
+        ).where(orders.c.deleted == sa.false()
+                ).group_by(orders.c.project_id),
+        'containers': sa.select(
+            [containers.c.project_id, sa.func.count()]
+        ).where(containers.c.deleted == sa.false()
+                ).group_by(containers.c.project_id),
+    }
+    counts = dict((entity_type, dict(con.execute(query).fetchall()))
+                  for entity_type, query in counts.items())
+
+    project_ids = [row[0] for row in con.execute(
+        sa.select([projects.c.id]).where(projects.c.deleted == sa.false()))]
+
+    now = datetime.datetime.utcnow()
+    rows = [{'id': str(uuid.uuid4()),
+             'created_at': now,
+             'updated_at': now,
+             'deleted': False,
+             'status': 'ACTIVE',
+             'project_id': project_id,
+             'entity_type': entity_type,
+             'entity_count': entity_counts.get(project_id, 0)}
+            for project_id in project_ids
+            for entity_type, entity_counts in counts.items()]
+
+    if rows:
+        project_entity_counts = table(
+            'project_entity_counts',
+            column('id'), column('created_at'), column('updated_at'),
+            column('deleted'), column('status'), column('project_id'),
+            column('entity_type'), column('entity_count'))
+        op.bulk_insert(project_entity_counts, rows)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_project_entity_counts_project_id'),
+                  table_name='project_entity_counts')
+    op.drop_table('project_entity_counts')
@@ -0,0 +1,22 @@
+"""add secrets expiration index
+
+Revision ID: 46b98cde536
+Revises: e3ce1a2ef357
+Create Date: 2015-06-16 09:31:27.945102
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '46b98cde536'
+down_revision = 'e3ce1a2ef357'
+
+from alembic import op
+
+
+def upgrade():
+    op.create_index('secrets_deleted_expiration_idx', 'secrets',
+                    ['deleted', 'expiration'], unique=False)
+
+
+def downgrade():
+    op.drop_index('secrets_deleted_expiration_idx', table_name='secrets')
@@ -0,0 +1,46 @@
+"""add project_id to secrets
+
+Revision ID: 4ecde3a3a72a
+Revises: 3c3b04040bfe
+Create Date: 2015-06-02 16:05:37.421869
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '4ecde3a3a72a'
+down_revision = '3c3b04040bfe'
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.sql import column
+from sqlalchemy.sql import table
+
+
+def upgrade():
+    op.add_column('secrets', sa.Column('project_id', sa.String(length=36),
+                                       nullable=True))
+    op.create_foreign_key('secrets_project_fk', 'secrets', 'projects',
+                          ['project_id'], ['id'])
+
+    # Backfill from the secrets' (admin) project associations.
+    secrets = table('secrets', column('id'), column('project_id'))
+    project_secret = table('project_secret', column('project_id'),
+                           column('secret_id'), column('deleted'))
+    project_id = sa.select(
+        [sa.func.min(project_secret.c.project_id)]
+    ).where(sa.and_(project_secret.c.secret_id == secrets.c.id,
+                    project_secret.c.deleted == sa.false())
+            ).as_scalar()
+    op.execute(secrets.update().values(project_id=project_id))
+
+    op.create_index('secrets_project_created_at_id_idx', 'secrets',
+                    ['project_id', 'created_at', 'id'], unique=False)
+    op.drop_index('secrets_created_at_id_idx', table_name='secrets')
+
+
+def downgrade():
+    op.create_index('secrets_created_at_id_idx', 'secrets',
+                    ['created_at', 'id'], unique=False)
+    op.drop_index('secrets_project_created_at_id_idx', table_name='secrets')
+    op.drop_constraint('secrets_project_fk', 'secrets', type_='foreignkey')
+    op.drop_column('secrets', 'project_id')
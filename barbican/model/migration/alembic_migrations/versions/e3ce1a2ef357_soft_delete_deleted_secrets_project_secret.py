@@ -0,0 +1,40 @@
+"""soft delete the project associations of deleted secrets
+
+Revision ID: e3ce1a2ef357
+Revises: 39cf2e645cba
+Create Date: 2015-06-12 09:41:27.305118
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'e3ce1a2ef357'
+down_revision = '39cf2e645cba'
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.sql import column
+from sqlalchemy.sql import table
+
+
+def upgrade():
+    # Deleting a secret now soft deletes its project_secret rows too, which
+    # would otherwise keep the secret from ever being purged.
+    secrets = table('secrets', column('id'), column('deleted'),
+                    column('deleted_at'))
+    project_secret = table('project_secret', column('secret_id'),
+                           column('deleted'), column('deleted_at'))
+
+    deleted_secrets = sa.select([secrets.c.id]).where(
+        secrets.c.deleted == sa.true())
+    secret_deleted_at = sa.select([secrets.c.deleted_at]).where(
+        secrets.c.id == project_secret.c.secret_id).as_scalar()
+    op.execute(project_secret.update().where(
+        sa.and_(project_secret.c.deleted == sa.false(),
+                project_secret.c.secret_id.in_(deleted_secrets))).values(
+        deleted=True, deleted_at=secret_deleted_at))
+
+
+def downgrade():
+    # Which rows were soft deleted by upgrade() is not recorded, and they
+    # are harmless as they are.
+    pass
@@ -89,3 +89,24 @@ def generate(autogenerate=True, message='generate changes', sql_url=None):
     alembic_cfg = init_config(sql_url)
     alembic_command.revision(alembic_cfg, message=message,
                              autogenerate=autogenerate)
+
+
+def purge(age_in_days, chunk_size, sleep_interval=0, dry_run=False,
+          sql_url=None):
+    """Purge rows soft deleted over age_in_days ago.
+
+    See repositories.purge_deleted_rows(), which returns the number of rows
+    purged per table.
+    """
+    # The repositories module imports this one, so import it here.
+    from barbican.model import repositories
+
+    if sql_url:
+        CONF.set_override('sql_connection', sql_url)
+    repositories.setup_database_engine_and_factory()
+    try:
+        return repositories.purge_deleted_rows(
+            age_in_days, chunk_size, sleep_interval=sleep_interval,
+            dry_run=dry_run)
+    finally:
+        repositories.clear()
@@ -117,8 +117,12 @@ class ModelBase(object):
         if self.id is None:
             self.created_at = timeutils.utcnow()
             self.updated_at = self.created_at
+            # Assign the id now, rather than on flush, so that it is
+            # available within repositories.deferred_flush().
+            self.id = utils.generate_uuid()
         session.add(self)
-        session.flush()
+        if not session.info.get('defer_flush'):
+            session.flush()
 
     def delete(self, session=None):
         """Delete this object."""
@@ -281,6 +285,27 @@ class Project(BASE, SoftDeleteMixIn, ModelBase):
         return {'external_id': self.external_id}
 
 
+def normalize_secret_name(name):
+    """Returns the form of a secret name that secrets are looked up by.
+
+    Name lookups are case insensitive, as they were when done via LIKE on
+    the MySQL and SQLite databases Barbican is usually deployed on.
+    """
+    if name is None:
+        return None
+    return name.lower()
+
+
+def is_loaded(entity, attribute):
+    """Returns whether an entity's attribute is loaded, without loading it.
+
+    Objects that are not entities have no loaded attributes.
+    """
+    if not isinstance(entity, ModelBase):
+        return False
+    return attribute not in sa.inspect(entity).unloaded
+
+
 class Secret(BASE, SoftDeleteMixIn, ModelBase):
     """Represents a Secret in the datastore.
 
@@ -293,6 +318,9 @@ class Secret(BASE, SoftDeleteMixIn, ModelBase):
     __tablename__ = 'secrets'
 
     name = sa.Column(sa.String(255))
+    # Kept in sync with name (see normalize_secret_name()), so that secrets
+    # can be looked up by name, or name prefix, via an index.
+    name_normalized = sa.Column(sa.String(255))
     secret_type = sa.Column(sa.String(255),
                             server_default=secret_store.SecretType.OPAQUE)
     expiration = sa.Column(sa.DateTime, default=None)
@@ -301,6 +329,14 @@ class Secret(BASE, SoftDeleteMixIn, ModelBase):
     mode = sa.Column(sa.String(255))
     creator_id = sa.Column(sa.String(255))
 
+    # Denormalized from the secret's ProjectSecret association, so that
+    # project scoped secret queries do not need to join through it.
+    project_id = sa.Column(
+        sa.String(36),
+        sa.ForeignKey('projects.id', name='secrets_project_fk'),
+        nullable=True)
+    project = orm.relationship('Project', viewonly=True)
+
     # TODO(jwood): Performance - Consider avoiding full load of all
     #   datum attributes here. This is only being done to support the
     #   building of the list of supported content types when secret
@@ -315,6 +351,15 @@ class Secret(BASE, SoftDeleteMixIn, ModelBase):
         backref="secret",
         cascade="all, delete-orphan")
 
+    # Supports listing a project's undeleted secrets in creation order, and
+    # seeking to a page of them via a paging marker.
+    __table_args__ = (sa.Index('secrets_project_deleted_created_at_id_idx',
+                               'project_id', 'deleted', 'created_at', 'id'),
+                      sa.Index('secrets_project_deleted_name_idx',
+                               'project_id', 'deleted', 'name_normalized'),
+                      sa.Index('secrets_deleted_expiration_idx',
+                               'deleted', 'expiration'))
+
     def __init__(self, parsed_request=None):
         """Creates secret from a dict."""
         super(Secret, self).__init__()
@@ -334,6 +379,11 @@ class Secret(BASE, SoftDeleteMixIn, ModelBase):
 
         self.status = States.ACTIVE
 
+    @orm.validates('name')
+    def _validate_name(self, key, name):
+        self.name_normalized = normalize_secret_name(name)
+        return name
+
     def _do_delete_children(self, session):
         """Sub-class hook: delete children relationships."""
         for k, v in self.secret_store_metadata.items():
@@ -348,6 +398,9 @@ class Secret(BASE, SoftDeleteMixIn, ModelBase):
         for secret_acl in self.secret_acls:
             session.delete(secret_acl)
 
+        for project_assoc in self.project_assocs:
+            project_assoc.delete(session)
+
     def _do_extra_dict_fields(self):
         """Sub-class hook method: return dict of fields."""
         if self.expiration:
@@ -527,6 +580,11 @@ class Order(BASE, SoftDeleteMixIn, ModelBase):
         backref="order",
         cascade="all, delete-orphan")
 
+    # Supports listing a project's undeleted orders in creation order, and
+    # seeking to a page of them via a paging marker.
+    __table_args__ = (sa.Index('orders_project_deleted_created_at_id_idx',
+                               'project_id', 'deleted', 'created_at', 'id'),)
+
     def __init__(self, parsed_request=None):
             """Creates a Order entity from a dict."""
             super(Order, self).__init__()
@@ -657,7 +715,12 @@ class OrderBarbicanMetadatum(BASE, SoftDeleteMixIn, ModelBase):
 class OrderRetryTask(BASE, SoftDeleteMixIn, ModelBase):
 
     __tablename__ = "order_retry_tasks"
-    __table_args__ = {"mysql_engine": "InnoDB"}
+    # Supports finding the undeleted tasks that are due for a retry.
+    __table_args__ = (
+        sa.Index("order_retry_tasks_deleted_retry_at_idx",
+                 "deleted", "retry_at"),
+        {"mysql_engine": "InnoDB"},
+    )
     __table_initialized__ = False
 
     id = sa.Column(
@@ -695,6 +758,11 @@ class Container(BASE, SoftDeleteMixIn, ModelBase):
     consumers = sa.orm.relationship("ContainerConsumerMetadatum")
     creator_id = sa.Column(sa.String(255))
 
+    # Supports listing a project's undeleted containers in creation order,
+    # and seeking to a page of them via a paging marker.
+    __table_args__ = (sa.Index('containers_project_deleted_created_at_id_idx',
+                               'project_id', 'deleted', 'created_at', 'id'),)
+
     def __init__(self, parsed_request=None):
         """Creates a Container entity from a dict."""
         super(Container, self).__init__()
@@ -1261,6 +1329,57 @@ class ContainerACLUser(BASE, ModelBase):
                 'user_id': self.user_id}
 
 
+class ProjectEntityCount(BASE, ModelBase):
+    """Keeps a running count of a Project's entities of a given type.
+
+    Counts are adjusted as secrets, orders and containers are created and
+    deleted, so that list requests can report an estimated total without
+    counting the rows of (potentially very large) projects. The entity type
+    is the table name of the counted entity, such as 'secrets'.
+
+    ProjectEntityCount deletes are not soft-deletes.
+    """
+
+    __tablename__ = 'project_entity_counts'
+
+    project_id = sa.Column(
+        sa.String(36),
+        sa.ForeignKey('projects.id', name='project_entity_counts_project_fk'),
+        index=True,
+        nullable=False)
+
+    entity_type = sa.Column(sa.String(255), nullable=False)
+
+    entity_count = sa.Column(sa.Integer, nullable=False, default=0)
+
+    __table_args__ = (sa.UniqueConstraint(
+        'project_id', 'entity_type', name='_project_entity_count_uc'),)
+
+    def __init__(self, project_id, entity_type, entity_count=0):
+        """Creates project entity count entity."""
+        super(ProjectEntityCount, self).__init__()
+
+        msg = u._("Must supply non-None {0} argument "
+                  "for ProjectEntityCount entry.")
+
+        if project_id is None:
+            raise exception.MissingArgumentError(msg.format("project_id"))
+        self.project_id = project_id
+
+        if entity_type is None:
+            raise exception.MissingArgumentError(msg.format("entity_type"))
+        self.entity_type = entity_type
+
+        self.entity_count = entity_count
+        self.status = States.ACTIVE
+
+    def _do_extra_dict_fields(self):
+        """Sub-class hook method: return dict of fields."""
+        return {'project_id': self.project_id,
+                'entity_type': self.entity_type,
+                'entity_count': self.entity_count}
+
+
 # Keep this tuple synchronized with the models in the file
 MODELS = [ProjectSecret, Project, Secret, EncryptedDatum, Order, Container,
           ContainerConsumerMetadatum, ContainerSecret, TransportKey,
@@ -1268,7 +1387,7 @@ MODELS = [ProjectSecret, Project, Secret, EncryptedDatum, Order, Container,
           KEKDatum, CertificateAuthority, CertificateAuthorityMetadatum,
           ProjectCertificateAuthority, PreferredCertificateAuthority,
           SecretACL, ContainerACL, SecretACLUser, ContainerACLUser,
-          OrderRetryTask]
+          OrderRetryTask, ProjectEntityCount]
 
 
 def register_models(engine):
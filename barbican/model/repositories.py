@@ -20,11 +20,20 @@ TODO: The top part of this file was 'borrowed' from Glance, but seems
 quite intense for sqlalchemy, and maybe could be simplified.
 """
 
+import base64
+import collections
+import contextlib
+import copy
+import datetime
+import functools
 import logging
+import random
+import threading
 import time
 import uuid
 
 import sqlalchemy
+from sqlalchemy import and_
 from sqlalchemy import func as sa_func
 from sqlalchemy import or_
 import sqlalchemy.orm as sa_orm
@@ -41,7 +50,23 @@ LOG = utils.getLogger(__name__)
 
 
 _ENGINE = None
+_READ_ENGINES = None
 _SESSION_FACTORY = None
+_PROJECT_CACHE = None
+_KEK_DATUM_CACHE = None
+
+# Caches of baked queries' compiled contexts, by bake key, and of their
+# compiled SQL. See BakedQuery.
+_QUERY_CONTEXT_CACHE = {}
+_COMPILED_SQL_CACHE = {}
+
+# Times until which read replicas are skipped, by engine, after failing to
+# connect to them.
+_READ_ENGINES_SKIPPED_UNTIL = {}
+
+# Query statistics being collected by the current thread. See
+# start_query_stats().
+_QUERY_STATS = threading.local()
 BASE = models.BASE
 sa_logger = None
 
@@ -61,6 +86,7 @@ _ORDER_RETRY_TASK_REPOSITORY = None
 _PREFERRED_CA_REPOSITORY = None
 _PROJECT_REPOSITORY = None
 _PROJECT_CA_REPOSITORY = None
+_PROJECT_ENTITY_COUNT_REPOSITORY = None
 _PROJECT_SECRET_REPOSITORY = None
 _SECRET_ACL_REPOSITORY = None
 _SECRET_META_REPOSITORY = None
@@ -75,21 +101,30 @@ def hard_reset():
     """Performs a hard reset of database resources, used for unit testing."""
     # TODO(jvrbanac): Remove this as soon as we improve our unit testing
     # to not require this.
-    global _ENGINE, _SESSION_FACTORY
+    global _ENGINE, _READ_ENGINES, _SESSION_FACTORY
     if _ENGINE:
         _ENGINE.dispose()
+    for engine in _READ_ENGINES or []:
+        engine.dispose()
     _ENGINE = None
+    _READ_ENGINES = None
     _SESSION_FACTORY = None
+    _READ_ENGINES_SKIPPED_UNTIL.clear()
+    _QUERY_CONTEXT_CACHE.clear()
+    _COMPILED_SQL_CACHE.clear()
+    get_project_cache().clear()
+    get_kek_datum_cache().clear()
 
     # Make sure we reinitialize the engine and session factory
     setup_database_engine_and_factory()
 
 
 def setup_database_engine_and_factory():
-    global sa_logger, _SESSION_FACTORY, _ENGINE
+    global sa_logger, _SESSION_FACTORY, _ENGINE, _READ_ENGINES
 
     LOG.info('Setting up database engine and session factory')
     LOG.debug('Sql connection = %s', CONF.sql_connection)
+    LOG.debug('Sql read connections = %s', CONF.sql_read_connection)
     if CONF.debug:
         sa_logger = logging.getLogger('sqlalchemy.engine')
         sa_logger.setLevel(logging.DEBUG)
@@ -98,10 +133,11 @@ def setup_database_engine_and_factory():
         pool_logger.setLevel(logging.DEBUG)
 
     _ENGINE = _get_engine(_ENGINE)
+    _READ_ENGINES = _get_read_engines(_READ_ENGINES)
 
     # Utilize SQLAlchemy's scoped_session to ensure that we only have one
     # session instance per thread.
-    session_maker = sa_orm.sessionmaker(bind=_ENGINE)
+    session_maker = sa_orm.sessionmaker(bind=_ENGINE, query_cls=BakedQuery)
     _SESSION_FACTORY = sqlalchemy.orm.scoped_session(session_maker)
 
 
@@ -114,13 +150,45 @@ def start():
     pass
 
 
-def start_read_only():
-    """Start for read-only requests placeholder
+def start_read_only(use_replica=True):
+    """Start for read-only requests
 
     Typically performed at the start of a request cycle, say for GET or HEAD
-    requests.
+    requests. If read replicas are configured (see CONF.sql_read_connection)
+    and use_replica is True, the request's session is bound to one of them,
+    picked at random. Replicas that cannot be connected to are skipped for
+    CONF.sql_read_retry_interval seconds; if none is available, the session
+    stays bound to the primary database. This fallback only happens here: a
+    replica that fails once the session is in use fails the request.
+
+    Replicas may lag behind the primary database, so only pass use_replica
+    for requests that can tolerate slightly stale reads.
     """
-    pass
+    if (use_replica and _READ_ENGINES and
+            not _SESSION_FACTORY.registry.has()):
+        _bind_session_to_read_replica()
+
+    get_session().info['read_only'] = True
+
+
+def _bind_session_to_read_replica():
+    now = time.time()
+    engines = [engine for engine in _READ_ENGINES
+               if _READ_ENGINES_SKIPPED_UNTIL.get(engine, 0) <= now]
+    random.shuffle(engines)
+    for engine in engines:
+        session = _SESSION_FACTORY(bind=engine)
+        try:
+            # Check out the connection the request will use up front, so
+            # that an unavailable replica can still be swapped out.
+            session.connection()
+            return
+        except sqlalchemy.exc.DBAPIError:
+            LOG.exception(u._LE('Problem connecting to read replica %s, '
+                                'skipping it'), engine.url)
+            _READ_ENGINES_SKIPPED_UNTIL[engine] = (
+                now + CONF.sql_read_retry_interval)
+            _SESSION_FACTORY.remove()
 
 
 def commit():
@@ -153,6 +221,146 @@ def get_session():
     return _SESSION_FACTORY()
 
 
+@contextlib.contextmanager
+def deferred_flush(session=None):
+    """Batches the writes of the entities saved in this context.
+
+    Entities saved in this context (see models.ModelBase.save()) are only
+    flushed to the database once, on leaving it, rather than one at a time.
+    New entities are given their ids as they are saved, so they can still
+    be referenced by other new entities. As they have their ids, a table's
+    new rows are inserted in one executemany() rather than one by one.
+
+    Project entity counts adjusted in this context (see
+    ProjectEntityCountRepo.update_count()) are likewise summed up, and each
+    is only updated once, after the flush.
+
+    Note that integrity errors, for example, are then only raised on
+    leaving the context, as Duplicate exceptions like create_from() raises.
+    Nested contexts flush with the outermost one.
+    """
+    session = session or get_session()
+    if session.info.get('defer_flush'):
+        yield session
+        return
+
+    session.info['defer_flush'] = True
+    session.info['deferred_counts'] = {}
+    try:
+        yield session
+    finally:
+        del session.info['defer_flush']
+        deferred_counts = session.info.pop('deferred_counts')
+
+    try:
+        session.flush()
+    except sqlalchemy.exc.IntegrityError:
+        LOG.exception(u._LE('Problem saving entities for create'))
+        _raise_entity_already_exists('Entity')
+
+    count_repo = get_project_entity_count_repository()
+    for (project_id, entity_type), delta in deferred_counts.items():
+        if delta:
+            count_repo.update_count(project_id, entity_type, delta,
+                                    session=session)
+
+
+def get_project_cache():
+    """Returns the process-local cache of projects by external ID.
+
+    Only plain column values are cached, as Project instances are bound to
+    the session that loaded them. See ProjectRepo.find_by_external_project_id.
+    """
+    global _PROJECT_CACHE
+    if _PROJECT_CACHE is None:
+        _PROJECT_CACHE = utils.LRUCache(CONF.project_cache_size,
+                                        ttl=CONF.project_cache_ttl)
+    return _PROJECT_CACHE
+
+
+def get_kek_datum_cache():
+    """Returns the process-local cache of bound KEK data, by project ID.
+
+    Each entry holds the column values of a project's active KEK datum for
+    each crypto plugin, by plugin name. See
+    KEKDatumRepo.find_or_create_kek_datum.
+    """
+    global _KEK_DATUM_CACHE
+    if _KEK_DATUM_CACHE is None:
+        _KEK_DATUM_CACHE = utils.LRUCache(CONF.kek_cache_size,
+                                          ttl=CONF.kek_cache_ttl)
+    return _KEK_DATUM_CACHE
+
+
+class BakedQuery(sa_orm.Query):
+    """Query that can be compiled once, and then reused.
+
+    Building a query's statement and compiling it to SQL can take more CPU
+    than the database takes to run a simple lookup. A query baked under a
+    key, via bake(), is only compiled for the first query baked under that
+    key; later ones reuse its compiled context and SQL, with their own bind
+    parameter values (see params()). The key must therefore identify all
+    of the query but the values of its bind parameters, which must be used
+    for any value that varies. Changing a baked query in any other way than
+    setting its parameters unbakes it.
+
+    Queries that subquery load relationships are not baked, as their
+    compiled context holds the loading query, bound to the first query's
+    session and parameters.
+
+    Baking can be disabled via CONF.sql_query_cache.
+
+    This overrides private methods of SQLAlchemy's Query and relies on the
+    attributes of its QueryContext, as of SQLAlchemy 0.9; check it still
+    holds (see WhenBakingQueries) before widening the SQLAlchemy range in
+    requirements.txt.
+    """
+
+    _bake_key = None
+
+    def bake(self, key):
+        """Returns this query baked under the given key."""
+        query = self._clone()
+        if CONF.sql_query_cache:
+            query._bake_key = key
+        return query
+
+    def params(self, *args, **kwargs):
+        query = super(BakedQuery, self).params(*args, **kwargs)
+        query._bake_key = self._bake_key
+        return query
+
+    def _clone(self):
+        query = super(BakedQuery, self)._clone()
+        query._bake_key = None
+        return query
+
+    def _compile_context(self, labels=True):
+        if self._bake_key is None:
+            return super(BakedQuery, self)._compile_context(labels)
+
+        baked_context = _QUERY_CONTEXT_CACHE.get(self._bake_key)
+        if baked_context is None:
+            baked_context = super(BakedQuery, self)._compile_context(labels)
+            if any(isinstance(value, sa_orm.Query)
+                   for value in baked_context.attributes.values()):
+                self._bake_key = None
+                return baked_context
+            _QUERY_CONTEXT_CACHE[self._bake_key] = baked_context
+
+        context = copy.copy(baked_context)
+        context.query = self
+        context.session = self.session
+        context.attributes = baked_context.attributes.copy()
+        return context
+
+    def _connection_from_session(self, **kw):
+        conn = super(BakedQuery, self)._connection_from_session(**kw)
+        if self._bake_key is not None:
+            conn = conn.execution_options(compiled_cache=_COMPILED_SQL_CACHE)
+        return conn
+
+
 def _get_engine(engine):
     if not engine:
         connection = CONF.sql_connection
@@ -163,17 +371,7 @@ def _get_engine(engine):
     # TODO(jfwood):
     # connection_dict = sqlalchemy.engine.url.make_url(_CONNECTION)
 
-        engine_args = {
-            'pool_recycle': CONF.sql_idle_timeout,
-            'echo': False,
-            'convert_unicode': True}
-        if CONF.sql_pool_class:
-            engine_args['poolclass'] = utils.get_class_for(
-                'sqlalchemy.pool', CONF.sql_pool_class)
-        if CONF.sql_pool_size:
-            engine_args['pool_size'] = CONF.sql_pool_size
-        if CONF.sql_pool_max_overflow:
-            engine_args['max_overflow'] = CONF.sql_pool_max_overflow
+        engine_args = _get_engine_args()
 
         try:
             engine = _create_engine(connection, **engine_args)
@@ -196,13 +394,54 @@ def _get_engine(engine):
     return engine
 
 
+def _get_read_engines(engines):
+    """Returns engines for the configured read replicas, if any.
+
+    Unlike the primary database, replicas are neither connected to nor
+    auto-created here: they are replicated from the primary, and reads fall
+    back to it when a replica is unavailable (see start_read_only()).
+    """
+    if engines is None:
+        engine_args = _get_engine_args()
+        engines = [_create_engine(connection, **engine_args)
+                   for connection in CONF.sql_read_connection]
+    return engines
+
+
+def _get_engine_args():
+    engine_args = {
+        'pool_recycle': CONF.sql_idle_timeout,
+        'echo': False,
+        'convert_unicode': True}
+    if CONF.sql_pool_class:
+        engine_args['poolclass'] = utils.get_class_for(
+            'sqlalchemy.pool', CONF.sql_pool_class)
+    if CONF.sql_pool_size:
+        engine_args['pool_size'] = CONF.sql_pool_size
+    if CONF.sql_pool_max_overflow:
+        engine_args['max_overflow'] = CONF.sql_pool_max_overflow
+    return engine_args
+
+
+# Fragments of the messages of errors raised when the database connection
+# could not be established or was lost.
+_DB_CONNECTION_ERRORS = (
+    # MySQL client error codes: can't connect through socket or TCP, server
+    # has gone away, lost connection during query.
+    '2002', '2003', '2006', '2013',
+    # PostgreSQL (libpq) messages.
+    'could not connect to server',
+    'server closed the connection unexpectedly',
+    'terminating connection',
+    'the database system is starting up',
+    'the database system is shutting down',
+)
+
+
 def is_db_connection_error(args):
     """Return True if error in connecting to db."""
-    # NOTE(adam_g): This is currently MySQL specific and needs to be extended
-    #               to support Postgres and others.
-    conn_err_codes = ('2002', '2003', '2006')
-    for err_code in conn_err_codes:
-        if args.find(err_code) != -1:
+    for err_msg in _DB_CONNECTION_ERRORS:
+        if args.find(err_msg) != -1:
             return True
     return False
 
@@ -212,9 +451,14 @@ def _create_engine(connection, **engine_args):
 
     engine = sqlalchemy.create_engine(connection, **engine_args)
 
-    # TODO(jfwood): if 'mysql' in connection_dict.drivername:
-    # TODO(jfwood): sqlalchemy.event.listen(_ENGINE, 'checkout',
-    # TODO(jfwood):                         ping_listener)
+    if CONF.sql_pool_pre_ping:
+        sqlalchemy.event.listen(engine, 'checkout',
+                                functools.partial(_ping_listener, engine))
+
+    sqlalchemy.event.listen(engine, 'before_cursor_execute',
+                            _before_cursor_execute)
+    sqlalchemy.event.listen(engine, 'after_cursor_execute',
+                            _after_cursor_execute)
 
     # Wrap the engine's connect method with a retry decorator.
     engine.connect = wrap_db_error(engine.connect)
@@ -222,6 +466,98 @@ def _create_engine(connection, **engine_args):
     return engine
 
 
+def _ping_listener(engine, dbapi_conn, connection_rec, connection_proxy):
+    """Ensures a connection is alive as it is checked out of the pool.
+
+    Connections that the engine's dialect considers disconnected, such as
+    those left behind by a database restart or failover, are discarded by
+    the pool, which then retries the checkout with a new connection.
+    """
+    cursor = dbapi_conn.cursor()
+    try:
+        cursor.execute('SELECT 1')
+    except engine.dialect.dbapi.Error as e:
+        if engine.dialect.is_disconnect(e, dbapi_conn, cursor):
+            LOG.warning(u._LW('Discarding disconnected pooled database '
+                              'connection'))
+            raise sqlalchemy.exc.DisconnectionError(str(e))
+        raise
+    finally:
+        cursor.close()
+
+
+class QueryStats(object):
+    """Statistics on the database queries run while collecting them.
+
+    Statements run more than once, typically with different parameters
+    each time, are counted as duplicates. A high number of duplicates
+    usually reveals an N+1 query pattern, such as a lazy-loaded
+    relationship being accessed for each entity in a listing.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = collections.defaultdict(int)
+
+    @property
+    def duplicates(self):
+        """Number of queries repeating an earlier query's statement."""
+        return sum(count - 1 for count in self.statements.values())
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        self.statements[statement] += 1
+
+    def __repr__(self):
+        return ('QueryStats(count={0}, duration={1:.3f}, '
+                'duplicates={2})'.format(self.count, self.duration,
+                                         self.duplicates))
+
+
+def _get_active_query_stats():
+    if not hasattr(_QUERY_STATS, 'active'):
+        _QUERY_STATS.active = []
+    return _QUERY_STATS.active
+
+
+def start_query_stats():
+    """Starts collecting statistics on the queries run by this thread.
+
+    Collections may be nested, each one recording every query run until it
+    is stopped via stop_query_stats().
+
+    :returns: The QueryStats being collected.
+    """
+    stats = QueryStats()
+    _get_active_query_stats().append(stats)
+    return stats
+
+
+def stop_query_stats(stats):
+    """Stops collecting statistics into the given QueryStats."""
+    active = _get_active_query_stats()
+    if stats in active:
+        active.remove(stats)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    if context is not None:
+        context.barbican_query_start_time = time.time()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    start_time = getattr(context, 'barbican_query_start_time', None)
+    if start_time is None:
+        return
+    duration = time.time() - start_time
+    for stats in _get_active_query_stats():
+        stats.record(statement, duration)
+
+
 def _auto_generate_tables(engine, tables):
     if tables and 'alembic_version' in tables:
         # Upgrade the database to the latest version.
@@ -237,7 +573,12 @@ def _auto_generate_tables(engine, tables):
 
 
 def wrap_db_error(f):
-    """Retry DB connection. Copied from nova and modified."""
+    """Retry DB connection. Copied from nova and modified.
+
+    Retries back off exponentially from CONF.sql_retry_interval up to
+    CONF.sql_max_retry_interval seconds, with jitter so that API nodes
+    reconnecting after a database failover do not all retry at once.
+    """
     def _wrap(*args, **kwargs):
         try:
             return f(*args, **kwargs)
@@ -246,11 +587,13 @@ def wrap_db_error(f):
                 raise
 
             remaining_attempts = CONF.sql_max_retries
+            interval = CONF.sql_retry_interval
             while True:
                 LOG.warning(u._LW('SQL connection failed. %d attempts left.'),
                             remaining_attempts)
                 remaining_attempts -= 1
-                time.sleep(CONF.sql_retry_interval)
+                time.sleep(random.uniform(interval / 2.0, interval))
+                interval = min(interval * 2, CONF.sql_max_retry_interval)
                 try:
                     return f(*args, **kwargs)
                 except sqlalchemy.exc.OperationalError as e:
@@ -265,6 +608,28 @@ def wrap_db_error(f):
     return _wrap
 
 
+def retry_read_on_disconnect(f):
+    """Retries a repository read once if its database connection was lost.
+
+    This is only done within read-only sessions (see start_read_only()), as
+    the session's transaction has to be rolled back to replace the lost
+    connection, which would discard the writes of read-write sessions.
+    """
+    @functools.wraps(f)
+    def _wrap(self, *args, **kwargs):
+        try:
+            return f(self, *args, **kwargs)
+        except sqlalchemy.exc.DBAPIError as e:
+            session = self.get_session(kwargs.get('session'))
+            if not (e.connection_invalidated and
+                    session.info.get('read_only')):
+                raise
+            LOG.warning(u._LW('Database connection lost, retrying read'))
+            session.rollback()
+            return f(self, *args, **kwargs)
+    return _wrap
+
+
 def clean_paging_values(offset_arg=0, limit_arg=CONF.default_limit_paging):
     """Cleans and safely limits raw paging offset/limit values."""
     offset_arg = offset_arg or 0
@@ -293,34 +658,268 @@ def clean_paging_values(offset_arg=0, limit_arg=CONF.default_limit_paging):
     return offset, limit
 
 
+def encode_paging_marker(entity):
+    """Encodes an opaque paging marker positioned after the given entity.
+
+    The marker captures the (created_at, id) sort key of the entity, so that
+    the next page can be located by seeking directly to it via an index
+    rather than by skipping over all of the previous rows via OFFSET.
+    """
+    created_at = timeutils.strtime(entity.created_at)
+    raw_marker = '{0}|{1}'.format(created_at, entity.id)
+    marker = base64.urlsafe_b64encode(raw_marker.encode('utf-8'))
+    return marker.decode('ascii').rstrip('=')
+
+
+def clean_paging_marker(marker_arg=None):
+    """Decodes a raw paging marker into its (created_at, id) sort key.
+
+    Invalid markers are ignored (None is returned), consistent with how
+    invalid offset/limit values are handled.
+    """
+    if not marker_arg:
+        return None
+
+    try:
+        padding = '=' * (-len(marker_arg) % 4)
+        raw_marker = base64.urlsafe_b64decode(str(marker_arg) + padding)
+        created_at, entity_id = raw_marker.decode('utf-8').split('|', 1)
+        marker = (timeutils.parse_strtime(created_at), entity_id)
+    except (TypeError, ValueError):
+        LOG.debug("Ignoring invalid paging marker=%s", marker_arg)
+        return None
+
+    LOG.debug("Clean paging marker created_at=%s, id=%s", *marker)
+
+    return marker
+
+
+def _filter_after_marker(query, model_class, marker):
+    """Restricts query to the entities sorted after the marker sort key."""
+    created_at, entity_id = marker
+    return query.filter(or_(
+        model_class.created_at > created_at,
+        and_(model_class.created_at == created_at,
+             model_class.id > entity_id)))
+
+
+TOTAL_EXACT = 'exact'
+TOTAL_ESTIMATE = 'estimate'
+TOTAL_NONE = 'none'
+
+
+def clean_total_mode(total_arg=None):
+    """Cleans a raw total counting mode, defaulting to exact totals."""
+    if total_arg in (TOTAL_ESTIMATE, TOTAL_NONE):
+        return total_arg
+    return TOTAL_EXACT
+
+
+def _get_page(query, model_class, offset, limit, marker=None,
+              total_mode=TOTAL_EXACT, estimate=None):
+    """Retrieves a page of entities from query, along with their total.
+
+    Exact totals count all of the query's rows, which is as expensive as
+    the page retrieval itself. Otherwise one row past the page is retrieved
+    to tell whether there is a next page, and the total is either taken from
+    the estimate callable or, if no total is wanted, is merely a lower bound
+    good enough to build the navigation links from.
+
+    :returns: Tuple consisting of (list_of_entities, total).
+    """
+    start = offset
+    end = offset + limit
+    LOG.debug('Retrieving from %s to %s', start, end)
+
+    total = None
+    if total_mode == TOTAL_ESTIMATE and estimate:
+        total = estimate()
+    if total is None and total_mode != TOTAL_NONE:
+        total = query.count()
+
+    if marker:
+        query = _filter_after_marker(query, model_class, marker)
+        start, end = 0, limit
+
+    if total_mode == TOTAL_EXACT:
+        return query[start:end], total
+
+    entities = query[start:end + 1]
+    has_more = len(entities) > limit
+    entities = entities[:limit]
+    retrieved = offset + len(entities)
+    if has_more:
+        total = max(total or 0, retrieved + 1)
+    elif entities or total is None:
+        total = retrieved
+
+    return entities, total
+
+
+def _secret_metadata_load_options():
+    """Returns loader options for secrets that are listed, not decrypted.
+
+    Secrets eagerly join their encrypted data (with its KEK datum) and ACLs
+    (with their users) by default, as needed to decrypt a secret or to
+    enforce its ACLs. Listing secrets needs neither, and those joins would
+    multiply the rows retrieved per secret, so they are only loaded if
+    accessed. The store metadata that the listed content types are derived
+    from is loaded for the whole page at once instead.
+    """
+    return (sa_orm.lazyload('encrypted_data'),
+            sa_orm.lazyload('secret_acls'),
+            sa_orm.subqueryload('secret_store_metadata'))
+
+
+def _secret_retrieval_load_options():
+    """Returns loader options for a secret retrieved through the API.
+
+    Besides the encrypted data (with its KEK datum) and ACLs that secrets
+    join by default, the ACLs' users and the owning project are needed to
+    authorize and serve the request, so they are joined in as well, rather
+    than queried for one by one. So is the store metadata, but by its own
+    query (see _load_secret_store_metadata()), as joining it too would
+    return a row per combination of its rows and the ACL users'.
+    """
+    return (sa_orm.joinedload('secret_acls').joinedload('acl_users'),
+            sa_orm.joinedload('project'))
+
+
+def _load_secret_store_metadata(secret):
+    """Loads a secret's store metadata collection with a baked query.
+
+    This is what subqueryload('secret_store_metadata') would do for a
+    single secret, except that it can be baked (see BakedQuery).
+    """
+    session = sa_orm.object_session(secret)
+    query = session.query(models.SecretStoreMetadatum)
+    query = query.filter(models.SecretStoreMetadatum.secret_id ==
+                         sqlalchemy.bindparam('secret_id'))
+    query = query.bake('secret_store_metadata_by_secret_id')
+    metadata = query.params(secret_id=secret.id).all()
+    sa_orm.attributes.set_committed_value(
+        secret, 'secret_store_metadata', metadata)
+
+
+def _container_list_load_options():
+    """Returns loader options for containers that are listed.
+
+    A container's secret references and consumers are loaded for the whole
+    page at once, rather than joined (secret references) or queried per
+    container (consumers). Its ACLs are only loaded if accessed.
+    """
+    return (sa_orm.subqueryload('container_secrets'),
+            sa_orm.subqueryload('consumers'),
+            sa_orm.lazyload('container_acls'))
+
+
 def delete_all_project_resources(project_id):
     """Logic to cleanup all project resources.
 
-    This cleanup uses same alchemy session to perform all db operations as a
-    transaction and will commit only when all db operations are performed
-    without error.
+    Containers, secrets, KEK data and project-secret associations are soft
+    deleted in bulk, committing every CONF.project_cleanup_chunk_size rows
+    (see BaseRepo.bulk_delete_project_entities). The project itself and its
+    entity counts are only deleted once all of those are, in the final
+    transaction, so a cleanup that fails part way can simply be retried.
     """
     session = get_session()
+    chunk_size = CONF.project_cleanup_chunk_size
 
     container_repo = get_container_repository()
-    container_repo.delete_project_entities(
-        project_id, suppress_exception=False, session=session)
-    # secret children SecretStoreMetadatum, EncryptedDatum
-    # and container_secrets are deleted as part of secret delete
+    container_repo.bulk_delete_project_entities(
+        project_id, chunk_size, suppress_exception=False, session=session)
+    # secret children SecretStoreMetadatum, EncryptedDatum, container_secrets
+    # and ACLs are deleted along with each chunk of secrets
     secret_repo = get_secret_repository()
-    secret_repo.delete_project_entities(
-        project_id, suppress_exception=False, session=session)
+    secret_repo.bulk_delete_project_entities(
+        project_id, chunk_size, suppress_exception=False, session=session)
     kek_repo = get_kek_datum_repository()
-    kek_repo.delete_project_entities(
-        project_id, suppress_exception=False, session=session)
+    kek_repo.bulk_delete_project_entities(
+        project_id, chunk_size, suppress_exception=False, session=session)
     project_secret_repo = get_project_secret_repository()
-    project_secret_repo.delete_project_entities(
+    project_secret_repo.bulk_delete_project_entities(
+        project_id, chunk_size, suppress_exception=False, session=session)
+    project_entity_count_repo = get_project_entity_count_repository()
+    project_entity_count_repo.delete_project_entities(
         project_id, suppress_exception=False, session=session)
     project_repo = get_project_repository()
     project_repo.delete_project_entities(
         project_id, suppress_exception=False, session=session)
 
 
+def purge_deleted_rows(age_in_days, chunk_size, sleep_interval=0,
+                       dry_run=False):
+    """Hard deletes the rows that were soft deleted over age_in_days ago.
+
+    Tables are purged children first, a chunk_size rows per transaction,
+    pausing sleep_interval seconds between transactions to limit the load
+    on the database. Rows that are still referenced by other rows (for
+    example a deleted secret that an order still refers to) are left in
+    place, until those rows are purged too.
+
+    If dry_run is True, nothing is deleted, and the rows that would be
+    deleted are counted instead. As that does not account for rows that
+    become unreferenced during the purge, it may undercount parent tables.
+
+    :returns: An OrderedDict of the number of rows purged (or that would
+              be) by table name, in the order the tables were purged.
+    """
+    session = get_session()
+    cutoff = timeutils.utcnow() - datetime.timedelta(days=age_in_days)
+    stats = collections.OrderedDict()
+
+    for table in reversed(models.BASE.metadata.sorted_tables):
+        if 'deleted_at' not in table.c:
+            continue
+
+        purgeable = and_(table.c.deleted == sqlalchemy.true(),
+                         table.c.deleted_at < cutoff,
+                         *_unreferenced_row_filters(table))
+        if dry_run:
+            count_query = sqlalchemy.select(
+                [sa_func.count()]).select_from(table).where(purgeable)
+            stats[table.name] = session.execute(count_query).scalar()
+            continue
+
+        stats[table.name] = 0
+        while True:
+            id_query = sqlalchemy.select([table.c.id]).where(
+                purgeable).limit(chunk_size)
+            ids = [row[0] for row in session.execute(id_query)]
+            if not ids:
+                break
+            session.execute(table.delete().where(table.c.id.in_(ids)))
+            session.commit()
+            stats[table.name] += len(ids)
+            LOG.debug('Purged %s rows from %s', len(ids), table.name)
+            if len(ids) < chunk_size:
+                break
+            time.sleep(sleep_interval)
+
+    return stats
+
+
+def _unreferenced_row_filters(table):
+    """Returns filters for the rows of table not referenced by other rows."""
+    filters = []
+    for other_table in models.BASE.metadata.sorted_tables:
+        if other_table is table:
+            continue
+        for foreign_key in other_table.foreign_keys:
+            if foreign_key.column.table is table:
+                filters.append(~sqlalchemy.exists().where(
+                    foreign_key.parent == foreign_key.column))
+    return filters
+
+
+def _bulk_soft_delete(query, deleted_at):
+    """Soft deletes the entities matched by query with a single UPDATE."""
+    query.update({'deleted': True,
+                  'deleted_at': deleted_at,
+                  'updated_at': deleted_at},
+                 synchronize_session=False)
+
+
 class BaseRepo(object):
     """Base repository for the barbican entities.
 
@@ -334,6 +933,7 @@ class BaseRepo(object):
         LOG.debug("Getting session...")
         return session or get_session()
 
+    @retry_read_on_disconnect
     def get(self, entity_id, external_project_id=None,
             force_show_deleted=False,
             suppress_exception=False, session=None):
@@ -344,11 +944,15 @@ class BaseRepo(object):
             query = self._do_build_get_query(entity_id,
                                              external_project_id,
                                              session)
+            bake_key = getattr(query, '_bake_key', None)
 
             # filter out deleted entities if requested
             if not force_show_deleted:
                 query = query.filter_by(deleted=False)
 
+            if bake_key is not None:
+                query = query.bake((bake_key, force_show_deleted))
+
             entity = query.one()
 
         except sa_orm.exc.NoResultFound:
@@ -390,6 +994,8 @@ class BaseRepo(object):
             LOG.exception(u._LE('Problem saving entity for create'))
             _raise_entity_already_exists(self._do_entity_name())
 
+        self._do_update_project_counts(entity, 1, session)
+
         LOG.debug('Elapsed repo '
                   'create secret:%s', (time.time() - start))  # DEBUG
 
@@ -418,8 +1024,16 @@ class BaseRepo(object):
                           external_project_id=external_project_id,
                           session=session)
 
+        self.delete_entity(entity, session=session)
+
+    def delete_entity(self, entity, session=None):
+        """Remove the entity."""
+        session = self.get_session(session)
+
         entity.delete(session=session)
 
+        self._do_update_project_counts(entity, -1, session)
+
     def _do_entity_name(self):
         """Sub-class hook: return entity name, such as for debugging."""
         return "Entity"
@@ -435,6 +1049,14 @@ class BaseRepo(object):
         """
         pass
 
+    def _do_update_project_counts(self, entity, delta, session):
+        """Sub-class hook: adjust the project entity counts for the entity
+
+        This is called after the entity is created (delta=1) or deleted
+        (delta=-1). See ProjectEntityCountRepo.
+        """
+        pass
+
     def _do_validate(self, values):
         """Sub-class hook: validate values.
 
@@ -528,6 +1150,76 @@ class BaseRepo(object):
                                                       'project_id=%s'),
                                                   project_id)
 
+    def bulk_delete_project_entities(self, project_id, chunk_size,
+                                     suppress_exception=False,
+                                     session=None):
+        """Soft deletes entities for a given project with set-based updates.
+
+        Rather than loading and deleting entities one by one, they are soft
+        deleted chunk_size at a time in primary key order, using one UPDATE
+        for each chunk's primary key range (and one statement per child table,
+        see `_do_bulk_delete_children`). Each chunk is committed, so that
+        large projects do not hold one long running transaction. Entities
+        that are already deleted are skipped, so if interrupted, a retried
+        delete resumes where the previous one left off.
+
+        :param project_id: id of barbican project entity
+        :param chunk_size: number of entities to delete per transaction
+        :param suppress_exception: Pass True if want to suppress exception
+        :param session: existing db session reference. If None, gets session.
+
+        Sub-class should implement `_build_get_project_entities_query` function
+        to delete related entities otherwise it would raise NotImplementedError
+        on its usage.
+        """
+        session = self.get_session(session)
+        query = self._build_get_project_entities_query(project_id,
+                                                       session=session)
+        model_class = query.column_descriptions[0]['type']
+        query = query.filter_by(deleted=False)
+
+        try:
+            marker = None
+            while True:
+                id_query = query.with_entities(model_class.id)
+                if marker:
+                    id_query = id_query.filter(model_class.id > marker)
+                id_query = id_query.order_by(model_class.id).limit(chunk_size)
+                entity_ids = [row[0] for row in id_query]
+                if not entity_ids:
+                    break
+
+                deleted_at = timeutils.utcnow()
+                self._do_bulk_delete_children(entity_ids, deleted_at,
+                                              session)
+                _bulk_soft_delete(
+                    query.filter(model_class.id >= entity_ids[0],
+                                 model_class.id <= entity_ids[-1]),
+                    deleted_at)
+                session.commit()
+
+                marker = entity_ids[-1]
+                LOG.debug('Deleted %s %s entities for project_id=%s',
+                          len(entity_ids), self._do_entity_name(),
+                          project_id)
+        except sqlalchemy.exc.SQLAlchemyError:
+            LOG.exception(u._LE('Problem bulk deleting project related '
+                                'entities'))
+            if not suppress_exception:
+                raise exception.BarbicanException(u._('Error deleting project '
+                                                      'entities for '
+                                                      'project_id=%s'),
+                                                  project_id)
+
+    def _do_bulk_delete_children(self, entity_ids, deleted_at, session):
+        """Sub-class hook: delete children of a chunk of entities in bulk.
+
+        :param entity_ids: ids of the entities about to be soft deleted
+        :param deleted_at: deletion timestamp to use for soft deletes
+        :param session: existing db session reference.
+        """
+        pass
+
 
 class ProjectRepo(BaseRepo):
     """Repository for the Project entity."""
@@ -544,13 +1236,28 @@ class ProjectRepo(BaseRepo):
         """Sub-class hook: validate values."""
         pass
 
+    @retry_read_on_disconnect
     def find_by_external_project_id(self, external_project_id,
                                     suppress_exception=False, session=None):
+        """Returns the project with the given keystone-ID.
+
+        Projects are looked up in the process-local project cache first (see
+        get_project_cache()). Project rows are never updated once created, so
+        a cached project is only stale once its row is purged, which the
+        cache's TTL bounds.
+        """
         session = self.get_session(session)
 
+        values = get_project_cache().get(external_project_id)
+        if values:
+            return self._attach_cached_project(values, session)
+
         try:
             query = session.query(models.Project)
-            query = query.filter_by(external_id=external_project_id)
+            query = query.filter(models.Project.external_id ==
+                                 sqlalchemy.bindparam('external_project_id'))
+            query = query.bake('project_by_external_id')
+            query = query.params(external_project_id=external_project_id)
 
             entity = query.one()
 
@@ -563,36 +1270,135 @@ class ProjectRepo(BaseRepo):
                     "No {entity_name} found with keystone-ID {id}").format(
                         entity_name=self._do_entity_name(),
                         id=external_project_id))
+        else:
+            # Projects created by this (uncommitted) session could still be
+            # rolled back, so only cache those others have committed.
+            if entity.id not in session.info.get('created_project_ids', ()):
+                get_project_cache().put(external_project_id,
+                                        self._get_column_values(entity))
 
         return entity
 
+    def create_or_find_by_external_project_id(self, external_project_id,
+                                              session=None):
+        """Creates the project with the given keystone-ID, unless it exists.
+
+        If a concurrent request created the project first, the insert fails
+        and the project it created is returned instead. That failure rolls
+        the session's transaction back, so this must be called before the
+        session is used for any other write.
+        """
+        session = self.get_session(session)
+
+        project = models.Project()
+        project.external_id = external_project_id
+        project.status = models.States.ACTIVE
+        try:
+            self.create_from(project, session=session)
+        except exception.Duplicate:
+            LOG.debug('Project for %s was created concurrently',
+                      external_project_id)
+            session.rollback()
+            return self.find_by_external_project_id(external_project_id,
+                                                    session=session)
+
+        session.info.setdefault('created_project_ids', set()).add(project.id)
+        return project
+
+    def invalidate_cache(self, external_project_id):
+        """Drops the project with the given keystone-ID from the cache."""
+        get_project_cache().pop(external_project_id)
+
+    def _get_column_values(self, entity):
+        return {column.key: getattr(entity, column.key)
+                for column in sa_orm.class_mapper(models.Project).column_attrs}
+
+    def _attach_cached_project(self, values, session):
+        """Attaches a cached project to the session without a query."""
+        project = models.Project()
+        for key, value in values.items():
+            setattr(project, key, value)
+        sa_orm.make_transient_to_detached(project)
+        return session.merge(project, load=False)
+
+    def _do_update_project_counts(self, entity, delta, session):
+        """Sub-class hook: create the new project's entity counts."""
+        if delta > 0:
+            get_project_entity_count_repository().create_counts(
+                entity.id, session=session)
+
     def _build_get_project_entities_query(self, project_id, session):
         """Builds query for retrieving project for given id."""
         query = session.query(models.Project)
         return query.filter_by(id=project_id).filter_by(deleted=False)
 
 
+def _secret_name_filter(name):
+    """Returns a filter for secrets with the given name.
+
+    As when names were matched via LIKE, '%' and '_' act as wildcards.
+    """
+    name = models.normalize_secret_name(name)
+    if '%' in name or '_' in name:
+        return models.Secret.name_normalized.like(name)
+    return models.Secret.name_normalized == name
+
+
+def _secret_name_prefix_filter(name_prefix):
+    """Returns a filter for secrets with names starting with the prefix."""
+    pattern = models.normalize_secret_name(name_prefix)
+    for char in ('\\', '%', '_'):
+        pattern = pattern.replace(char, '\\' + char)
+    return models.Secret.name_normalized.like(pattern + '%', escape='\\')
+
+
+def _secret_not_expired_filter():
+    """Returns a filter for secrets not expired as of the 'utcnow' param."""
+    # Note(john-wood-w): SQLAlchemy requires '== None' below,
+    #   not 'is None'.
+    return or_(models.Secret.expiration == None,
+               models.Secret.expiration > sqlalchemy.bindparam('utcnow'))
+
+
 class SecretRepo(BaseRepo):
     """Repository for the Secret entity."""
 
+    @retry_read_on_disconnect
     def get_by_create_date(self, external_project_id, offset_arg=None,
                            limit_arg=None, name=None, alg=None, mode=None,
                            bits=0, secret_type=None, suppress_exception=False,
-                           session=None):
+                           session=None, marker_arg=None, total_arg=None,
+                           name_prefix=None):
         """Returns a list of secrets
 
         The returned secrets are ordered by the date they were created at
         and paged based on the offset and limit fields. The external_project_id
         is external-to-Barbican value assigned to the project by Keystone.
+
+        Secrets are selected by their name, or by a prefix of it, without
+        regard to case (see models.normalize_secret_name()). For backwards
+        compatibility, a name with '%' wildcards is matched via LIKE, which
+        cannot use an index.
+
+        If a paging marker (see encode_paging_marker()) is provided, the page
+        starts right after the marked secret instead of at the offset.
+
+        The total_arg selects how the total is computed (see _get_page()).
+        Estimated totals come from the project's secret count, so filtered
+        lists fall back to exact totals. The count includes expired secrets
+        (see ProjectEntityCountRepo).
         """
 
         offset, limit = clean_paging_values(offset_arg, limit_arg)
+        marker = clean_paging_marker(marker_arg)
+        total_mode = clean_total_mode(total_arg)
 
         session = self.get_session(session)
         utcnow = timeutils.utcnow()
 
         query = session.query(models.Secret)
-        query = query.order_by(models.Secret.created_at)
+        query = query.options(*_secret_metadata_load_options())
+        query = query.order_by(models.Secret.created_at, models.Secret.id)
         query = query.filter_by(deleted=False)
 
         # Note(john-wood-w): SQLAlchemy requires '== None' below,
@@ -601,7 +1407,9 @@ class SecretRepo(BaseRepo):
                                  models.Secret.expiration > utcnow))
 
         if name:
-            query = query.filter(models.Secret.name.like(name))
+            query = query.filter(_secret_name_filter(name))
+        if name_prefix:
+            query = query.filter(_secret_name_prefix_filter(name_prefix))
         if alg:
             query = query.filter(models.Secret.algorithm.like(alg))
         if mode:
@@ -611,16 +1419,19 @@ class SecretRepo(BaseRepo):
         if secret_type:
             query = query.filter(models.Secret.secret_type == secret_type)
 
-        query = query.join(models.ProjectSecret,
-                           models.Secret.project_assocs)
-        query = query.join(models.Project, models.ProjectSecret.projects)
+        query = query.join(models.Project,
+                           models.Secret.project_id == models.Project.id)
         query = query.filter(models.Project.external_id == external_project_id)
 
-        start = offset
-        end = offset + limit
-        LOG.debug('Retrieving from %s to %s', start, end)
-        total = query.count()
-        entities = query[start:end]
+        def estimate():
+            if name or name_prefix or alg or mode or bits > 0 or secret_type:
+                return None
+            return get_project_entity_count_repository().get_count(
+                external_project_id, models.Secret.__tablename__,
+                session=session)
+
+        entities, total = _get_page(query, models.Secret, offset, limit,
+                                    marker, total_mode, estimate)
         LOG.debug('Number entities retrieved: %s out of %s',
                   len(entities), total
                   )
@@ -636,54 +1447,128 @@ class SecretRepo(BaseRepo):
 
     def _do_build_get_query(self, entity_id, external_project_id, session):
         """Sub-class hook: build a retrieve query."""
-        utcnow = timeutils.utcnow()
-
-        # Note(john-wood-w): SQLAlchemy requires '== None' below,
-        #   not 'is None'.
-        # TODO(jfwood): Performance? Is the many-to-many join needed?
-        expiration_filter = or_(models.Secret.expiration == None,
-                                models.Secret.expiration > utcnow)
-
         query = session.query(models.Secret)
-        query = query.filter_by(id=entity_id, deleted=False)
-        query = query.filter(expiration_filter)
-        query = query.join(models.ProjectSecret, models.Secret.project_assocs)
-        query = query.join(models.Project, models.ProjectSecret.projects)
-        query = query.filter(models.Project.external_id == external_project_id)
+        query = query.filter(models.Secret.id == sqlalchemy.bindparam(
+            'entity_id'))
+        query = query.filter_by(deleted=False)
+        query = query.filter(_secret_not_expired_filter())
+        query = query.join(models.Project,
+                           models.Secret.project_id == models.Project.id)
+        query = query.filter(models.Project.external_id ==
+                             sqlalchemy.bindparam('external_project_id'))
+        query = query.bake('secret_get')
 
-        return query
+        return query.params(entity_id=entity_id,
+                            external_project_id=external_project_id,
+                            utcnow=timeutils.utcnow())
 
     def _do_validate(self, values):
         """Sub-class hook: validate values."""
         pass
 
+    def _do_update_project_counts(self, entity, delta, session):
+        """Sub-class hook: adjust the project's secrets count."""
+        if entity.project_id:
+            get_project_entity_count_repository().update_count(
+                entity.project_id, models.Secret.__tablename__, delta,
+                session=session)
+
     def _build_get_project_entities_query(self, project_id, session):
         """Builds query for retrieving Secrets associated with a given project
 
-        Discovery is done via a ProjectSecret association.
-
         :param project_id: id of barbican project entity
         :param session: existing db session reference.
         """
-        query = session.query(models.Secret).filter_by(deleted=False)
-        query = query.join(models.ProjectSecret, models.Secret.project_assocs)
-        query = query.filter(models.ProjectSecret.project_id == project_id)
-        return query
+        return session.query(models.Secret).filter_by(
+            project_id=project_id).filter_by(deleted=False)
+
+    def _do_bulk_delete_children(self, entity_ids, deleted_at, session):
+        """Sub-class hook: delete the secrets' children in bulk.
 
+        Mirrors models.Secret._do_delete_children.
+        """
+        for model_class in (models.SecretStoreMetadatum,
+                            models.EncryptedDatum,
+                            models.ProjectSecret):
+            query = session.query(model_class).filter_by(deleted=False)
+            query = query.filter(model_class.secret_id.in_(entity_ids))
+            _bulk_soft_delete(query, deleted_at)
+
+        query = session.query(models.ContainerSecret)
+        query = query.filter(models.ContainerSecret.secret_id.in_(entity_ids))
+        query.delete(synchronize_session=False)
+
+        acl_ids = sqlalchemy.select([models.SecretACL.id]).where(
+            models.SecretACL.secret_id.in_(entity_ids))
+        query = session.query(models.SecretACLUser)
+        query = query.filter(models.SecretACLUser.acl_id.in_(acl_ids))
+        query.delete(synchronize_session=False)
+        query = session.query(models.SecretACL)
+        query = query.filter(models.SecretACL.secret_id.in_(entity_ids))
+        query.delete(synchronize_session=False)
+
+    @retry_read_on_disconnect
     def get_secret_by_id(self, entity_id, suppress_exception=False,
                          session=None):
         """Gets secret by its entity id without project id check."""
+        return self._get_secret_by_id(entity_id, suppress_exception,
+                                      session, 'secret_get_by_id')
+
+    @retry_read_on_disconnect
+    def get_secret_for_retrieval(self, entity_id, suppress_exception=False,
+                                 session=None):
+        """Gets secret by its entity id without project id check.
+
+        Everything needed to authorize access to the secret and to return
+        its metadata or payload is loaded along with it, in two queries: its
+        project, ACLs and their users, and encrypted data with its KEK datum
+        in one, and its store metadata in the other.
+        """
+        secret = self._get_secret_by_id(entity_id, suppress_exception,
+                                        session, 'secret_get_for_retrieval',
+                                        _secret_retrieval_load_options())
+        if secret is not None:
+            _load_secret_store_metadata(secret)
+        return secret
+
+    @retry_read_on_disconnect
+    def get_secrets_for_retrieval(self, entity_ids, session=None):
+        """Gets secrets by their entity ids without project id check.
+
+        The secrets are loaded as by get_secret_for_retrieval(), all in two
+        queries. This query is not baked, so their store metadata can be
+        loaded with subqueryload().
+
+        :returns: dict of the secrets found, by entity id. Secrets that are
+                  not found, deleted or expired are left out.
+        """
+        if not entity_ids:
+            return {}
+
         session = self.get_session(session)
-        try:
-            utcnow = timeutils.utcnow()
-            # Note(john-wood-w): SQLAlchemy requires '== None' below,
-            #   not 'is None'.
-            expiration_filter = or_(models.Secret.expiration == None,
-                                    models.Secret.expiration > utcnow)
+        query = session.query(models.Secret)
+        query = query.options(*_secret_retrieval_load_options())
+        query = query.options(sa_orm.subqueryload('secret_store_metadata'))
+        query = query.filter(models.Secret.id.in_(entity_ids))
+        query = query.filter_by(deleted=False)
+        query = query.filter(_secret_not_expired_filter())
+        query = query.params(utcnow=timeutils.utcnow())
 
+        return dict((secret.id, secret) for secret in query.all())
+
+    def _get_secret_by_id(self, entity_id, suppress_exception, session,
+                          bake_key, load_options=()):
+        session = self.get_session(session)
+        try:
             query = session.query(models.Secret)
-            query = query.filter_by(id=entity_id, deleted=False)
-            query = query.filter(expiration_filter)
+            query = query.options(*load_options)
+            query = query.filter(models.Secret.id == sqlalchemy.bindparam(
+                'entity_id'))
+            query = query.filter_by(deleted=False)
+            query = query.filter(_secret_not_expired_filter())
+            query = query.bake(bake_key)
+            query = query.params(entity_id=entity_id,
+                                 utcnow=timeutils.utcnow())
             entity = query.one()
         except sa_orm.exc.NoResultFound:
             entity = None
@@ -696,6 +1581,24 @@ class SecretRepo(BaseRepo):
                         id=entity_id))
         return entity
 
+    def get_expired(self, limit, exclude_ids=None, session=None):
+        """Returns up to limit secrets that have expired, but not deleted.
+
+        The secrets that expired first are returned first, leaving out those
+        with ids in exclude_ids.
+        """
+        session = self.get_session(session)
+
+        query = session.query(models.Secret)
+        query = query.options(*_secret_metadata_load_options())
+        query = query.filter_by(deleted=False)
+        query = query.filter(models.Secret.expiration <= timeutils.utcnow())
+        if exclude_ids:
+            query = query.filter(~models.Secret.id.in_(exclude_ids))
+        query = query.order_by(models.Secret.expiration)
+
+        return query.limit(limit).all()
+
 
 class EncryptedDatumRepo(BaseRepo):
     """Repository for the EncryptedDatum entity
@@ -729,11 +1632,12 @@ class SecretStoreMetadatumRepo(BaseRepo):
         """
         now = timeutils.utcnow()
 
-        for k, v in metadata.items():
-            meta_model = models.SecretStoreMetadatum(k, v)
-            meta_model.updated_at = now
-            meta_model.secret = secret_model
-            meta_model.save()
+        with deferred_flush() as session:
+            for k, v in metadata.items():
+                meta_model = models.SecretStoreMetadatum(k, v)
+                meta_model.updated_at = now
+                meta_model.secret = secret_model
+                meta_model.save(session=session)
 
     def get_metadata_for_secret(self, secret_id):
         """Returns a dict of SecretStoreMetadatum instances."""
@@ -779,40 +1683,102 @@ class KEKDatumRepo(BaseRepo):
                                  plugin_name,
                                  suppress_exception=False,
                                  session=None):
-        """Find or create a KEK datum instance."""
+        """Find or create a KEK datum instance.
+
+        KEK data that their plugin has bound are looked up in the
+        process-local KEK datum cache first (see get_kek_datum_cache()). A
+        project's active KEK datum is only replaced by rotating it, so a
+        cached one is at most as stale as the cache's TTL allows, unless
+        invalidated via invalidate_cache().
+        """
         if not plugin_name:
             raise exception.BarbicanException(
                 u._('Tried to register crypto plugin with null or empty '
                     'name.'))
 
-        kek_datum = None
-
         session = self.get_session(session)
 
-        # TODO(jfwood): Reverse this...attempt insert first, then get on fail.
-        try:
-            query = session.query(models.KEKDatum)
-            query = query.filter_by(project_id=project.id,
-                                    plugin_name=plugin_name,
-                                    active=True,
-                                    deleted=False)
+        values = get_kek_datum_cache().get(project.id, {}).get(plugin_name)
+        if values:
+            return self._attach_cached_kek_datum(values, session)
 
-            kek_datum = query.one()
+        kek_datum = self._find_active_kek_datum(project.id, plugin_name,
+                                                session)
+        if kek_datum is None:
+            kek_datum = self._create_kek_datum(project, plugin_name, session)
+        elif kek_datum.bind_completed:
+            # KEK data created by this (uncommitted) session could still be
+            # rolled back, so only cache those others have committed.
+            if kek_datum.id not in session.info.get('created_kek_ids', ()):
+                self._cache_kek_datum(kek_datum)
 
-        except sa_orm.exc.NoResultFound:
+        return kek_datum
 
-            kek_datum = models.KEKDatum()
+    def invalidate_cache(self, project_id):
+        """Drops the KEK data of the project with the given ID from the cache.
+
+        Must be called once a project's active KEK datum is replaced, such
+        as when rotating it, or deleted.
+        """
+        get_kek_datum_cache().pop(project_id)
+
+    def _find_active_kek_datum(self, project_id, plugin_name, session,
+                               lock=False):
+        query = session.query(models.KEKDatum)
+        query = query.filter_by(project_id=project_id,
+                                plugin_name=plugin_name,
+                                active=True,
+                                deleted=False)
+        if lock:
+            query = query.with_for_update()
+        return query.first()
+
+    def _create_kek_datum(self, project, plugin_name, session):
+        """Creates the project's active KEK datum, unless it exists.
+
+        Projects keep their inactive KEK data, so that a project only has one
+        active KEK datum per plugin cannot be enforced by a unique
+        constraint. The project's row is locked instead, so that concurrent
+        requests creating the KEK datum do so one at a time, with the later
+        ones finding the KEK datum created first.
+        """
+        query = session.query(models.Project.id).filter_by(id=project.id)
+        query.with_for_update().one()
 
-            kek_datum.kek_label = "project-{0}-key-{1}".format(
-                project.external_id, uuid.uuid4())
-            kek_datum.project_id = project.id
-            kek_datum.plugin_name = plugin_name
-            kek_datum.status = models.States.ACTIVE
+        kek_datum = self._find_active_kek_datum(project.id, plugin_name,
+                                                session, lock=True)
+        if kek_datum is not None:
+            return kek_datum
 
-            self.save(kek_datum)
+        kek_datum = models.KEKDatum()
 
+        kek_datum.kek_label = "project-{0}-key-{1}".format(
+            project.external_id, uuid.uuid4())
+        kek_datum.project_id = project.id
+        kek_datum.plugin_name = plugin_name
+        kek_datum.status = models.States.ACTIVE
+
+        self.save(kek_datum)
+
+        session.info.setdefault('created_kek_ids', set()).add(kek_datum.id)
         return kek_datum
 
+    def _cache_kek_datum(self, kek_datum):
+        cache = get_kek_datum_cache()
+        kek_data = dict(cache.get(kek_datum.project_id, {}))
+        kek_data[kek_datum.plugin_name] = {
+            column.key: getattr(kek_datum, column.key)
+            for column in sa_orm.class_mapper(models.KEKDatum).column_attrs}
+        cache.put(kek_datum.project_id, kek_data)
+
+    def _attach_cached_kek_datum(self, values, session):
+        """Attaches a cached KEK datum to the session without a query."""
+        kek_datum = models.KEKDatum()
+        for key, value in values.items():
+            setattr(kek_datum, key, value)
+        sa_orm.make_transient_to_detached(kek_datum)
+        return session.merge(kek_datum, load=False)
+
     def _do_entity_name(self):
         """Sub-class hook: return entity name, such as for debugging."""
         return "KEKDatum"
@@ -862,12 +1828,94 @@ class ProjectSecretRepo(BaseRepo):
             project_id=project_id).filter_by(deleted=False)
 
 
+class ProjectEntityCountRepo(BaseRepo):
+    """Repository for the ProjectEntityCount entity.
+
+    Counts are created along with their project, and are then adjusted as
+    the project's secrets, orders and containers are created and deleted.
+    Counts are only updated in place (never inserted on the fly) so that
+    concurrent requests cannot race to create them; projects predating the
+    counts are backfilled by their migration.
+
+    Note that updating a count locks its row until the transaction ends, so
+    the transactions creating or deleting a project's entities of the same
+    type are serialized. Secret counts also include expired secrets, which
+    secret lists leave out, until they are deleted.
+    """
+
+    COUNTED_MODELS = (models.Secret, models.Order, models.Container)
+
+    def create_counts(self, project_id, session=None):
+        """Creates zeroed entity counts for a new project."""
+        session = self.get_session(session)
+        for model_class in self.COUNTED_MODELS:
+            entity = models.ProjectEntityCount(project_id,
+                                               model_class.__tablename__)
+            session.add(entity)
+
+    def update_count(self, project_id, entity_type, delta, session=None):
+        """Adjusts a project entity count by delta, if it is being kept.
+
+        Within deferred_flush(), the adjustment is only made on leaving it.
+        """
+        session = self.get_session(session)
+        if session.info.get('defer_flush'):
+            deferred_counts = session.info['deferred_counts']
+            key = (project_id, entity_type)
+            deferred_counts[key] = deferred_counts.get(key, 0) + delta
+            return
+
+        query = session.query(models.ProjectEntityCount)
+        query = query.filter_by(project_id=project_id,
+                                entity_type=entity_type)
+        query.update(
+            {models.ProjectEntityCount.entity_count:
+                models.ProjectEntityCount.entity_count + delta},
+            synchronize_session=False)
+
+    def get_count(self, external_project_id, entity_type, session=None):
+        """Returns a project entity count, or None if it is not being kept."""
+        session = self.get_session(session)
+        query = session.query(models.ProjectEntityCount.entity_count)
+        query = query.join(models.Project,
+                           models.ProjectEntityCount.project_id ==
+                           models.Project.id)
+        query = query.filter(models.Project.external_id == external_project_id)
+        query = query.filter(
+            models.ProjectEntityCount.entity_type == entity_type)
+        count = query.scalar()
+        return None if count is None else max(count, 0)
+
+    def _do_entity_name(self):
+        """Sub-class hook: return entity name, such as for debugging."""
+        return "ProjectEntityCount"
+
+    def _do_build_get_query(self, entity_id, external_project_id, session):
+        """Sub-class hook: build a retrieve query."""
+        return session.query(models.ProjectEntityCount).filter_by(
+            id=entity_id)
+
+    def _do_validate(self, values):
+        """Sub-class hook: validate values."""
+        pass
+
+    def _build_get_project_entities_query(self, project_id, session):
+        """Builds query for retrieving counts related to given project.
+
+        :param project_id: id of barbican project entity
+        :param session: existing db session reference.
+        """
+        return session.query(models.ProjectEntityCount).filter_by(
+            project_id=project_id)
+
+
 class OrderRepo(BaseRepo):
     """Repository for the Order entity."""
 
+    @retry_read_on_disconnect
     def get_by_create_date(self, external_project_id, offset_arg=None,
                            limit_arg=None, suppress_exception=False,
-                           session=None):
+                           session=None, marker_arg=None, total_arg=None):
         """Returns a list of orders
 
         The list is ordered by the date they were created at and paged
@@ -880,25 +1928,34 @@ class OrderRepo(BaseRepo):
         :param suppress_exception: Whether NoResultFound exceptions should be
                                    suppressed.
         :param session: SQLAlchemy session object.
+        :param marker_arg: Optional paging marker. If valid, the result set
+                           starts right after the marked entity rather than
+                           at the offset.
+        :param total_arg: How to compute the total: 'exact' (the default),
+                          'estimate' or 'none'. See _get_page().
 
         :returns: Tuple consisting of (list_of_entities, offset, limit, total).
         """
 
         offset, limit = clean_paging_values(offset_arg, limit_arg)
+        marker = clean_paging_marker(marker_arg)
+        total_mode = clean_total_mode(total_arg)
 
         session = self.get_session(session)
 
         query = session.query(models.Order)
-        query = query.order_by(models.Order.created_at)
+        query = query.order_by(models.Order.created_at, models.Order.id)
         query = query.filter_by(deleted=False)
         query = query.join(models.Project, models.Order.project)
         query = query.filter(models.Project.external_id == external_project_id)
 
-        start = offset
-        end = offset + limit
-        LOG.debug('Retrieving from %s to %s', start, end)
-        total = query.count()
-        entities = query[start:end]
+        def estimate():
+            return get_project_entity_count_repository().get_count(
+                external_project_id, models.Order.__tablename__,
+                session=session)
+
+        entities, total = _get_page(query, models.Order, offset, limit,
+                                    marker, total_mode, estimate)
         LOG.debug('Number entities retrieved: %s out of %s',
                   len(entities), total
                   )
@@ -924,6 +1981,12 @@ class OrderRepo(BaseRepo):
         """Sub-class hook: validate values."""
         pass
 
+    def _do_update_project_counts(self, entity, delta, session):
+        """Sub-class hook: adjust the project's orders count."""
+        get_project_entity_count_repository().update_count(
+            entity.project_id, models.Order.__tablename__, delta,
+            session=session)
+
     def _build_get_project_entities_query(self, project_id, session):
         """Builds query for retrieving orders related to given project.
 
@@ -946,13 +2009,13 @@ class OrderPluginMetadatumRepo(BaseRepo):
         :raises NotFound if entity does not exist.
         """
         now = timeutils.utcnow()
-        session = get_session()
 
-        for k, v in metadata.items():
-            meta_model = models.OrderPluginMetadatum(k, v)
-            meta_model.updated_at = now
-            meta_model.order = order_model
-            meta_model.save(session=session)
+        with deferred_flush() as session:
+            for k, v in metadata.items():
+                meta_model = models.OrderPluginMetadatum(k, v)
+                meta_model.updated_at = now
+                meta_model.order = order_model
+                meta_model.save(session=session)
 
     def get_metadata_for_order(self, order_id):
         """Returns a dict of OrderPluginMetadatum instances."""
@@ -999,13 +2062,13 @@ class OrderBarbicanMetadatumRepo(BaseRepo):
         :raises NotFound if entity does not exist.
         """
         now = timeutils.utcnow()
-        session = get_session()
 
-        for k, v in metadata.items():
-            meta_model = models.OrderBarbicanMetadatum(k, v)
-            meta_model.updated_at = now
-            meta_model.order = order_model
-            meta_model.save(session=session)
+        with deferred_flush() as session:
+            for k, v in metadata.items():
+                meta_model = models.OrderBarbicanMetadatum(k, v)
+                meta_model.updated_at = now
+                meta_model.order = order_model
+                meta_model.save(session=session)
 
     def get_metadata_for_order(self, order_id):
         """Returns a dict of OrderBarbicanMetadatum instances."""
@@ -1108,31 +2171,43 @@ class OrderRetryTaskRepo(BaseRepo):
 class ContainerRepo(BaseRepo):
     """Repository for the Container entity."""
 
+    @retry_read_on_disconnect
     def get_by_create_date(self, external_project_id, offset_arg=None,
                            limit_arg=None, suppress_exception=False,
-                           session=None):
+                           session=None, marker_arg=None, total_arg=None):
         """Returns a list of containers
 
         The list is ordered by the date they were created at and paged
         based on the offset and limit fields. The external_project_id is
         external-to-Barbican value assigned to the project by Keystone.
+
+        If a paging marker (see encode_paging_marker()) is provided, the page
+        starts right after the marked container instead of at the offset.
+
+        The total_arg selects how the total is computed (see _get_page()).
         """
 
         offset, limit = clean_paging_values(offset_arg, limit_arg)
+        marker = clean_paging_marker(marker_arg)
+        total_mode = clean_total_mode(total_arg)
 
         session = self.get_session(session)
 
         query = session.query(models.Container)
-        query = query.order_by(models.Container.created_at)
+        query = query.options(*_container_list_load_options())
+        query = query.order_by(models.Container.created_at,
+                               models.Container.id)
         query = query.filter_by(deleted=False)
         query = query.join(models.Project, models.Container.project)
         query = query.filter(models.Project.external_id == external_project_id)
 
-        start = offset
-        end = offset + limit
-        LOG.debug('Retrieving from %s to %s', start, end)
-        total = query.count()
-        entities = query[start:end]
+        def estimate():
+            return get_project_entity_count_repository().get_count(
+                external_project_id, models.Container.__tablename__,
+                session=session)
+
+        entities, total = _get_page(query, models.Container, offset, limit,
+                                    marker, total_mode, estimate)
         LOG.debug('Number entities retrieved: %s out of %s',
                   len(entities), total
                   )
@@ -1149,15 +2224,26 @@ class ContainerRepo(BaseRepo):
     def _do_build_get_query(self, entity_id, external_project_id, session):
         """Sub-class hook: build a retrieve query."""
         query = session.query(models.Container)
-        query = query.filter_by(id=entity_id, deleted=False)
+        query = query.filter(models.Container.id == sqlalchemy.bindparam(
+            'entity_id'))
+        query = query.filter_by(deleted=False)
         query = query.join(models.Project, models.Container.project)
-        query = query.filter(models.Project.external_id == external_project_id)
-        return query
+        query = query.filter(models.Project.external_id ==
+                             sqlalchemy.bindparam('external_project_id'))
+        query = query.bake('container_get')
+        return query.params(entity_id=entity_id,
+                            external_project_id=external_project_id)
 
     def _do_validate(self, values):
         """Sub-class hook: validate values."""
         pass
 
+    def _do_update_project_counts(self, entity, delta, session):
+        """Sub-class hook: adjust the project's containers count."""
+        get_project_entity_count_repository().update_count(
+            entity.project_id, models.Container.__tablename__, delta,
+            session=session)
+
     def _build_get_project_entities_query(self, project_id, session):
         """Builds query for retrieving container related to given project.
 
@@ -1167,13 +2253,37 @@ class ContainerRepo(BaseRepo):
         return session.query(models.Container).filter_by(
             deleted=False).filter_by(project_id=project_id)
 
+    def _do_bulk_delete_children(self, entity_ids, deleted_at, session):
+        """Sub-class hook: delete the containers' children in bulk.
+
+        Mirrors models.Container._do_delete_children.
+        """
+        query = session.query(models.ContainerSecret)
+        query = query.filter(
+            models.ContainerSecret.container_id.in_(entity_ids))
+        query.delete(synchronize_session=False)
+
+        acl_ids = sqlalchemy.select([models.ContainerACL.id]).where(
+            models.ContainerACL.container_id.in_(entity_ids))
+        query = session.query(models.ContainerACLUser)
+        query = query.filter(models.ContainerACLUser.acl_id.in_(acl_ids))
+        query.delete(synchronize_session=False)
+        query = session.query(models.ContainerACL)
+        query = query.filter(models.ContainerACL.container_id.in_(entity_ids))
+        query.delete(synchronize_session=False)
+
+    @retry_read_on_disconnect
     def get_container_by_id(self, entity_id, suppress_exception=False,
                             session=None):
         """Gets container by its entity id without project id check."""
         session = self.get_session(session)
         try:
             query = session.query(models.Container)
-            query = query.filter_by(id=entity_id, deleted=False)
+            query = query.filter(models.Container.id == sqlalchemy.bindparam(
+                'entity_id'))
+            query = query.filter_by(deleted=False)
+            query = query.bake('container_get_by_id')
+            query = query.params(entity_id=entity_id)
             entity = query.one()
         except sa_orm.exc.NoResultFound:
             entity = None
@@ -1702,9 +2812,11 @@ class SecretACLRepo(BaseRepo):
         session = self.get_session(session)
 
         query = session.query(models.SecretACL)
-        query = query.filter_by(secret_id=secret_id)
+        query = query.filter(models.SecretACL.secret_id ==
+                             sqlalchemy.bindparam('secret_id'))
+        query = query.bake('secret_acls_by_secret_id')
 
-        return query.all()
+        return query.params(secret_id=secret_id).all()
 
     def create_or_replace_from(self, secret, secret_acl, user_ids=None,
                                session=None):
@@ -1797,8 +2909,10 @@ class ContainerACLRepo(BaseRepo):
 
         session = self.get_session(session)
         query = session.query(models.ContainerACL)
-        query = query.filter_by(container_id=container_id)
-        return query.all()
+        query = query.filter(models.ContainerACL.container_id ==
+                             sqlalchemy.bindparam('container_id'))
+        query = query.bake('container_acls_by_container_id')
+        return query.params(container_id=container_id).all()
 
     def create_or_replace_from(self, container, container_acl,
                                user_ids=None, session=None):
@@ -1950,6 +3064,13 @@ def get_project_ca_repository():
                            ProjectCertificateAuthorityRepo)
 
 
+def get_project_entity_count_repository():
+    """Returns a singleton ProjectEntityCount repository instance."""
+    global _PROJECT_ENTITY_COUNT_REPOSITORY
+    return _get_repository(_PROJECT_ENTITY_COUNT_REPOSITORY,
+                           ProjectEntityCountRepo)
+
+
 def get_project_secret_repository():
     """Returns a singleton ProjectSecret repository instance."""
     global _PROJECT_SECRET_REPOSITORY
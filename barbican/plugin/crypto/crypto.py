@@ -265,6 +265,26 @@ class CryptoPluginBase(object):
         """
         raise NotImplementedError  # pragma: no cover
 
+    def encrypt_batch(self, encrypt_dtos, kek_meta_dto, project_id):
+        """Encrypt several secrets with the same Key Encryption Key (KEK).
+
+        By default, each secret is encrypted in turn with :meth:`encrypt`.
+        Plugins may override this method to set up the KEK, or any other
+        resources, only once for the whole batch.
+
+        :param encrypt_dtos: List of :class:`EncryptDTO` instances containing
+            the raw secret byte data to be encrypted.
+        :param kek_meta_dto: :class:`KEKMetaDTO` instance containing
+            information about the project's KEK to be used for encryption,
+            as for :meth:`encrypt`.
+        :param project_id: Project ID associated with the unencrypted data.
+        :return: A list of response DTOs, one for each of encrypt_dtos in the
+            same order.
+        :rtype: list of :class:`ResponseDTO`
+        """
+        return [self.encrypt(encrypt_dto, kek_meta_dto, project_id)
+                for encrypt_dto in encrypt_dtos]
+
     @abc.abstractmethod
     def decrypt(self, decrypt_dto, kek_meta_dto, kek_meta_extended,
                 project_id):
@@ -281,6 +301,28 @@ class CryptoPluginBase(object):
         """
         raise NotImplementedError  # pragma: no cover
 
+    def decrypt_batch(self, decrypt_dtos, kek_meta_dto, kek_meta_extended_list,
+                      project_id):
+        """Decrypt several secrets encrypted with the same KEK.
+
+        By default, each secret is decrypted in turn with :meth:`decrypt`.
+        Plugins may override this method to set up the KEK, or any other
+        resources, only once for the whole batch.
+
+        :param decrypt_dtos: List of data transfer objects containing the
+               cyphertexts to be decrypted.
+        :param kek_meta_dto: Key encryption key metadata to use for decryption
+        :param kek_meta_extended_list: List of the optional per-secret KEK
+            metadata to use for decryption, one for each of decrypt_dtos.
+        :param project_id: Project ID associated with the encrypted data.
+        :returns: list -- unencrypted byte data, one for each of decrypt_dtos
+            in the same order.
+        """
+        return [self.decrypt(decrypt_dto, kek_meta_dto, kek_meta_extended,
+                             project_id)
+                for decrypt_dto, kek_meta_extended
+                in zip(decrypt_dtos, kek_meta_extended_list)]
+
     @abc.abstractmethod
     def bind_kek_metadata(self, kek_meta_dto):
         """Key Encryption Key Metadata binding function
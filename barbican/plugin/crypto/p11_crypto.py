@@ -40,6 +40,30 @@ p11_crypto_plugin_opts = [
     cfg.IntOpt('slot_id',
                help=u._('HSM Slot ID'),
                default=1),
+    cfg.IntOpt('session_pool_size',
+               help=u._('Maximum number of idle logged in HSM sessions kept '
+                        'open for reuse by later operations. Set to 0 to '
+                        'open a session per operation.'),
+               default=4),
+    cfg.IntOpt('session_check_interval',
+               help=u._('Seconds a pooled HSM session may be idle before it '
+                        'is checked to still be usable, before being '
+                        'reused.'),
+               default=60),
+    cfg.IntOpt('session_max_open',
+               help=u._('Maximum number of HSM sessions open at once, idle '
+                        'or in use. Set to 0 for no limit.'),
+               default=0),
+    cfg.IntOpt('session_wait_timeout',
+               help=u._('Seconds an operation waits for an HSM session when '
+                        'session_max_open sessions are in use, before '
+                        'failing.'),
+               default=30),
+    cfg.IntOpt('unwrapped_key_cache_size',
+               help=u._('Maximum number of unwrapped project keys kept in '
+                        'each HSM session for reuse by later operations. '
+                        'At least one is always kept.'),
+               default=16),
 ]
 CONF.register_group(p11_crypto_plugin_group)
 CONF.register_opts(p11_crypto_plugin_opts, group=p11_crypto_plugin_group)
@@ -66,13 +90,29 @@ class P11CryptoPlugin(plugin.CryptoPluginBase):
             hmac_label=conf.p11_crypto_plugin.hmac_label,
             login_passphrase=conf.p11_crypto_plugin.login,
             slot_id=conf.p11_crypto_plugin.slot_id,
-            ffi=ffi
+            ffi=ffi,
+            session_pool_size=conf.p11_crypto_plugin.session_pool_size,
+            session_check_interval=(
+                conf.p11_crypto_plugin.session_check_interval),
+            session_max_open=conf.p11_crypto_plugin.session_max_open,
+            session_wait_timeout=conf.p11_crypto_plugin.session_wait_timeout,
+            unwrapped_key_cache_size=(
+                conf.p11_crypto_plugin.unwrapped_key_cache_size)
         )
 
     def encrypt(self, encrypt_dto, kek_meta_dto, project_id):
-        session = self.pkcs11.create_working_session()
+        return self.encrypt_batch([encrypt_dto], kek_meta_dto, project_id)[0]
 
+    def encrypt_batch(self, encrypt_dtos, kek_meta_dto, project_id):
+        return self.pkcs11.run_with_session(self._encrypt_batch, encrypt_dtos,
+                                            kek_meta_dto)
+
+    def _encrypt_batch(self, session, encrypt_dtos, kek_meta_dto):
         key = self.pkcs11.unwrap_key(kek_meta_dto.plugin_meta, session)
+        return [self._encrypt(session, key, encrypt_dto)
+                for encrypt_dto in encrypt_dtos]
+
+    def _encrypt(self, session, key, encrypt_dto):
         iv = self.pkcs11.generate_random(16, session)
         ck_mechanism = self.pkcs11.build_gcm_mech(iv)
 
@@ -95,15 +135,27 @@ class P11CryptoPlugin(plugin.CryptoPluginBase):
             'iv': base64.b64encode(self.pkcs11.ffi.buffer(iv)[:])
         })
 
-        self.pkcs11.close_session(session)
-
         return plugin.ResponseDTO(cyphertext, kek_meta_extended)
 
     def decrypt(self, decrypt_dto, kek_meta_dto, kek_meta_extended,
                 project_id):
-        session = self.pkcs11.create_working_session()
+        return self.decrypt_batch([decrypt_dto], kek_meta_dto,
+                                  [kek_meta_extended], project_id)[0]
+
+    def decrypt_batch(self, decrypt_dtos, kek_meta_dto, kek_meta_extended_list,
+                      project_id):
+        return self.pkcs11.run_with_session(self._decrypt_batch, decrypt_dtos,
+                                            kek_meta_dto,
+                                            kek_meta_extended_list)
 
+    def _decrypt_batch(self, session, decrypt_dtos, kek_meta_dto,
+                       kek_meta_extended_list):
         key = self.pkcs11.unwrap_key(kek_meta_dto.plugin_meta, session)
+        return [self._decrypt(session, key, decrypt_dto, kek_meta_extended)
+                for decrypt_dto, kek_meta_extended
+                in zip(decrypt_dtos, kek_meta_extended_list)]
+
+    def _decrypt(self, session, key, decrypt_dto, kek_meta_extended):
         meta_extended = json.loads(kek_meta_extended)
         iv = base64.b64decode(meta_extended['iv'])
         iv = self.pkcs11.ffi.new("CK_BYTE[]", iv)
@@ -124,20 +176,19 @@ class P11CryptoPlugin(plugin.CryptoPluginBase):
         )
         self.pkcs11.check_error(rv)
 
-        self.pkcs11.close_session(session)
         return self.pkcs11.unpad(self.pkcs11.ffi.buffer(pt, pt_len[0])[:])
 
     def bind_kek_metadata(self, kek_meta_dto):
         # Enforce idempotency: If we've already generated a key leave now.
         if not kek_meta_dto.plugin_meta:
-            session = self.pkcs11.create_working_session()
-
             kek_length = 32
             kek_meta_dto.plugin_meta = json.dumps(
-                self.pkcs11.generate_wrapped_kek(
-                    kek_meta_dto.kek_label,
-                    kek_length,
-                    session
+                self.pkcs11.run_with_session(
+                    lambda session: self.pkcs11.generate_wrapped_kek(
+                        kek_meta_dto.kek_label,
+                        kek_length,
+                        session
+                    )
                 )
             )
             # To be persisted by Barbican:
@@ -145,16 +196,12 @@ class P11CryptoPlugin(plugin.CryptoPluginBase):
             kek_meta_dto.bit_length = kek_length * 8
             kek_meta_dto.mode = 'CBC'
 
-            # Clean up
-            self.pkcs11.close_session(session)
-
         return kek_meta_dto
 
     def generate_symmetric(self, generate_dto, kek_meta_dto, project_id):
         byte_length = generate_dto.bit_length / 8
-        session = self.pkcs11.create_working_session()
-        buf = self.pkcs11.generate_random(byte_length, session)
-        self.pkcs11.close_session(session)
+        buf = self.pkcs11.run_with_session(
+            lambda session: self.pkcs11.generate_random(byte_length, session))
         rand = self.pkcs11.ffi.buffer(buf)[:]
         assert len(rand) == byte_length
         return self.encrypt(plugin.EncryptDTO(rand), kek_meta_dto, project_id)
@@ -12,10 +12,14 @@
 
 import base64
 import collections
+import hashlib
 import textwrap
+import threading
+import time
 
 import cffi
 from cryptography.hazmat.primitives import padding
+import six
 
 from barbican.common import exception
 from barbican.common import utils
@@ -29,11 +33,30 @@ CKAttributes = collections.namedtuple("CKAttributes", ["template", "cffivals"])
 CKMechanism = collections.namedtuple("CKMechanism", ["mech", "cffivals"])
 
 CKR_OK = 0
+CKR_DEVICE_ERROR = 0x30
+CKR_DEVICE_REMOVED = 0x32
+CKR_SESSION_CLOSED = 0xb0
+CKR_SESSION_HANDLE_INVALID = 0xb3
+CKR_TOKEN_NOT_PRESENT = 0xe0
+CKR_USER_ALREADY_LOGGED_IN = 0x100
+CKR_USER_NOT_LOGGED_IN = 0x101
 CKF_RW_SESSION = (1 << 1)
 CKF_SERIAL_SESSION = (1 << 2)
+CKS_RW_USER_FUNCTIONS = 3
 CKU_SO = 0
 CKU_USER = 1
 
+# Response codes meaning that a session can no longer be used, nor likely
+# any other session open on the device, such as after an HSM restart.
+SESSION_ERROR_CODES = frozenset([
+    CKR_DEVICE_ERROR,
+    CKR_DEVICE_REMOVED,
+    CKR_SESSION_CLOSED,
+    CKR_SESSION_HANDLE_INVALID,
+    CKR_TOKEN_NOT_PRESENT,
+    CKR_USER_NOT_LOGGED_IN,
+])
+
 CKO_SECRET_KEY = 4
 CKK_AES = 0x1f
 
@@ -225,6 +248,7 @@ def build_ffi():
     typedef unsigned long CK_SLOT_ID;
     typedef unsigned long CK_FLAGS;
     typedef unsigned long CK_USER_TYPE;
+    typedef unsigned long CK_STATE;
     typedef unsigned char * CK_UTF8CHAR_PTR;
     typedef ... *CK_NOTIFY;
 
@@ -248,6 +272,13 @@ def build_ffi():
     typedef CK_BYTE *CK_BYTE_PTR;
     typedef CK_ULONG *CK_ULONG_PTR;
 
+    typedef struct CK_SESSION_INFO {
+        CK_SLOT_ID slotID;
+        CK_STATE state;
+        CK_FLAGS flags;
+        CK_ULONG ulDeviceError;
+    } CK_SESSION_INFO;
+
     typedef struct CK_AES_GCM_PARAMS {
         char * pIv;
         unsigned long ulIvLen;
@@ -263,6 +294,7 @@ def build_ffi():
     CK_RV C_OpenSession(CK_SLOT_ID, CK_FLAGS, void *, CK_NOTIFY,
                         CK_SESSION_HANDLE *);
     CK_RV C_CloseSession(CK_SESSION_HANDLE);
+    CK_RV C_GetSessionInfo(CK_SESSION_HANDLE, CK_SESSION_INFO *);
     CK_RV C_Login(CK_SESSION_HANDLE, CK_USER_TYPE, CK_UTF8CHAR_PTR,
                   CK_ULONG);
     CK_RV C_FindObjectsInit(CK_SESSION_HANDLE, CK_ATTRIBUTE *, CK_ULONG);
@@ -293,6 +325,7 @@ def build_ffi():
     CK_RV C_Verify(CK_SESSION_HANDLE, CK_BYTE_PTR, CK_ULONG, CK_BYTE_PTR,
                    CK_ULONG);
     CK_RV C_GenerateRandom(CK_SESSION_HANDLE, CK_BYTE_PTR, CK_ULONG);
+    CK_RV C_DestroyObject(CK_SESSION_HANDLE, CK_OBJECT_HANDLE);
     """))
     return ffi
 
@@ -309,13 +342,50 @@ class P11CryptoKeyHandleException(exception.BarbicanException):
     message = u._("No key handle was found")
 
 
+class P11CryptoSessionException(P11CryptoPluginException):
+    message = u._("HSM session is no longer usable")
+
+
 class PKCS11(object):
+    """Wraps a vendor PKCS11 library.
+
+    Logged in sessions are pooled, so that operations need not open and log
+    into a session each (see run_with_session()). Up to session_pool_size
+    sessions are kept open while idle. Those idle for more than
+    session_check_interval seconds are checked to still be usable before
+    being reused. If session_max_open is set, no more sessions than that
+    are open at once; operations wait up to session_wait_timeout seconds
+    for one to be returned.
+
+    Project keys unwrapped in a session are kept, up to
+    unwrapped_key_cache_size of them (and at least one) per session, so
+    that operations with the same project key in the same session need not
+    unwrap it again (see unwrap_key()).
+    """
 
     def __init__(self, library_path, mkek_label, mkek_length, hmac_label,
-                 login_passphrase, slot_id, ffi=None):
+                 login_passphrase, slot_id, ffi=None, session_pool_size=0,
+                 session_check_interval=60, session_max_open=0,
+                 session_wait_timeout=30, unwrapped_key_cache_size=16):
         self.ffi = build_ffi() if not ffi else ffi
         self.lib = self.ffi.dlopen(library_path)
 
+        self.session_pool_size = session_pool_size
+        self.session_check_interval = session_check_interval
+        self.session_max_open = session_max_open
+        self.session_wait_timeout = session_wait_timeout
+        # Idle sessions, with the time each was returned to the pool, the
+        # most recently returned last.
+        self._idle_sessions = collections.deque()
+        # Number of sessions open through get_session(), idle or not.
+        self._open_session_count = 0
+        self._pool_condition = threading.Condition()
+
+        self.unwrapped_key_cache_size = max(1, unwrapped_key_cache_size)
+        # Handles of the project keys unwrapped in each open session, by the
+        # digest of their plugin meta.
+        self._unwrapped_keys = {}
+
         # TODO(reaperhulk): abstract this so alternate algorithms/vendors
         # are possible.
         self.algorithm = VENDOR_SAFENET_CKM_AES_GCM
@@ -327,7 +397,7 @@ class PKCS11(object):
         self.check_error(self.lib.C_Initialize(self.ffi.NULL))
 
         # Open session to perform self-test and get/generate mkek and hmac
-        session = self.create_working_session()
+        session = self.get_session()
         self.perform_rng_self_test(session)
 
         self.current_mkek_label = mkek_label
@@ -342,8 +412,8 @@ class PKCS11(object):
         )
         self.get_hmac_key(self.current_hmac_label, session)
 
-        # Clean up the active session
-        self.close_session(session)
+        # Keep the session for later operations
+        self.return_session(session)
 
     def perform_rng_self_test(self, session):
         test_random = self.generate_random(100, session)
@@ -364,6 +434,8 @@ class PKCS11(object):
         return session
 
     def close_session(self, session):
+        # Session objects, such as unwrapped keys, go with their session.
+        self._unwrapped_keys.pop(session, None)
         rv = self.lib.C_CloseSession(session)
         self.check_error(rv)
 
@@ -374,7 +446,10 @@ class PKCS11(object):
             password,
             len(password)
         )
-        self.check_error(rv)
+        # The login state is shared by all of the application's sessions,
+        # such as those kept open in the session pool.
+        if rv != CKR_USER_ALREADY_LOGGED_IN:
+            self.check_error(rv)
 
     def create_working_session(self):
         """Automatically opens a session and performs a login."""
@@ -382,9 +457,117 @@ class PKCS11(object):
         self.login(self.login_passphrase, session)
         return session
 
+    def get_session(self):
+        """Returns a logged in session, from the pool if there is one.
+
+        Sessions are to be handed back via return_session(), or closed via
+        run_with_session(), so that they count as open until then.
+
+        :raises P11CryptoPluginException: if session_max_open sessions stay
+            open for session_wait_timeout seconds.
+        """
+        deadline = time.time() + self.session_wait_timeout
+        while True:
+            with self._pool_condition:
+                while (not self._idle_sessions and self.session_max_open and
+                       self._open_session_count >= self.session_max_open):
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise P11CryptoPluginException(u._(
+                            "Timed out waiting for one of the {count} open "
+                            "HSM sessions").format(
+                                count=self.session_max_open))
+                    self._pool_condition.wait(remaining)
+                if not self._idle_sessions:
+                    self._open_session_count += 1
+                    break
+                session, idle_since = self._idle_sessions.pop()
+            if (time.time() - idle_since < self.session_check_interval or
+                    self._is_session_usable(session)):
+                return session
+            LOG.debug("Discarding unusable pooled HSM session")
+            self._close_session_quietly(session)
+
+        try:
+            return self.create_working_session()
+        except Exception:
+            self._session_closed()
+            raise
+
+    def return_session(self, session):
+        """Returns a session to the pool, or closes it if the pool is full."""
+        with self._pool_condition:
+            if len(self._idle_sessions) < self.session_pool_size:
+                self._idle_sessions.append((session, time.time()))
+                self._pool_condition.notify()
+                return
+        try:
+            self.close_session(session)
+        finally:
+            self._session_closed()
+
+    def discard_idle_sessions(self):
+        """Closes all of the sessions in the pool."""
+        with self._pool_condition:
+            sessions = [session for session, _ in self._idle_sessions]
+            self._idle_sessions.clear()
+        for session in sessions:
+            self._close_session_quietly(session)
+
+    def run_with_session(self, operation, *args, **kwargs):
+        """Runs operation(session, *args, **kwargs) with a pooled session.
+
+        A session that fails is closed rather than returned to the pool, as
+        it may be left with an operation in progress. If the failure shows
+        the session to be unusable, such as once the HSM restarts, the idle
+        sessions are closed too, and the operation is retried once with a
+        new session.
+        """
+        retry = True
+        while True:
+            session = self.get_session()
+            try:
+                result = operation(session, *args, **kwargs)
+            except P11CryptoSessionException:
+                self._close_session_quietly(session)
+                self.discard_idle_sessions()
+                if not retry:
+                    raise
+                LOG.warning(u._LW("HSM session is no longer usable, "
+                                  "retrying with a new session"))
+                retry = False
+            except Exception:
+                self._close_session_quietly(session)
+                raise
+            else:
+                self.return_session(session)
+                return result
+
+    def _is_session_usable(self, session):
+        session_info = self.ffi.new("CK_SESSION_INFO *")
+        rv = self.lib.C_GetSessionInfo(session, session_info)
+        return rv == CKR_OK and session_info.state == CKS_RW_USER_FUNCTIONS
+
+    def _close_session_quietly(self, session):
+        self._unwrapped_keys.pop(session, None)
+        rv = self.lib.C_CloseSession(session)
+        self._session_closed()
+        if rv != CKR_OK:
+            LOG.debug("Closing HSM session returned response code: %s",
+                      hex(rv))
+
+    def _session_closed(self):
+        with self._pool_condition:
+            self._open_session_count -= 1
+            self._pool_condition.notify()
+
     def check_error(self, value):
         if value != CKR_OK:
-            raise P11CryptoPluginException(u._(
+            if value in SESSION_ERROR_CODES:
+                exception_class = P11CryptoSessionException
+            else:
+                exception_class = P11CryptoPluginException
+            raise exception_class(u._(
                 "HSM returned response code: {hex_value} {code}").format(
                     hex_value=hex(value),
                     code=ERROR_CODES.get(value, 'CKR_????')
@@ -505,6 +688,7 @@ class PKCS11(object):
         rv = self.lib.C_FindObjectsFinal(session)
         self.check_error(rv)
         if returned_count[0] == 1:
+            self.key_handles[mkek_label] = key
             return key
         elif returned_count[0] == 0:
             return None
@@ -578,6 +762,7 @@ class PKCS11(object):
         self.check_error(rv)
         wrapped_key = self.ffi.buffer(buf, buf_len[0])[:]
         hmac = self.compute_hmac(wrapped_key, session)
+        self.destroy_object(kek, session)
         return {
             'iv': base64.b64encode(self.ffi.buffer(iv)[:]),
             'wrapped_key': base64.b64encode(wrapped_key),
@@ -616,9 +801,43 @@ class PKCS11(object):
     def unwrap_key(self, plugin_meta, session):
         """Unwraps byte string to key handle in HSM.
 
+        The key is only unwrapped, and its HMAC verified, the first time it
+        is used in the session. Its handle is then kept until it is evicted
+        from the session's unwrapped keys, when it is destroyed, or the
+        session is closed.
+
         :param plugin_meta: kek_meta_dto plugin meta (json string)
         :returns: Key handle from HSM. No unencrypted bytes.
         """
+        if isinstance(plugin_meta, six.text_type):
+            digest = hashlib.sha256(plugin_meta.encode('utf-8')).digest()
+        else:
+            digest = hashlib.sha256(plugin_meta).digest()
+
+        unwrapped_keys = self._get_unwrapped_keys(session)
+        key = unwrapped_keys.get(digest)
+        if key is None:
+            key = self._unwrap_key(plugin_meta, session)
+            unwrapped_keys.put(digest, key)
+        return key
+
+    def _get_unwrapped_keys(self, session):
+        unwrapped_keys = self._unwrapped_keys.get(session)
+        if unwrapped_keys is None:
+            unwrapped_keys = utils.LRUCache(
+                self.unwrapped_key_cache_size,
+                on_evict=lambda key: self._destroy_object_quietly(session,
+                                                                  key))
+            self._unwrapped_keys[session] = unwrapped_keys
+        return unwrapped_keys
+
+    def _destroy_object_quietly(self, session, object_handle):
+        rv = self.lib.C_DestroyObject(session, object_handle)
+        if rv != CKR_OK:
+            LOG.debug("Destroying HSM session object returned response "
+                      "code: %s", hex(rv))
+
+    def _unwrap_key(self, plugin_meta, session):
         meta = json.loads(plugin_meta)
         iv = base64.b64decode(meta['iv'])
         hmac = base64.b64decode(meta['hmac'])
@@ -656,6 +875,16 @@ class PKCS11(object):
 
         return unwrapped[0]
 
+    def destroy_object(self, obj_handle, session):
+        """Destroys a key, such as the KEK from generate_wrapped_kek().
+
+        Keys that are not persistent only last as long as the session they
+        were created in, but pooled sessions are kept open. (Sessions that
+        fail are closed instead, taking their keys with them.)
+        """
+        rv = self.lib.C_DestroyObject(session, obj_handle)
+        self.check_error(rv)
+
     def pad(self, unencrypted):
         padder = padding.PKCS7(self.block_size * 8).padder()
         return padder.update(unencrypted) + padder.finalize()
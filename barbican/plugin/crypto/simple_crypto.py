@@ -10,74 +10,208 @@
 # implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import base64
+import hashlib
 import os
 
 from Crypto.PublicKey import DSA
 from Crypto.PublicKey import RSA
 from Crypto.Util import asn1
 from cryptography import fernet
+from cryptography.hazmat import backends
+from cryptography.hazmat.primitives import ciphers
+from cryptography.hazmat.primitives.ciphers import algorithms
+from cryptography.hazmat.primitives.ciphers import modes
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf import hkdf
 from oslo_config import cfg
 import six
 
 from barbican.common import config
+from barbican.common import utils
 from barbican import i18n as u
 from barbican.plugin.crypto import crypto as c
 
 
 CONF = config.new_config()
 
+# Ciphers that secrets may be encrypted with.
+AES_256_GCM = 'aes-256-gcm'
+FERNET = 'fernet'
+
 simple_crypto_plugin_group = cfg.OptGroup(name='simple_crypto_plugin',
                                           title="Simple Crypto Plugin Options")
 simple_crypto_plugin_opts = [
     cfg.StrOpt('kek',
                default=b'dGhpcnR5X3R3b19ieXRlX2tleWJsYWhibGFoYmxhaGg=',
                help=u._('Key encryption key to be used by Simple Crypto '
-                        'Plugin'))
+                        'Plugin')),
+    cfg.IntOpt('kek_cache_size', default=1000,
+               help=u._('Maximum number of project KEKs kept unwrapped in '
+                        'memory, rather than unwrapped with the master KEK '
+                        'for each operation. Set to 0 to disable the cache.')),
+    cfg.IntOpt('kek_cache_ttl', default=300,
+               help=u._('Seconds an unwrapped project KEK is kept in memory '
+                        'for.')),
+    cfg.StrOpt('cipher', default=AES_256_GCM, choices=[AES_256_GCM, FERNET],
+               help=u._('Cipher new secrets are encrypted with. Secrets '
+                        'encrypted with either cipher can always be '
+                        'decrypted. Use fernet for older Barbican versions '
+                        'to be able to decrypt new secrets.'))
 ]
 CONF.register_group(simple_crypto_plugin_group)
 CONF.register_opts(simple_crypto_plugin_opts, group=simple_crypto_plugin_group)
 config.parse_args(CONF)
 
 
+# Secrets encrypted with AES-256-GCM are stored in a binary envelope: this
+# one byte header, for the version of the envelope, then the nonce, the
+# cyphertext and the tag. Fernet tokens, being base64 encoded, never start
+# with the header.
+_AES_256_GCM_HEADER = b'\x01'
+_AES_256_GCM_NONCE_LENGTH = 12
+_AES_256_GCM_TAG_LENGTH = 16
+
+
+def _wipe_kek(kek):
+    """Overwrites an unwrapped KEK dropped from the KEK cache with zeros."""
+    kek[:] = b'\0' * len(kek)
+
+
+def _aes_256_gcm_encrypt(key, unencrypted):
+    nonce = os.urandom(_AES_256_GCM_NONCE_LENGTH)
+    encryptor = ciphers.Cipher(algorithms.AES(key), modes.GCM(nonce),
+                               backend=backends.default_backend()).encryptor()
+    encryptor.authenticate_additional_data(_AES_256_GCM_HEADER)
+    cyphertext = encryptor.update(unencrypted) + encryptor.finalize()
+    return _AES_256_GCM_HEADER + nonce + cyphertext + encryptor.tag
+
+
+def _aes_256_gcm_decrypt(key, encrypted):
+    """Decrypts an AES-256-GCM envelope.
+
+    :raises: cryptography.exceptions.InvalidTag if the envelope was not
+             encrypted with the key, or was altered.
+    """
+    nonce_end = len(_AES_256_GCM_HEADER) + _AES_256_GCM_NONCE_LENGTH
+    nonce = encrypted[len(_AES_256_GCM_HEADER):nonce_end]
+    cyphertext = encrypted[nonce_end:-_AES_256_GCM_TAG_LENGTH]
+    tag = encrypted[-_AES_256_GCM_TAG_LENGTH:]
+    decryptor = ciphers.Cipher(algorithms.AES(key), modes.GCM(nonce, tag),
+                               backend=backends.default_backend()).decryptor()
+    decryptor.authenticate_additional_data(_AES_256_GCM_HEADER)
+    return decryptor.update(cyphertext) + decryptor.finalize()
+
+
 class SimpleCryptoPlugin(c.CryptoPluginBase):
     """Insecure implementation of the crypto plugin."""
 
     def __init__(self, conf=CONF):
         self.master_kek = conf.simple_crypto_plugin.kek
-
-    def _get_kek(self, kek_meta_dto):
+        self.cipher = conf.simple_crypto_plugin.cipher
+        # Unwrapped project KEKs, by KEK label and plugin_meta digest, and
+        # the AES-256-GCM keys derived from them. Each one is held in a
+        # bytearray, so that it can be wiped once dropped.
+        self.kek_cache = utils.LRUCache(
+            conf.simple_crypto_plugin.kek_cache_size,
+            ttl=conf.simple_crypto_plugin.kek_cache_ttl,
+            on_evict=_wipe_kek)
+
+    def _get_kek_cache_key(self, kek_meta_dto):
         if not kek_meta_dto.plugin_meta:
             raise ValueError(u._('KEK not yet created.'))
-        # the kek is stored encrypted. Need to decrypt.
-        encryptor = fernet.Fernet(self.master_kek)
         # Note : If plugin_meta type is unicode, encode to byte.
         if isinstance(kek_meta_dto.plugin_meta, six.text_type):
             kek_meta_dto.plugin_meta = kek_meta_dto.plugin_meta.encode('utf-8')
 
-        return encryptor.decrypt(kek_meta_dto.plugin_meta)
+        return (kek_meta_dto.kek_label,
+                hashlib.sha256(kek_meta_dto.plugin_meta).digest())
+
+    def _get_kek(self, kek_meta_dto):
+        cache_key = self._get_kek_cache_key(kek_meta_dto)
+        # A cached KEK that another thread dropped, and so wiped, meanwhile
+        # reads as zeros, which no (base64 encoded) Fernet key does.
+        kek = bytes(self.kek_cache.get(cache_key) or b'')
+        if not kek.strip(b'\0'):
+            # the kek is stored encrypted. Need to decrypt.
+            encryptor = fernet.Fernet(self.master_kek)
+            kek = encryptor.decrypt(kek_meta_dto.plugin_meta)
+            self.kek_cache.put(cache_key, bytearray(kek))
+
+        return kek
+
+    def _get_aes_256_gcm_key(self, kek_meta_dto):
+        """Returns the AES-256-GCM key of a project.
+
+        Project KEKs are Fernet keys, so the key is derived from the KEK,
+        rather than the same key material used for both ciphers. Derived
+        keys are cached along with the unwrapped KEKs.
+        """
+        cache_key = self._get_kek_cache_key(kek_meta_dto) + (AES_256_GCM,)
+        key = bytes(self.kek_cache.get(cache_key) or b'')
+        if not key.strip(b'\0'):
+            kek = self._get_kek(kek_meta_dto)
+            key = hkdf.HKDF(algorithm=hashes.SHA256(),
+                            length=32,
+                            salt=None,
+                            info=b'barbican simple crypto ' + AES_256_GCM,
+                            backend=backends.default_backend()
+                            ).derive(base64.urlsafe_b64decode(kek))
+            self.kek_cache.put(cache_key, bytearray(key))
+
+        return key
 
     def encrypt(self, encrypt_dto, kek_meta_dto, project_id):
-        kek = self._get_kek(kek_meta_dto)
-        unencrypted = encrypt_dto.unencrypted
-        if not isinstance(unencrypted, str):
-            raise ValueError(
-                u._(
-                    'Unencrypted data must be a byte type, but was '
-                    '{unencrypted_type}'
-                ).format(
-                    unencrypted_type=type(unencrypted)
+        return self.encrypt_batch([encrypt_dto], kek_meta_dto, project_id)[0]
+
+    def encrypt_batch(self, encrypt_dtos, kek_meta_dto, project_id):
+        for encrypt_dto in encrypt_dtos:
+            unencrypted = encrypt_dto.unencrypted
+            if not isinstance(unencrypted, str):
+                raise ValueError(
+                    u._(
+                        'Unencrypted data must be a byte type, but was '
+                        '{unencrypted_type}'
+                    ).format(
+                        unencrypted_type=type(unencrypted)
+                    )
                 )
-            )
-        encryptor = fernet.Fernet(kek)
-        cyphertext = encryptor.encrypt(unencrypted)
-        return c.ResponseDTO(cyphertext, None)
+        if self.cipher == AES_256_GCM:
+            key = self._get_aes_256_gcm_key(kek_meta_dto)
+            return [c.ResponseDTO(
+                _aes_256_gcm_encrypt(key, encrypt_dto.unencrypted), None)
+                for encrypt_dto in encrypt_dtos]
+
+        encryptor = fernet.Fernet(self._get_kek(kek_meta_dto))
+        return [c.ResponseDTO(encryptor.encrypt(encrypt_dto.unencrypted),
+                              None)
+                for encrypt_dto in encrypt_dtos]
 
     def decrypt(self, encrypted_dto, kek_meta_dto, kek_meta_extended,
                 project_id):
-        kek = self._get_kek(kek_meta_dto)
-        encrypted = encrypted_dto.encrypted
-        decryptor = fernet.Fernet(kek)
-        return decryptor.decrypt(encrypted)
+        return self.decrypt_batch([encrypted_dto], kek_meta_dto,
+                                  [kek_meta_extended], project_id)[0]
+
+    def decrypt_batch(self, encrypted_dtos, kek_meta_dto,
+                      kek_meta_extended_list, project_id):
+        # Secrets stored before the cipher was changed may be encrypted
+        # with either cipher, so each one is decrypted as its envelope says.
+        # The key for each cipher is only looked up once for the batch.
+        aes_256_gcm_key = None
+        decryptor = None
+        decrypted = []
+        for encrypted_dto in encrypted_dtos:
+            encrypted = encrypted_dto.encrypted
+            if encrypted.startswith(_AES_256_GCM_HEADER):
+                if aes_256_gcm_key is None:
+                    aes_256_gcm_key = self._get_aes_256_gcm_key(kek_meta_dto)
+                decrypted.append(
+                    _aes_256_gcm_decrypt(aes_256_gcm_key, encrypted))
+            else:
+                if decryptor is None:
+                    decryptor = fernet.Fernet(self._get_kek(kek_meta_dto))
+                decrypted.append(decryptor.decrypt(encrypted))
+        return decrypted
 
     def bind_kek_metadata(self, kek_meta_dto):
         kek_meta_dto.algorithm = 'aes'
@@ -134,24 +268,18 @@ class SimpleCryptoPlugin(c.CryptoPluginBase):
                 raise ValueError(u._('Passphrase not supported for DSA key'))
             public_key, private_key = self._serialize_dsa_key(public_key,
                                                               private_key)
-        private_dto = self.encrypt(c.EncryptDTO(private_key),
-                                   kek_meta_dto,
-                                   project_id)
-
-        public_dto = self.encrypt(c.EncryptDTO(public_key),
-                                  kek_meta_dto,
-                                  project_id)
-
-        passphrase_dto = None
+        encrypt_dtos = [c.EncryptDTO(private_key), c.EncryptDTO(public_key)]
         if generate_dto.passphrase:
             if isinstance(generate_dto.passphrase, six.text_type):
                 generate_dto.passphrase = generate_dto.passphrase.encode(
                     'utf-8')
 
-            passphrase_dto = self.encrypt(c.EncryptDTO(generate_dto.
-                                                       passphrase),
-                                          kek_meta_dto,
-                                          project_id)
+            encrypt_dtos.append(c.EncryptDTO(generate_dto.passphrase))
+
+        response_dtos = self.encrypt_batch(encrypt_dtos, kek_meta_dto,
+                                           project_id)
+        private_dto, public_dto = response_dtos[:2]
+        passphrase_dto = response_dtos[2] if generate_dto.passphrase else None
 
         return private_dto, public_dto, passphrase_dto
 
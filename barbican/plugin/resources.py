@@ -11,13 +11,19 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+
 from barbican.common import utils
+from barbican import i18n as u
 from barbican.model import models
 from barbican.model import repositories as repos
+from barbican.openstack.common import excutils
 from barbican.plugin.interface import secret_store
 from barbican.plugin import store_crypto
 from barbican.plugin.util import translations as tr
 
+LOG = utils.getLogger(__name__)
+
 
 def _get_transport_key_model(key_spec, transport_key_needed):
     key_model = None
@@ -102,13 +108,112 @@ def store_secret(unencrypted_raw, content_type_raw, content_encoding,
 
     secret_metadata = _store_secret_using_plugin(store_plugin, secret_dto,
                                                  secret_model, project_model)
-    _save_secret_in_repo(secret_model, project_model)
-    _save_secret_metadata_in_repo(secret_model, secret_metadata, store_plugin,
-                                  content_type)
+    with repos.deferred_flush():
+        _save_secret_in_repo(secret_model, project_model)
+        _save_secret_metadata_in_repo(secret_model, secret_metadata,
+                                      store_plugin, content_type)
 
     return secret_model, None
 
 
+def store_secrets(new_secrets, project_model):
+    """Store several provided secrets of a project into secure backends.
+
+    The secrets stored by a crypto plugin are encrypted together, in one
+    batch, and all the secrets' entities are written in one flush. If
+    storing any of them fails, the secrets already stored by other secret
+    store plugins are deleted again from their backends, on a best effort
+    basis.
+
+    :param new_secrets: list of (secret_model, unencrypted_raw,
+                        content_type_raw, content_encoding) tuples, one for
+                        each secret, as for store_secret()
+    :param project_model: The project of the secrets
+    :returns: list of the stored secret models
+    """
+    plugin_manager = secret_store.get_manager()
+
+    # Normalize all the secrets before storing any, so that an invalid one
+    # fails the whole request up front.
+    stores = []  # The store plugin and SecretDTO of secrets with data.
+    for (secret_model, unencrypted_raw, content_type_raw,
+            content_encoding) in new_secrets:
+        if not unencrypted_raw:
+            stores.append((None, None))
+            continue
+
+        unencrypted, content_type = tr.normalize_before_encryption(
+            unencrypted_raw, content_type_raw, content_encoding,
+            secret_model.secret_type, enforce_text_only=True)
+
+        key_spec = secret_store.KeySpec(alg=secret_model.algorithm,
+                                        bit_length=secret_model.bit_length,
+                                        mode=secret_model.mode)
+        store_plugin = plugin_manager.get_plugin_store(key_spec=key_spec)
+        secret_dto = secret_store.SecretDTO(type=secret_model.secret_type,
+                                            secret=unencrypted,
+                                            key_spec=key_spec,
+                                            content_type=content_type)
+        stores.append((store_plugin, secret_dto))
+
+    # Secrets to store (their index and context), by crypto adapter plugin.
+    crypto_stores = collections.OrderedDict()
+
+    secret_models = [new_secret[0] for new_secret in new_secrets]
+    secrets_metadata = [None] * len(new_secrets)
+    # Secrets stored by other plugins, which keep them in their own backend.
+    backend_stores = []
+    try:
+        with repos.deferred_flush():
+            for index, (secret_model, (store_plugin, secret_dto)) in (
+                    enumerate(zip(secret_models, stores))):
+                if store_plugin is None:
+                    continue
+                if isinstance(store_plugin,
+                              store_crypto.StoreCryptoAdapterPlugin):
+                    context = store_crypto.StoreCryptoContext(
+                        project_model,
+                        secret_model=secret_model)
+                    crypto_stores.setdefault(store_plugin, []).append(
+                        (index, context))
+                else:
+                    secrets_metadata[index] = store_plugin.store_secret(
+                        secret_dto)
+                    backend_stores.append((store_plugin, index))
+
+            for store_plugin, crypto_store in crypto_stores.items():
+                indexes, contexts = zip(*crypto_store)
+                results = store_plugin.store_secrets(
+                    [stores[index][1] for index in indexes], contexts)
+                for index, secret_metadata in zip(indexes, results):
+                    secrets_metadata[index] = secret_metadata
+
+            for secret_model, (store_plugin, secret_dto), secret_metadata in (
+                    zip(secret_models, stores, secrets_metadata)):
+                _save_secret_in_repo(secret_model, project_model)
+                if store_plugin is not None:
+                    _save_secret_metadata_in_repo(secret_model,
+                                                  secret_metadata,
+                                                  store_plugin,
+                                                  secret_dto.content_type)
+    except Exception:
+        with excutils.save_and_reraise_exception():
+            for store_plugin, index in backend_stores:
+                _delete_secret_from_backend_quietly(store_plugin,
+                                                    secrets_metadata[index])
+
+    return secret_models
+
+
+def _delete_secret_from_backend_quietly(store_plugin, secret_metadata):
+    """Delete a secret a failed request stored, logging any failure."""
+    try:
+        store_plugin.delete_secret(secret_metadata)
+    except Exception:
+        LOG.exception(u._LE("Problem deleting a secret stored by a failed "
+                            "bulk request from its secret store"))
+
+
 def get_secret(requesting_content_type, secret_model, project_model,
                twsk=None, transport_key=None):
     tr.analyze_before_decryption(requesting_content_type)
@@ -137,6 +242,52 @@ def get_secret(requesting_content_type, secret_model, project_model,
                                            requesting_content_type)
 
 
+def get_secrets(secret_models, project_models):
+    """Retrieve several secrets from their secure backends.
+
+    Unlike get_secret(), the secrets are returned as SecretDTOs, as stored,
+    without being denormalized. The secrets stored by a crypto plugin are
+    retrieved together, in one batch for each KEK they are encrypted with.
+
+    :param secret_models: The secrets to retrieve
+    :param project_models: The project of each secret
+    :returns: list with, for each secret, either a SecretDTO that contains
+              it or the exception raised retrieving it
+    """
+    results = [None] * len(secret_models)
+
+    # Secrets to retrieve (their index and context), by crypto adapter plugin.
+    crypto_retrievals = collections.OrderedDict()
+
+    plugin_manager = secret_store.get_manager()
+    for index, (secret_model, project_model) in enumerate(
+            zip(secret_models, project_models)):
+        try:
+            secret_metadata = _get_secret_meta(secret_model)
+            retrieve_plugin = plugin_manager.get_plugin_retrieve_delete(
+                secret_metadata.get('plugin_name'))
+            if isinstance(retrieve_plugin,
+                          store_crypto.StoreCryptoAdapterPlugin):
+                context = store_crypto.StoreCryptoContext(
+                    project_model,
+                    secret_model=secret_model)
+                crypto_retrievals.setdefault(retrieve_plugin, []).append(
+                    (index, context))
+            else:
+                results[index] = retrieve_plugin.get_secret(
+                    secret_model.secret_type, secret_metadata)
+        except Exception as e:
+            results[index] = e
+
+    for retrieve_plugin, retrievals in crypto_retrievals.items():
+        indexes, contexts = zip(*retrievals)
+        for index, result in zip(indexes,
+                                 retrieve_plugin.get_secrets(contexts)):
+            results[index] = result
+
+    return results
+
+
 def get_transport_key_id_for_retrieval(secret_model):
     """Return a transport key ID for retrieval if the plugin supports it."""
 
@@ -170,9 +321,10 @@ def generate_secret(spec, content_type, project_model):
         generate_plugin, key_spec, secret_model, project_model, content_type)
 
     # Save secret and metadata.
-    _save_secret_in_repo(secret_model, project_model)
-    _save_secret_metadata_in_repo(secret_model, secret_metadata,
-                                  generate_plugin, content_type)
+    with repos.deferred_flush():
+        _save_secret_in_repo(secret_model, project_model)
+        _save_secret_metadata_in_repo(secret_model, secret_metadata,
+                                      generate_plugin, content_type)
 
     return secret_model
 
@@ -208,30 +360,31 @@ def generate_asymmetric_secret(spec, content_type, project_model):
         content_type
     )
 
-    _save_secret_in_repo(private_secret_model, project_model)
-    _save_secret_metadata_in_repo(private_secret_model,
-                                  asymmetric_meta_dto.private_key_meta,
-                                  generate_plugin,
-                                  content_type)
-
-    _save_secret_in_repo(public_secret_model, project_model)
-    _save_secret_metadata_in_repo(public_secret_model,
-                                  asymmetric_meta_dto.public_key_meta,
-                                  generate_plugin,
-                                  content_type)
+    with repos.deferred_flush():
+        _save_secret_in_repo(private_secret_model, project_model)
+        _save_secret_metadata_in_repo(private_secret_model,
+                                      asymmetric_meta_dto.private_key_meta,
+                                      generate_plugin,
+                                      content_type)
 
-    if passphrase_secret_model:
-        _save_secret_in_repo(passphrase_secret_model, project_model)
-        _save_secret_metadata_in_repo(passphrase_secret_model,
-                                      asymmetric_meta_dto.passphrase_meta,
+        _save_secret_in_repo(public_secret_model, project_model)
+        _save_secret_metadata_in_repo(public_secret_model,
+                                      asymmetric_meta_dto.public_key_meta,
                                       generate_plugin,
                                       content_type)
 
-    container_model = _create_container_for_asymmetric_secret(spec,
-                                                              project_model)
-    _save_asymmetric_secret_in_repo(
-        container_model, private_secret_model, public_secret_model,
-        passphrase_secret_model)
+        if passphrase_secret_model:
+            _save_secret_in_repo(passphrase_secret_model, project_model)
+            _save_secret_metadata_in_repo(passphrase_secret_model,
+                                          asymmetric_meta_dto.passphrase_meta,
+                                          generate_plugin,
+                                          content_type)
+
+        container_model = _create_container_for_asymmetric_secret(
+            spec, project_model)
+        _save_asymmetric_secret_in_repo(
+            container_model, private_secret_model, public_secret_model,
+            passphrase_secret_model)
 
     return container_model
 
@@ -239,6 +392,28 @@ def generate_asymmetric_secret(spec, content_type, project_model):
 def delete_secret(secret_model, project_id):
     """Remove a secret from secure backend."""
 
+    _delete_secret_from_plugin(secret_model)
+
+    # Delete the secret from data model.
+    secret_repo = repos.get_secret_repository()
+    secret_repo.delete_entity_by_id(entity_id=secret_model.id,
+                                    external_project_id=project_id)
+
+
+def delete_expired_secret(secret_model):
+    """Remove an expired secret from secure backend.
+
+    Unlike delete_secret(), this does not look the secret up by its project
+    first, as expired secrets cannot be looked up.
+    """
+
+    _delete_secret_from_plugin(secret_model)
+
+    secret_repo = repos.get_secret_repository()
+    secret_repo.delete_entity(secret_model)
+
+
+def _delete_secret_from_plugin(secret_model):
     secret_metadata = _get_secret_meta(secret_model)
 
     # We should only try to delete a secret using the plugin interface if
@@ -249,13 +424,13 @@ def delete_secret(secret_model, project_id):
         delete_plugin = plugin_manager.get_plugin_retrieve_delete(
             secret_metadata.get('plugin_name'))
 
-        # Delete the secret from plugin storage.
-        delete_plugin.delete_secret(secret_metadata)
-
-    # Delete the secret from data model.
-    secret_repo = repos.get_secret_repository()
-    secret_repo.delete_entity_by_id(entity_id=secret_model.id,
-                                    external_project_id=project_id)
+        # Delete the secret from plugin storage. It may already be gone if
+        # an earlier attempt to delete the secret failed after this step.
+        try:
+            delete_plugin.delete_secret(secret_metadata)
+        except secret_store.SecretNotFoundException:
+            LOG.warning(u._LW("Secret '%s' was already deleted from its "
+                              "secret store."), secret_model.id)
 
 
 def _store_secret_using_plugin(store_plugin, secret_dto, secret_model,
@@ -317,6 +492,12 @@ def _get_secret(retrieve_plugin, secret_metadata, secret_model, project_model):
 
 def _get_secret_meta(secret_model):
     if secret_model:
+        # Use the store metadata loaded along with the secret, if any (see
+        # SecretRepo.get_secret_for_retrieval()).
+        if models.is_loaded(secret_model, 'secret_store_metadata'):
+            return {k: m.value for k, m in
+                    secret_model.secret_store_metadata.items()
+                    if not m.deleted}
         secret_meta_repo = repos.get_secret_meta_repository()
         return secret_meta_repo.get_metadata_for_secret(secret_model.id)
     else:
@@ -343,6 +524,7 @@ def _save_secret_in_repo(secret_model, project_model):
     secret_repo = repos.get_secret_repository()
     # Create Secret entities in data store.
     if not secret_model.id:
+        secret_model.project_id = project_model.id
         secret_repo.create_from(secret_model)
         new_assoc = models.ProjectSecret()
         new_assoc.project_id = project_model.id
@@ -12,6 +12,7 @@
 # limitations under the License.
 
 import base64
+import collections
 
 from barbican.common import config
 from barbican.common import utils
@@ -102,6 +103,47 @@ class StoreCryptoAdapterPlugin(object):
 
         return None
 
+    def store_secrets(self, secret_dtos, contexts):
+        """Store several secrets of the same project.
+
+        The project's KEK is found (or created) only once, and the secrets
+        are encrypted with a single encrypt_batch() call to the crypto
+        plugin.
+
+        :param secret_dtos: SecretDTO for each secret
+        :param contexts: StoreCryptoContext for each secret
+        :returns: list of an optional dictionary containing metadata about
+                  each secret
+        """
+        project_model = contexts[0].project_model
+
+        # Find HSM-style 'crypto' plugin.
+        encrypting_plugin = manager.get_manager().get_plugin_store_generate(
+            crypto.PluginSupportTypes.ENCRYPT_DECRYPT
+        )
+
+        # Find or create a key encryption key metadata.
+        kek_datum_model, kek_meta_dto = _find_or_create_kek_objects(
+            encrypting_plugin, project_model)
+
+        # Secrets are base64 encoded before being passed to the secret stores.
+        encrypt_dtos = [crypto.EncryptDTO(base64.b64decode(secret_dto.secret))
+                        for secret_dto in secret_dtos]
+
+        response_dtos = encrypting_plugin.encrypt_batch(
+            encrypt_dtos, kek_meta_dto, project_model.external_id)
+
+        with repositories.deferred_flush():
+            for secret_dto, context, response_dto in zip(
+                    secret_dtos, contexts, response_dtos):
+                if not context.content_type:
+                    context.content_type = secret_dto.content_type
+                _store_secret_and_datum(
+                    context, context.secret_model, kek_datum_model,
+                    response_dto)
+
+        return [None] * len(secret_dtos)
+
     def get_secret(self, secret_type, metadata, context):
         """Retrieve a secret.
 
@@ -110,12 +152,7 @@ class StoreCryptoAdapterPlugin(object):
         :param context: StoreCryptoContext for secret
         :returns: SecretDTO that contains secret
         """
-        if (not context.secret_model or
-                not context.secret_model.encrypted_data):
-            raise sstore.SecretNotFoundException()
-
-        # TODO(john-wood-w) Need to revisit 1 to many datum relationship.
-        datum_model = context.secret_model.encrypted_data[0]
+        datum_model = _get_datum_model(context)
 
         # Find HSM-style 'crypto' plugin.
         decrypting_plugin = manager.get_manager().get_plugin_retrieve(
@@ -133,14 +170,71 @@ class StoreCryptoAdapterPlugin(object):
                                            kek_meta_dto,
                                            datum_model.kek_meta_extended,
                                            context.project_model.external_id)
-        secret = base64.b64encode(secret)
-        key_spec = sstore.KeySpec(alg=context.secret_model.algorithm,
-                                  bit_length=context.secret_model.bit_length,
-                                  mode=context.secret_model.mode)
+        return _build_secret_dto(secret_type, secret, context, datum_model)
+
+    def get_secrets(self, contexts):
+        """Retrieve several secrets.
+
+        The secrets encrypted with the same KEK are decrypted with a single
+        decrypt_batch() call to their crypto plugin. Should that fail, they
+        are decrypted one by one, so that only the secrets that can't be
+        decrypted fail.
+
+        :param contexts: StoreCryptoContext for each secret
+        :returns: list with, for each secret, either the SecretDTO that
+                  contains it or the exception raised retrieving it
+        """
+        results = [None] * len(contexts)
+
+        # Secrets to decrypt (their index, context and datum), by KEK.
+        batches = collections.OrderedDict()
+        for index, context in enumerate(contexts):
+            try:
+                datum_model = _get_datum_model(context)
+            except sstore.SecretNotFoundException as e:
+                results[index] = e
+                continue
+            batches.setdefault(datum_model.kek_id, []).append(
+                (index, context, datum_model))
+
+        for batch in batches.values():
+            try:
+                secrets = self._decrypt_batch(batch)
+            except Exception:
+                # Decrypt them one by one instead, so that only those that
+                # can't be decrypted fail.
+                for index, context, datum_model in batch:
+                    try:
+                        results[index] = self.get_secret(
+                            context.secret_model.secret_type, None, context)
+                    except Exception as e:
+                        results[index] = e
+                continue
+
+            for (index, context, datum_model), secret in zip(batch, secrets):
+                results[index] = _build_secret_dto(
+                    context.secret_model.secret_type, secret, context,
+                    datum_model)
+
+        return results
+
+    def _decrypt_batch(self, batch):
+        project_model = batch[0][1].project_model
+        datum_models = [datum_model for _index, _context, datum_model in batch]
+        kek_datum = datum_models[0].kek_meta_project
+
+        # Find HSM-style 'crypto' plugin.
+        decrypting_plugin = manager.get_manager().get_plugin_retrieve(
+            kek_datum.plugin_name)
 
-        return sstore.SecretDTO(secret_type,
-                                secret, key_spec,
-                                datum_model.content_type)
+        # Convert from text-based storage format to binary.
+        decrypt_dtos = [crypto.DecryptDTO(base64.b64decode(d.cypher_text))
+                        for d in datum_models]
+
+        return decrypting_plugin.decrypt_batch(
+            decrypt_dtos, crypto.KEKMetaDTO(kek_datum),
+            [d.kek_meta_extended for d in datum_models],
+            project_model.external_id)
 
     def delete_secret(self, secret_metadata):
         """Delete a secret."""
@@ -297,11 +391,32 @@ def _find_or_create_kek_objects(plugin_inst, project_model):
     return kek_datum_model, kek_meta_dto
 
 
+def _get_datum_model(context):
+    if (not context.secret_model or
+            not context.secret_model.encrypted_data):
+        raise sstore.SecretNotFoundException()
+
+    # TODO(john-wood-w) Need to revisit 1 to many datum relationship.
+    return context.secret_model.encrypted_data[0]
+
+
+def _build_secret_dto(secret_type, secret, context, datum_model):
+    secret = base64.b64encode(secret)
+    key_spec = sstore.KeySpec(alg=context.secret_model.algorithm,
+                              bit_length=context.secret_model.bit_length,
+                              mode=context.secret_model.mode)
+
+    return sstore.SecretDTO(secret_type,
+                            secret, key_spec,
+                            datum_model.content_type)
+
+
 def _store_secret_and_datum(
         context, secret_model, kek_datum_model, generated_dto):
 
     # Create Secret entities in data store.
     if not secret_model.id:
+        secret_model.project_id = context.project_model.id
         repositories.get_secret_repository().create_from(secret_model)
         new_assoc = models.ProjectSecret()
         new_assoc.project_id = context.project_model.id
@@ -18,6 +18,7 @@ Retry/scheduler classes and logic.
 """
 import datetime
 import random
+import time
 
 from barbican.common import config
 from barbican.common import utils
@@ -26,6 +27,7 @@ from barbican.model import models
 from barbican.model import repositories
 from barbican.openstack.common import periodic_task
 from barbican.openstack.common import service
+from barbican.plugin import resources as plugin
 from barbican.queue import client as async_client
 
 LOG = utils.getLogger(__name__)
@@ -42,6 +44,15 @@ def _compute_next_periodic_interval():
     return random.uniform(0.8 * periodic_interval, 1.2 * periodic_interval)
 
 
+def _compute_next_sweep_interval():
+    sweep_interval = (
+        CONF.retry_scheduler.expiration_sweep_interval_seconds
+    )
+
+    # Return +- 20% of interval.
+    return random.uniform(0.8 * sweep_interval, 1.2 * sweep_interval)
+
+
 class PeriodicServer(service.Service):
     """Server to process retry and scheduled tasks.
 
@@ -49,7 +60,8 @@ class PeriodicServer(service.Service):
     http://docs.openstack.org/developer/oslo-incubator/api/openstack.common
     .periodic_task.html). On a periodic basis, this server checks for tasks
     that need to be retried, and then sends them up to the RPC queue for later
-    processing by a worker node.
+    processing by a worker node. It also periodically deletes secrets that
+    have expired, in batches.
     """
     def __init__(self, queue_resource=None):
         super(PeriodicServer, self).__init__()
@@ -69,7 +81,22 @@ class PeriodicServer(service.Service):
             initial_delay=CONF.retry_scheduler.initial_delay_seconds,
             periodic_interval_max=periodic_interval)
 
+        # Start the expired secrets sweeper up, unless it is disabled.
+        sweep_interval = (
+            CONF.retry_scheduler.expiration_sweep_interval_seconds
+        )
+        if sweep_interval > 0:
+            self.tg.add_dynamic_timer(
+                self._sweep_expired_secrets,
+                initial_delay=CONF.retry_scheduler.initial_delay_seconds,
+                periodic_interval_max=1.2 * sweep_interval)
+
         self.order_retry_repo = repositories.get_order_retry_tasks_repository()
+        self.secret_repo = repositories.get_secret_repository()
+
+        # Expired secrets that could not be deleted, by id, with the time
+        # sweeps may retry deleting them at.
+        self.sweep_retry_times = {}
 
     def start(self):
         LOG.info("Starting the PeriodicServer")
@@ -110,6 +137,65 @@ class PeriodicServer(service.Service):
         )
         return check_again_in_seconds
 
+    @periodic_task.periodic_task
+    def _sweep_expired_secrets(self):
+        """Periodically delete a batch of expired secrets.
+
+        Each secret is deleted from its secret store backend, and then
+        (soft) deleted, in its own transaction. Secrets that could not be
+        deleted are left out of the sweeps for a while, so that they do not
+        fill every batch.
+
+        :return: Return the number of seconds to wait before invoking this
+            method again.
+        """
+        LOG.info(u._LI("Sweeping expired secrets:"))
+
+        deleted = 0
+        now = time.time()
+        self.sweep_retry_times = dict(
+            (secret_id, retry_time)
+            for secret_id, retry_time in self.sweep_retry_times.items()
+            if retry_time > now)
+        try:
+            secrets = self.secret_repo.get_expired(
+                CONF.retry_scheduler.expiration_sweep_batch_size,
+                exclude_ids=list(self.sweep_retry_times))
+            for secret in secrets:
+                if self._delete_expired_secret(secret):
+                    deleted += 1
+        except Exception:
+            LOG.exception(u._LE("Problem sweeping expired secrets."))
+            repositories.rollback()
+        finally:
+            repositories.clear()
+
+        check_again_in_seconds = _compute_next_sweep_interval()
+        LOG.info(
+            u._LI("Done deleting '%(deleted)s' expired secrets, will check "
+                  "again in '%(next)s' seconds."),
+            {
+                'deleted': deleted,
+                'next': check_again_in_seconds
+            }
+        )
+        return check_again_in_seconds
+
+    def _delete_expired_secret(self, secret):
+        secret_id = secret.id
+        try:
+            plugin.delete_expired_secret(secret)
+            repositories.commit()
+            return True
+        except Exception:
+            LOG.exception(u._LE("Problem deleting expired secret '%s'."),
+                          secret_id)
+            repositories.rollback()
+            self.sweep_retry_times[secret_id] = (
+                time.time() +
+                CONF.retry_scheduler.expiration_sweep_retry_seconds)
+            return False
+
     def _enqueue_task(self, task):
         retry_task_name = 'N/A'
         retry_args = 'N/A'
@@ -129,6 +129,8 @@ class KeystoneEventConsumer(resources.BaseTask):
         project_id = project.id
 
         rep.delete_all_project_resources(project_id)
+        rep.get_project_repository().invalidate_cache(project.external_id)
+        rep.get_kek_datum_repository().invalidate_cache(project_id)
 
         # reached here means there is no error so log the successful
         # cleanup log entry.
@@ -14,13 +14,16 @@
 # limitations under the License.
 import base64
 import os
+import urlparse
 
 import mock
 
+from barbican.api import hooks
 from barbican.common import validators
 from barbican.model import models
 from barbican.model import repositories
 from barbican.openstack.common import timeutils
+from barbican.tests import database_utils
 from barbican.tests import utils
 
 project_repo = repositories.get_project_repository()
@@ -212,6 +215,17 @@ class WhenGettingSecretsList(utils.BarbicanAPIBaseTestCase):
         secret_list = get_resp.json.get('secrets')
         self.assertEqual(secret_list[0].get('name'), 'secret mission')
 
+    def test_list_secrets_by_name_prefix(self):
+        create_secret(self.app, name='prod/db-password')
+        create_secret(self.app, name='staging/db-password')
+
+        get_resp = self.app.get('/secrets/', {'name_prefix': 'prod/'})
+
+        self.assertEqual(200, get_resp.status_int)
+        secret_list = get_resp.json.get('secrets')
+        self.assertEqual(['prod/db-password'],
+                         [s.get('name') for s in secret_list])
+
     def test_list_secrets(self):
         # Creating a secret to be retrieved later
         create_resp, _ = create_secret(
@@ -246,6 +260,50 @@ class WhenGettingSecretsList(utils.BarbicanAPIBaseTestCase):
 
         self.assertIn('offset=0', previous_ref)
         self.assertIn('offset=4', next_ref)
+        self.assertIn('marker=', next_ref)
+
+    def test_pagination_with_marker(self):
+        for _ in range(5):
+            create_resp, _ = create_secret(self.app, name='Lana Kane')
+            self.assertEqual(201, create_resp.status_int)
+
+        get_resp = self.app.get('/secrets/', {'limit': '4'})
+        all_refs = [s['secret_ref'] for s in get_resp.json['secrets']]
+
+        get_resp = self.app.get('/secrets/', {'limit': '2'})
+        next_ref = get_resp.json.get('next')
+        next_params = dict(urlparse.parse_qsl(urlparse.urlparse(
+            next_ref).query))
+
+        get_resp = self.app.get('/secrets/', next_params)
+
+        self.assertEqual(200, get_resp.status_int)
+        self.assertEqual(all_refs[2:4],
+                         [s['secret_ref'] for s in get_resp.json['secrets']])
+        self.assertIn('offset=0', get_resp.json.get('previous'))
+
+    def test_pagination_without_total(self):
+        for _ in range(3):
+            create_resp, _ = create_secret(self.app, name='Lana Kane')
+            self.assertEqual(201, create_resp.status_int)
+
+        get_resp = self.app.get('/secrets/', {'limit': '2', 'total': 'none'})
+
+        self.assertEqual(200, get_resp.status_int)
+        self.assertEqual(2, len(get_resp.json['secrets']))
+        self.assertNotIn('total', get_resp.json)
+        self.assertIn('next', get_resp.json)
+
+    def test_pagination_with_estimated_total(self):
+        for _ in range(3):
+            create_resp, _ = create_secret(self.app, name='Lana Kane')
+            self.assertEqual(201, create_resp.status_int)
+
+        get_resp = self.app.get('/secrets/',
+                                {'limit': '1', 'total': 'estimate'})
+
+        self.assertEqual(200, get_resp.status_int)
+        self.assertEqual(3, get_resp.json['total'])
 
     def test_empty_list_of_secrets(self):
         params = {'name': 'Austin Powers'}
@@ -260,6 +318,25 @@ class WhenGettingSecretsList(utils.BarbicanAPIBaseTestCase):
         self.assertNotIn('previous', get_resp.json)
         self.assertNotIn('next', get_resp.json)
 
+    def test_list_secrets_collects_query_stats(self):
+        create_secret(self.app, name='secret1')
+
+        get_resp = self.app.get('/secrets/')
+
+        stats = get_resp.request.environ[hooks.QUERY_STATS_KEY]
+        self.assertGreater(stats.count, 0)
+
+    def test_list_secrets_within_query_budget(self):
+        for i in range(3):
+            create_secret(self.app, name='secret{0}'.format(i))
+
+        # The count, the page and the secrets' metadata, however many
+        # secrets are listed.
+        with database_utils.query_budget(max_queries=3, max_duplicates=0):
+            get_resp = self.app.get('/secrets/')
+
+        self.assertEqual(3, len(get_resp.json['secrets']))
+
 
 class WhenGettingPuttingOrDeletingSecret(utils.BarbicanAPIBaseTestCase):
 
@@ -298,6 +375,21 @@ class WhenGettingPuttingOrDeletingSecret(utils.BarbicanAPIBaseTestCase):
 
         self.assertEqual(get_resp.body, decoded)
 
+    def test_get_secret_payload_within_query_budget(self):
+        resp, secret_uuid = create_secret(
+            self.app,
+            payload='not too many queries',
+            content_type='text/plain'
+        )
+
+        with database_utils.query_budget(max_queries=2, max_duplicates=0):
+            get_resp = self.app.get(
+                '/secrets/{0}/payload'.format(secret_uuid),
+                headers={'Accept': 'text/plain'}
+            )
+
+        self.assertEqual(200, get_resp.status_int)
+
     def test_returns_404_on_get_when_not_found(self):
         get_resp = self.app.get(
             '/secrets/98c876d9-aaac-44e4-8ea8-441932962b05',
@@ -573,6 +665,152 @@ class WhenGettingPuttingOrDeletingSecret(utils.BarbicanAPIBaseTestCase):
         self.assertEqual(204, delete_resp.status_int)
 
 
+class WhenCreatingSecretsInBulk(utils.BarbicanAPIBaseTestCase):
+
+    def test_should_create_secrets_in_requested_order(self):
+        secrets = [
+            {'name': 'first', 'payload': 'first secret',
+             'payload_content_type': 'text/plain'},
+            {'name': 'second', 'payload': 'c2Vjb25kIHNlY3JldA==',
+             'payload_content_type': 'application/octet-stream',
+             'payload_content_encoding': 'base64'},
+            {'name': 'no payload'}
+        ]
+
+        resp = self.app.post_json('/secrets/bulk', {'secrets': secrets})
+
+        self.assertEqual(201, resp.status_int)
+        secret_refs = resp.json['secret_refs']
+        self.assertEqual(3, len(secret_refs))
+        for secret_ref, secret in zip(secret_refs, secrets):
+            _, secret_uuid = os.path.split(secret_ref)
+            db_secret = secrets_repo.get(secret_uuid, self.project_id)
+            self.assertEqual(secret['name'], db_secret.name)
+
+        payloads_resp = self.app.post_json(
+            '/secrets/payloads', {'secret_refs': secret_refs[:2]})
+        self.assertEqual(
+            ['first secret', 'second secret'],
+            [base64.b64decode(i['payload'])
+             for i in payloads_resp.json['secrets']])
+
+    def test_should_update_project_secret_count_once(self):
+        secrets = [{'name': str(i), 'payload': 'a secret',
+                    'payload_content_type': 'text/plain'} for i in range(3)]
+        self.app.post_json('/secrets/bulk', {'secrets': secrets[:1]})
+
+        with database_utils.query_budget() as stats:
+            resp = self.app.post_json('/secrets/bulk', {'secrets': secrets})
+
+        self.assertEqual(201, resp.status_int)
+        count_updates = [
+            count for statement, count in stats.statements.items()
+            if statement.startswith('UPDATE project_entity_counts')]
+        self.assertEqual([1], count_updates)
+        count_repo = repositories.get_project_entity_count_repository()
+        self.assertEqual(4, count_repo.get_count(
+            self.project_id, models.Secret.__tablename__))
+
+    def test_should_create_no_secret_when_one_is_invalid(self):
+        secrets = [
+            {'name': 'valid', 'payload': 'a secret',
+             'payload_content_type': 'text/plain'},
+            {'name': 'invalid', 'payload': 'a secret'}
+        ]
+
+        resp = self.app.post_json('/secrets/bulk', {'secrets': secrets},
+                                  expect_errors=True)
+
+        self.assertEqual(400, resp.status_int)
+        secrets, _, _, _ = secrets_repo.get_by_create_date(
+            self.project_id, suppress_exception=True)
+        self.assertEqual([], secrets)
+
+    def test_should_fail_with_transport_key(self):
+        secrets = [{'name': 'wrapped', 'transport_key_needed': 'true'}]
+
+        resp = self.app.post_json('/secrets/bulk', {'secrets': secrets},
+                                  expect_errors=True)
+
+        self.assertEqual(400, resp.status_int)
+
+
+class WhenRetrievingSecretPayloadsInBulk(utils.BarbicanAPIBaseTestCase):
+
+    def _secret_ref(self, secret_uuid):
+        return 'http://localhost:9311/v1/secrets/{0}'.format(secret_uuid)
+
+    def test_should_retrieve_payloads_in_requested_order(self):
+        payloads = ['first secret', 'second secret']
+        secret_refs = []
+        for payload in payloads:
+            _, secret_uuid = create_secret(self.app, payload=payload,
+                                           content_type='text/plain')
+            secret_refs.append(self._secret_ref(secret_uuid))
+        secret_refs.reverse()
+
+        resp = self.app.post_json('/secrets/payloads',
+                                  {'secret_refs': secret_refs})
+
+        self.assertEqual(200, resp.status_int)
+        items = resp.json['secrets']
+        self.assertEqual(secret_refs, [i['secret_ref'] for i in items])
+        self.assertEqual(list(reversed(payloads)),
+                         [base64.b64decode(i['payload']) for i in items])
+        for item in items:
+            self.assertEqual('text/plain', item['payload_content_type'])
+            self.assertEqual('base64', item['payload_content_encoding'])
+
+    def test_should_return_error_for_secret_not_found(self):
+        _, secret_uuid = create_secret(self.app, payload='a secret',
+                                       content_type='text/plain')
+        missing_ref = self._secret_ref('98c876d9-aaac-44e4-8ea8-441932962b05')
+
+        resp = self.app.post_json(
+            '/secrets/payloads',
+            {'secret_refs': [self._secret_ref(secret_uuid), missing_ref]})
+
+        self.assertEqual(200, resp.status_int)
+        found, missing = resp.json['secrets']
+        self.assertEqual('a secret', base64.b64decode(found['payload']))
+        self.assertEqual(missing_ref, missing['secret_ref'])
+        self.assertEqual(404, missing['error']['code'])
+        self.assertNotIn('payload', missing)
+
+    def test_should_return_error_for_secret_without_payload(self):
+        _, secret_uuid = create_secret(self.app, name='no payload')
+
+        resp = self.app.post_json(
+            '/secrets/payloads',
+            {'secret_refs': [self._secret_ref(secret_uuid)]})
+
+        self.assertEqual(200, resp.status_int)
+        self.assertIn('error', resp.json['secrets'][0])
+
+    def test_should_resolve_secrets_in_one_query(self):
+        secret_refs = []
+        for payload in ['first secret', 'second secret', 'third secret']:
+            _, secret_uuid = create_secret(self.app, payload=payload,
+                                           content_type='text/plain')
+            secret_refs.append(self._secret_ref(secret_uuid))
+
+        with mock.patch.object(repositories.SecretRepo,
+                               'get_secrets_for_retrieval',
+                               wraps=secrets_repo.get_secrets_for_retrieval
+                               ) as get_secrets:
+            resp = self.app.post_json('/secrets/payloads',
+                                      {'secret_refs': secret_refs})
+
+        self.assertEqual(200, resp.status_int)
+        self.assertEqual(1, get_secrets.call_count)
+
+    def test_should_fail_without_secret_refs(self):
+        resp = self.app.post_json('/secrets/payloads', {'secret_refs': []},
+                                  expect_errors=True)
+
+        self.assertEqual(400, resp.status_int)
+
+
 @utils.parameterized_test_case
 class WhenPerformingUnallowedOperations(utils.BarbicanAPIBaseTestCase):
 
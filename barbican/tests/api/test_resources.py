@@ -346,7 +346,8 @@ class WhenGettingPuttingOrDeletingSecretUsingSecretResource(FunctionalTest):
         # Set up mocked secret repo
         self.secret_repo = mock.Mock()
         self.secret_repo.get = mock.Mock(return_value=self.secret)
-        self.secret_repo.get_secret_by_id = mock.Mock(return_value=self.secret)
+        self.secret_repo.get_secret_for_retrieval = mock.Mock(
+            return_value=self.secret)
         self.secret_repo.delete_entity_by_id = mock.Mock(return_value=None)
         self.setup_secret_repository_mock(self.secret_repo)
 
@@ -384,7 +385,7 @@ class WhenGettingPuttingOrDeletingSecretUsingSecretResource(FunctionalTest):
             '/secrets/{0}/'.format(self.secret.id),
             headers={'Accept': 'application/json', 'Accept-Encoding': 'gzip'}
         )
-        self.secret_repo.get_secret_by_id.assert_called_once_with(
+        self.secret_repo.get_secret_for_retrieval.assert_called_once_with(
             entity_id=self.secret.id,
             suppress_exception=True)
         self.assertEqual(resp.status_int, 200)
@@ -407,7 +408,7 @@ class WhenGettingPuttingOrDeletingSecretUsingSecretResource(FunctionalTest):
             headers={'Accept': 'text/plain'}
         )
 
-        self.secret_repo.get_secret_by_id.assert_called_once_with(
+        self.secret_repo.get_secret_for_retrieval.assert_called_once_with(
             entity_id=self.secret.id,
             suppress_exception=True)
         self.assertEqual(resp.status_int, 200)
@@ -434,7 +435,7 @@ class WhenGettingPuttingOrDeletingSecretUsingSecretResource(FunctionalTest):
             headers={'Accept': 'text/plain'}
         )
 
-        self.secret_repo.get_secret_by_id.assert_called_once_with(
+        self.secret_repo.get_secret_for_retrieval.assert_called_once_with(
             entity_id=self.secret.id,
             suppress_exception=True)
         self.assertEqual(resp.status_int, 200)
@@ -463,7 +464,7 @@ class WhenGettingPuttingOrDeletingSecretUsingSecretResource(FunctionalTest):
             headers={'Accept': 'text/plain'}
         )
 
-        self.secret_repo.get_secret_by_id.assert_called_once_with(
+        self.secret_repo.get_secret_for_retrieval.assert_called_once_with(
             entity_id=self.secret.id,
             suppress_exception=True)
         self.assertEqual(resp.status_int, 200)
@@ -491,7 +492,7 @@ class WhenGettingPuttingOrDeletingSecretUsingSecretResource(FunctionalTest):
             expect_errors=True
         )
 
-        self.secret_repo.get_secret_by_id.assert_called_once_with(
+        self.secret_repo.get_secret_for_retrieval.assert_called_once_with(
             entity_id=self.secret.id,
             suppress_exception=True)
         self.assertEqual(resp.status_int, 400)
@@ -511,7 +512,7 @@ class WhenGettingPuttingOrDeletingSecretUsingSecretResource(FunctionalTest):
             expect_errors=True
         )
 
-        self.secret_repo.get_secret_by_id.assert_called_once_with(
+        self.secret_repo.get_secret_for_retrieval.assert_called_once_with(
             entity_id=self.secret.id,
             suppress_exception=True)
         self.assertEqual(resp.status_int, 400)
@@ -530,7 +531,7 @@ class WhenGettingPuttingOrDeletingSecretUsingSecretResource(FunctionalTest):
             headers={'Accept': 'application/json', 'Accept-Encoding': 'gzip'}
         )
 
-        self.secret_repo.get_secret_by_id.assert_called_once_with(
+        self.secret_repo.get_secret_for_retrieval.assert_called_once_with(
             entity_id=self.secret.id,
             suppress_exception=True)
 
@@ -557,7 +558,7 @@ class WhenGettingPuttingOrDeletingSecretUsingSecretResource(FunctionalTest):
             headers={'Accept': 'application/json', 'Accept-Encoding': 'gzip'}
         )
 
-        self.secret_repo.get_secret_by_id.assert_called_once_with(
+        self.secret_repo.get_secret_for_retrieval.assert_called_once_with(
             entity_id=self.secret.id,
             suppress_exception=True)
 
@@ -692,6 +693,18 @@ class WhenAddingNavigationHrefs(utils.BaseTestCase):
         self.assertIn('previous', data_with_hrefs)
         self.assertNotIn('next', data_with_hrefs)
 
+    def test_add_nav_hrefs_adds_marker_to_next_only(self):
+        offset = 10
+        limit = 10
+
+        data_with_hrefs = hrefs.add_nav_hrefs(
+            self.resource_name, offset, limit, self.num_elements, self.data,
+            marker='abc')
+
+        self.assertNotIn('marker=', data_with_hrefs['previous'])
+        self.assertIn('offset=20', data_with_hrefs['next'])
+        self.assertIn('marker=abc', data_with_hrefs['next'])
+
 
 class TestingJsonSanitization(utils.BaseTestCase):
 
@@ -323,8 +323,7 @@ class WhenTestingSecretResource(BaseTestCase):
         self.acl_list = [acl_read]
         secret = mock.MagicMock()
         secret.secret_acls.__iter__.return_value = self.acl_list
-        secret.project_assocs[0].projects.external_id = (self.
-                                                         external_project_id)
+        secret.project.external_id = self.external_project_id
         secret.creator_id = self.creator_user_id
 
         self.resource = SecretResource(secret)
@@ -32,3 +32,16 @@ class WhenTestingGetContainerID(test_utils.BaseTestCase):
         self.assertRaises(IndexError,
                           hrefs.get_container_id_from_ref,
                           test_ref)
+
+
+class WhenTestingGetSecretID(test_utils.BaseTestCase):
+
+    def test_get_secret_id_passes(self):
+        test_ref = 'https://localhost/v1/secrets/good_secret_ref'
+        result = hrefs.get_secret_id_from_ref(test_ref)
+        self.assertEqual('good_secret_ref', result)
+
+    def test_get_secret_id_with_trailing_slash_passes(self):
+        test_ref = 'https://localhost/v1/secrets/good_secret_ref/'
+        result = hrefs.get_secret_id_from_ref(test_ref)
+        self.assertEqual('good_secret_ref', result)
@@ -12,6 +12,8 @@
 # implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import uuid
+
 import mock
 
 from barbican.common import utils
@@ -133,3 +135,100 @@ class WhenTestingGenerateFullClassnameForInstance(test_utils.BaseTestCase):
     def test_returns_qualified_name(self):
         name = utils.generate_fullname_for(self.instance)
         self.assertEqual('mock.Mock', name)
+
+
+class WhenGeneratingUUIDs(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(WhenGeneratingUUIDs, self).setUp()
+        self.addCleanup(utils.CONF.clear_override, 'sql_id_scheme')
+
+    def test_should_generate_random_uuids_by_default(self):
+        self.assertEqual(4, uuid.UUID(utils.generate_uuid()).version)
+
+    def test_should_generate_time_ordered_uuids_if_configured(self):
+        utils.CONF.set_override('sql_id_scheme', 'time_ordered')
+
+        generated = utils.generate_uuid()
+
+        self.assertEqual(36, len(generated))
+        self.assertEqual(7, uuid.UUID(generated).version)
+
+    def test_time_ordered_uuids_should_sort_by_time(self):
+        earlier = utils.generate_time_ordered_uuid(1434000000.25)
+        later = utils.generate_time_ordered_uuid(1434000000.5)
+
+        self.assertLess(str(earlier), str(later))
+        self.assertEqual(uuid.RFC_4122, later.variant)
+        self.assertTrue(str(later).startswith('014de10f-85f4-7'))
+
+
+class WhenTestingLRUCache(test_utils.BaseTestCase):
+
+    def test_should_evict_least_recently_used_entry(self):
+        cache = utils.LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(1, cache.get('a'))
+
+        cache.put('c', 3)
+
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(3, cache.get('c'))
+
+    @mock.patch('time.time')
+    def test_should_expire_entries_after_ttl(self, mock_time):
+        cache = utils.LRUCache(2, ttl=10)
+        mock_time.return_value = 100
+        cache.put('a', 1)
+
+        mock_time.return_value = 110
+        self.assertEqual(1, cache.get('a'))
+
+        mock_time.return_value = 111
+        self.assertEqual('missing', cache.get('a', 'missing'))
+        self.assertEqual(0, len(cache))
+
+    def test_should_not_cache_when_disabled(self):
+        cache = utils.LRUCache(0)
+        cache.put('a', 1)
+        self.assertIsNone(cache.get('a'))
+
+    def test_should_pop_and_clear_entries(self):
+        cache = utils.LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+
+        self.assertEqual(1, cache.pop('a'))
+        self.assertIsNone(cache.pop('a'))
+
+        cache.clear()
+        self.assertEqual(0, len(cache))
+
+    @mock.patch('time.time')
+    def test_should_call_on_evict_for_dropped_values(self, mock_time):
+        evicted = []
+        cache = utils.LRUCache(2, ttl=10, on_evict=evicted.append)
+        mock_time.return_value = 100
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.put('c', 3)
+        self.assertEqual([1], evicted)
+
+        cache.put('b', 4)
+        self.assertEqual([1, 2], evicted)
+
+        mock_time.return_value = 111
+        self.assertIsNone(cache.get('c'))
+        self.assertEqual([1, 2, 3], evicted)
+
+        cache.clear()
+        self.assertEqual([1, 2, 3, 4], evicted)
+
+    def test_should_call_on_evict_when_disabled(self):
+        evicted = []
+        cache = utils.LRUCache(0, on_evict=evicted.append)
+        cache.put('a', 1)
+        self.assertEqual([1], evicted)
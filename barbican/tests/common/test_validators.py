@@ -941,6 +941,120 @@ class WhenTestingConsumerValidator(utils.BaseTestCase):
         )
 
 
+class WhenTestingNewSecretsValidator(utils.BaseTestCase):
+
+    def setUp(self):
+        super(WhenTestingNewSecretsValidator, self).setUp()
+
+        self.secrets_req = {
+            'secrets': [
+                {'name': ' first ', 'payload': 'not-encrypted',
+                 'payload_content_type': 'text/plain'},
+                {'name': 'second'}
+            ]
+        }
+        self.validator = validators.NewSecretsValidator()
+
+    def test_should_validate_each_secret(self):
+        result = self.validator.validate(self.secrets_req)
+
+        self.assertEqual('first', result['secrets'][0]['name'])
+        self.assertIsNone(result['secrets'][1]['expiration'])
+
+    def test_should_raise_with_invalid_secret(self):
+        self.secrets_req['secrets'][1]['payload'] = 'not-encrypted'
+
+        exception = self.assertRaises(
+            excep.InvalidObject,
+            self.validator.validate,
+            self.secrets_req
+        )
+
+        self.assertEqual('payload_content_type', exception.invalid_property)
+        self.assertIn("'secrets[1]'", exception.client_message)
+
+    def test_should_raise_with_content_type_but_no_payload(self):
+        self.secrets_req['secrets'][1]['payload_content_type'] = 'text/plain'
+
+        exception = self.assertRaises(
+            excep.InvalidObject,
+            self.validator.validate,
+            self.secrets_req
+        )
+
+        self.assertEqual('payload', exception.invalid_property)
+        self.assertIn("'secrets[1]'", exception.client_message)
+
+    def test_should_raise_with_empty_secrets(self):
+        self.assertRaises(
+            excep.InvalidObject,
+            self.validator.validate,
+            {'secrets': []}
+        )
+
+    def test_should_raise_with_transport_key_id(self):
+        self.secrets_req['secrets'][1]['transport_key_id'] = 'key-id'
+
+        exception = self.assertRaises(
+            excep.InvalidObject,
+            self.validator.validate,
+            self.secrets_req
+        )
+
+        self.assertEqual('transport_key_id', exception.invalid_property)
+
+    def test_should_raise_with_transport_key_needed(self):
+        self.secrets_req['secrets'][1]['transport_key_needed'] = 'true'
+
+        exception = self.assertRaises(
+            excep.InvalidObject,
+            self.validator.validate,
+            self.secrets_req
+        )
+
+        self.assertEqual('transport_key_id', exception.invalid_property)
+        self.assertIn("'secrets[1]'", exception.client_message)
+
+
+class WhenTestingSecretRefsValidator(utils.BaseTestCase):
+
+    def setUp(self):
+        super(WhenTestingSecretRefsValidator, self).setUp()
+
+        self.secret_refs_req = {
+            'secret_refs': ['http://localhost:9311/v1/secrets/secret-id']
+        }
+        self.validator = validators.SecretRefsValidator()
+
+    def test_should_validate_all_fields(self):
+        self.validator.validate(self.secret_refs_req)
+
+    def test_should_raise_with_missing_secret_refs(self):
+        exception = self.assertRaises(
+            excep.InvalidObject,
+            self.validator.validate,
+            {}
+        )
+
+        self.assertIn('\'secret_refs\'', exception.args[0])
+
+    def test_should_raise_with_empty_secret_refs(self):
+        self.assertRaises(
+            excep.InvalidObject,
+            self.validator.validate,
+            {'secret_refs': []}
+        )
+
+    def test_should_raise_with_too_many_secret_refs(self):
+        secret_refs = self.secret_refs_req['secret_refs'] * (
+            validators.CONF.max_secrets_per_bulk_request + 1)
+        self.assertRaises(
+            excep.InvalidObject,
+            self.validator.validate,
+            {'secret_refs': secret_refs}
+        )
+
+
 class WhenTestingKeyTypeOrderValidator(utils.BaseTestCase):
 
     def setUp(self):
@@ -17,7 +17,10 @@ Supports database/repositories oriented unit testing.
 Warning: Do not merge this content with the utils.py module, as doing so will
 break the DevStack functional test discovery process.
 """
+import contextlib
+
 import oslotest.base as oslotest
+import sqlalchemy
 
 from barbican.model import models
 from barbican.model import repositories
@@ -45,6 +48,58 @@ def get_session():
     return repositories.get_session()
 
 
+@contextlib.contextmanager
+def explain_query_plans():
+    """Collects the SQLite query plans of the SELECTs run in this context.
+
+    Yields a list, to which the detail line of each plan step, such as
+    'SEARCH TABLE secrets USING INDEX ...', is appended as queries run.
+    """
+    plans = []
+
+    def explain(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith('SELECT'):
+            return
+        explain_cursor = conn.connection.cursor()
+        try:
+            explain_cursor.execute('EXPLAIN QUERY PLAN ' + statement,
+                                   parameters)
+            plans.extend(row[-1] for row in explain_cursor.fetchall())
+        finally:
+            explain_cursor.close()
+
+    engine = repositories._ENGINE
+    sqlalchemy.event.listen(engine, 'before_cursor_execute', explain)
+    try:
+        yield plans
+    finally:
+        sqlalchemy.event.remove(engine, 'before_cursor_execute', explain)
+
+
+@contextlib.contextmanager
+def query_budget(max_queries=None, max_duplicates=None):
+    """Fails if the queries run in this context exceed the given budget.
+
+    Yields the QueryStats collected, so that tests may also inspect them.
+    Guards against regressions such as N+1 query patterns creeping in.
+    """
+    stats = repositories.start_query_stats()
+    try:
+        yield stats
+    finally:
+        repositories.stop_query_stats(stats)
+
+    if max_queries is not None and stats.count > max_queries:
+        raise AssertionError(
+            'Ran {0} queries, exceeding the budget of {1}: {2}'.format(
+                stats.count, max_queries, dict(stats.statements)))
+    if max_duplicates is not None and stats.duplicates > max_duplicates:
+        raise AssertionError(
+            'Ran {0} duplicate queries, exceeding the budget of {1}: '
+            '{2}'.format(stats.duplicates, max_duplicates,
+                         dict(stats.statements)))
+
+
 def create_project(external_id="my keystone id", session=None):
     project = models.Project()
     project.external_id = external_id
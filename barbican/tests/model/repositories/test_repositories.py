@@ -10,6 +10,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import datetime
+
 import mock
 import sqlalchemy
 
@@ -88,6 +90,31 @@ class WhenCleaningRepositoryPagingParameters(utils.BaseTestCase):
         self.assertEqual(self.CONF.max_limit_paging, clean_limit)
 
 
+class WhenCleaningRepositoryPagingMarker(utils.BaseTestCase):
+
+    def test_marker_not_assigned(self):
+        """The cleaner should return None when no marker is specified."""
+        self.assertIsNone(repositories.clean_paging_marker())
+        self.assertIsNone(repositories.clean_paging_marker(''))
+
+    def test_marker_round_trip(self):
+        """A marker decodes back into the (created_at, id) sort key."""
+        entity = models.Secret()
+        entity.id = 'secret-id'
+        entity.created_at = datetime.datetime(2015, 5, 20, 14, 22, 41, 3105)
+
+        marker = repositories.encode_paging_marker(entity)
+
+        self.assertNotIn('=', marker)
+        self.assertEqual((entity.created_at, entity.id),
+                         repositories.clean_paging_marker(marker))
+
+    def test_marker_as_undecodable_str(self):
+        """When Marker cannot be decoded, it should be ignored."""
+        self.assertIsNone(repositories.clean_paging_marker('boom'))
+        self.assertIsNone(repositories.clean_paging_marker('Ym9vbXxib29t'))
+
+
 class WhenInvokingExceptionMethods(utils.BaseTestCase):
 
     def setUp(self):
@@ -193,6 +220,292 @@ class WhenTestingBaseRepository(database_utils.RepositoryTestCase):
             exception_result.message)
 
 
+class WhenBakingQueries(database_utils.RepositoryTestCase):
+
+    def setUp(self):
+        super(WhenBakingQueries, self).setUp()
+        self.repo = repositories.get_project_repository()
+        self.session = self.repo.get_session()
+        self.project1 = database_utils.create_project(
+            external_id='project1', session=self.session)
+        self.project2 = database_utils.create_project(
+            external_id='project2', session=self.session)
+
+    def _build_query(self):
+        query = self.session.query(models.Project)
+        query = query.filter(models.Project.external_id ==
+                             sqlalchemy.bindparam('external_id'))
+        return query.bake('test_project_by_external_id')
+
+    def test_should_reuse_baked_query_with_new_params(self):
+        project1 = self._build_query().params(external_id='project1').one()
+        project2 = self._build_query().params(external_id='project2').one()
+
+        self.assertEqual(self.project1.id, project1.id)
+        self.assertEqual(self.project2.id, project2.id)
+        self.assertEqual(1, len(repositories._QUERY_CONTEXT_CACHE))
+
+    def test_should_find_query_internals_baking_relies_on(self):
+        for name in ('_compile_context', '_connection_from_session'):
+            self.assertTrue(
+                hasattr(sqlalchemy.orm.Query, name),
+                'BakedQuery overrides Query.%s, which this SQLAlchemy '
+                'version no longer has' % name)
+
+        context = self.session.query(models.Project)._compile_context()
+        for name in ('query', 'session', 'attributes'):
+            self.assertTrue(
+                hasattr(context, name),
+                'BakedQuery sets QueryContext.%s, which this SQLAlchemy '
+                'version no longer has' % name)
+
+    def test_should_not_bake_query_with_subquery_loads(self):
+        query = self.session.query(models.Project)
+        query = query.options(sqlalchemy.orm.subqueryload('secrets'))
+        query = query.filter(models.Project.external_id ==
+                             sqlalchemy.bindparam('external_id'))
+        query = query.bake('test_project_with_secrets_by_external_id')
+
+        project = query.params(external_id='project1').one()
+
+        self.assertEqual(self.project1.id, project.id)
+        self.assertEqual({}, repositories._QUERY_CONTEXT_CACHE)
+
+    def test_should_not_bake_when_disabled(self):
+        repositories.CONF.set_override("sql_query_cache", False)
+        self.addCleanup(repositories.CONF.clear_override, "sql_query_cache")
+
+        project = self._build_query().params(external_id='project1').one()
+
+        self.assertEqual(self.project1.id, project.id)
+        self.assertEqual({}, repositories._QUERY_CONTEXT_CACHE)
+
+    def test_should_unbake_query_when_changed(self):
+        query = self._build_query().filter_by(deleted=False)
+
+        self.assertIsNone(query._bake_key)
+
+
+class WhenDeferringFlushes(database_utils.RepositoryTestCase):
+
+    def setUp(self):
+        super(WhenDeferringFlushes, self).setUp()
+        self.session = repositories.get_session()
+        self.project = database_utils.create_project(session=self.session)
+
+    def _new_secret(self):
+        secret = models.Secret()
+        secret.project_id = self.project.id
+        return secret
+
+    def test_should_flush_saved_entities_once_on_exit(self):
+        with repositories.deferred_flush(self.session):
+            secret = self._new_secret()
+            secret.save(session=self.session)
+            meta = models.SecretStoreMetadatum('key', 'value')
+            meta.secret = secret
+            meta.save(session=self.session)
+
+            self.assertIsNotNone(secret.id)
+            self.assertIn(secret, self.session.new)
+            self.assertIn(meta, self.session.new)
+
+        self.assertEqual(0, len(self.session.new))
+        self.assertEqual(secret.id, meta.secret_id)
+
+    def test_should_flush_nested_contexts_with_outermost(self):
+        with repositories.deferred_flush(self.session):
+            with repositories.deferred_flush(self.session):
+                secret = self._new_secret()
+                secret.save(session=self.session)
+
+            self.assertIn(secret, self.session.new)
+
+        self.assertNotIn(secret, self.session.new)
+
+    def test_should_not_flush_on_error(self):
+        secret = self._new_secret()
+
+        def save_and_fail():
+            with repositories.deferred_flush(self.session):
+                secret.save(session=self.session)
+                raise ValueError()
+
+        self.assertRaises(ValueError, save_and_fail)
+        self.assertIn(secret, self.session.new)
+        self.assertNotIn('defer_flush', self.session.info)
+        self.assertNotIn('deferred_counts', self.session.info)
+
+    def test_should_update_project_counts_once_on_exit(self):
+        count_repo = repositories.get_project_entity_count_repository()
+        self.session.flush()
+        statements = []
+
+        def count_statement(conn, cursor, statement, *args):
+            statements.append(statement.split()[0].upper())
+
+        engine = self.session.get_bind()
+        sqlalchemy.event.listen(engine, 'before_cursor_execute',
+                                count_statement)
+        self.addCleanup(sqlalchemy.event.remove, engine,
+                        'before_cursor_execute', count_statement)
+
+        with repositories.deferred_flush(self.session):
+            for _ in range(3):
+                repositories.get_secret_repository().create_from(
+                    self._new_secret(), session=self.session)
+            self.assertEqual([], statements)
+
+        self.assertEqual(['INSERT', 'UPDATE'], statements)
+        self.assertEqual(3, count_repo.get_count(
+            self.project.external_id, models.Secret.__tablename__,
+            session=self.session))
+
+    def test_should_raise_duplicate_on_integrity_error(self):
+        def save_twice():
+            with repositories.deferred_flush(self.session):
+                secret = self._new_secret()
+                secret.save(session=self.session)
+                duplicate = self._new_secret()
+                duplicate.id = secret.id
+                self.session.add(duplicate)
+
+        self.assertRaises(exception.Duplicate, save_twice)
+
+
+class WhenPurgingDeletedRows(database_utils.RepositoryTestCase):
+
+    def setUp(self):
+        super(WhenPurgingDeletedRows, self).setUp()
+        self.session = repositories.get_session()
+        self.project = database_utils.create_project(session=self.session)
+        self.now = datetime.datetime.utcnow()
+
+    def _create_secret(self, deleted_days_ago=None):
+        secret = models.Secret()
+        secret.project_id = self.project.id
+        if deleted_days_ago is not None:
+            secret.deleted = True
+            secret.deleted_at = (
+                self.now - datetime.timedelta(days=deleted_days_ago))
+        secret.save(session=self.session)
+        return secret.id
+
+    def _secret_ids(self):
+        return set(s.id for s in self.session.query(models.Secret))
+
+    def test_should_purge_only_rows_deleted_before_age(self):
+        self._create_secret(deleted_days_ago=40)
+        recent_id = self._create_secret(deleted_days_ago=10)
+        active_id = self._create_secret()
+        self.session.commit()
+
+        stats = repositories.purge_deleted_rows(30, 1)
+
+        self.assertEqual(1, stats['secrets'])
+        self.assertEqual(set([recent_id, active_id]), self._secret_ids())
+
+    def test_should_only_count_rows_on_dry_run(self):
+        old_id = self._create_secret(deleted_days_ago=40)
+        self.session.commit()
+
+        stats = repositories.purge_deleted_rows(30, 10, dry_run=True)
+
+        self.assertEqual(1, stats['secrets'])
+        self.assertEqual(set([old_id]), self._secret_ids())
+
+    def test_should_keep_rows_still_referenced(self):
+        old_id = self._create_secret(deleted_days_ago=40)
+        order = database_utils.create_order(self.project, self.session)
+        order.secret_id = old_id
+        order.save(session=self.session)
+        self.session.commit()
+
+        stats = repositories.purge_deleted_rows(30, 10)
+
+        self.assertEqual(0, stats['secrets'])
+        self.assertEqual(set([old_id]), self._secret_ids())
+
+    def test_should_purge_deleted_secret_with_its_project_association(self):
+        secret_id = self._create_secret()
+        project_secret = models.ProjectSecret()
+        project_secret.project_id = self.project.id
+        project_secret.secret_id = secret_id
+        project_secret.save(session=self.session)
+        self.session.commit()
+
+        secret = self.session.query(models.Secret).get(secret_id)
+        secret.delete(session=self.session)
+        deleted_at = self.now - datetime.timedelta(days=40)
+        for model_class in (models.Secret, models.ProjectSecret):
+            self.session.query(model_class).update(
+                {'deleted_at': deleted_at}, synchronize_session=False)
+        self.session.commit()
+
+        stats = repositories.purge_deleted_rows(30, 10)
+
+        self.assertEqual(1, stats['secrets'])
+        self.assertEqual(1, stats['project_secret'])
+        self.assertEqual(set(), self._secret_ids())
+
+
+class WhenCollectingQueryStats(database_utils.RepositoryTestCase):
+
+    def setUp(self):
+        super(WhenCollectingQueryStats, self).setUp()
+        self.session = repositories.get_session()
+        database_utils.create_project(external_id='project1',
+                                      session=self.session)
+        self.session.flush()
+
+    def _find_project(self, external_id):
+        query = self.session.query(models.Project)
+        return query.filter_by(external_id=external_id).all()
+
+    def test_should_count_queries_and_duplicates(self):
+        stats = repositories.start_query_stats()
+        self._find_project('project1')
+        self._find_project('project2')
+        repositories.stop_query_stats(stats)
+
+        self.assertEqual(2, stats.count)
+        self.assertEqual(1, stats.duplicates)
+        self.assertEqual(1, len(stats.statements))
+        self.assertGreaterEqual(stats.duration, 0.0)
+
+    def test_should_record_queries_to_nested_stats(self):
+        outer = repositories.start_query_stats()
+        self._find_project('project1')
+        inner = repositories.start_query_stats()
+        self._find_project('project1')
+        repositories.stop_query_stats(inner)
+        repositories.stop_query_stats(outer)
+
+        self.assertEqual(2, outer.count)
+        self.assertEqual(1, inner.count)
+
+    def test_should_not_record_queries_once_stopped(self):
+        stats = repositories.start_query_stats()
+        repositories.stop_query_stats(stats)
+        self._find_project('project1')
+
+        self.assertEqual(0, stats.count)
+
+    def test_should_fail_when_query_budget_exceeded(self):
+        def exceed_budget():
+            with database_utils.query_budget(max_duplicates=0):
+                self._find_project('project1')
+                self._find_project('project2')
+
+        self.assertRaises(AssertionError, exceed_budget)
+
+    def test_should_pass_within_query_budget(self):
+        with database_utils.query_budget(max_queries=1) as stats:
+            self._find_project('project1')
+
+        self.assertEqual(1, stats.count)
+
+
 class WhenTestingWrapDbError(utils.BaseTestCase):
 
     def setUp(self):
@@ -215,6 +528,91 @@ class WhenTestingWrapDbError(utils.BaseTestCase):
             test_function)
 
 
+class WhenTestingPingListener(utils.BaseTestCase):
+
+    def setUp(self):
+        super(WhenTestingPingListener, self).setUp()
+
+        class DBAPIError(Exception):
+            pass
+
+        self.engine = mock.MagicMock()
+        self.engine.dialect.dbapi.Error = DBAPIError
+        self.dbapi_conn = mock.MagicMock()
+        self.cursor = self.dbapi_conn.cursor.return_value
+        self.error = DBAPIError('gone away')
+
+    def test_should_pass_live_connection(self):
+        repositories._ping_listener(self.engine, self.dbapi_conn,
+                                    mock.MagicMock(), mock.MagicMock())
+
+        self.cursor.execute.assert_called_once_with('SELECT 1')
+        self.cursor.close.assert_called_once_with()
+
+    def test_should_raise_disconnection_error_for_dead_connection(self):
+        self.cursor.execute.side_effect = self.error
+        self.engine.dialect.is_disconnect.return_value = True
+
+        self.assertRaises(sqlalchemy.exc.DisconnectionError,
+                          repositories._ping_listener, self.engine,
+                          self.dbapi_conn, mock.MagicMock(), mock.MagicMock())
+        self.engine.dialect.is_disconnect.assert_called_once_with(
+            self.error, self.dbapi_conn, self.cursor)
+        self.cursor.close.assert_called_once_with()
+
+    def test_should_reraise_other_errors(self):
+        self.cursor.execute.side_effect = self.error
+        self.engine.dialect.is_disconnect.return_value = False
+
+        self.assertRaises(type(self.error), repositories._ping_listener,
+                          self.engine, self.dbapi_conn, mock.MagicMock(),
+                          mock.MagicMock())
+
+
+class WhenRetryingReadsOnDisconnect(utils.BaseTestCase):
+
+    def setUp(self):
+        super(WhenRetryingReadsOnDisconnect, self).setUp()
+
+        self.session = mock.MagicMock()
+        self.session.info = {'read_only': True}
+        self.repo = mock.MagicMock()
+        self.repo.get_session.return_value = self.session
+
+        self.read = mock.MagicMock(__name__='read')
+        self.disconnect = sqlalchemy.exc.OperationalError(
+            'select', {}, 'gone away', connection_invalidated=True)
+
+    def test_should_retry_read_once_on_disconnect(self):
+        self.read.side_effect = [self.disconnect, 'result']
+
+        result = repositories.retry_read_on_disconnect(self.read)(
+            self.repo, 'id', session=self.session)
+
+        self.assertEqual('result', result)
+        self.assertEqual(2, self.read.call_count)
+        self.session.rollback.assert_called_once_with()
+
+    def test_should_not_retry_in_read_write_session(self):
+        self.session.info = {}
+        self.read.side_effect = [self.disconnect, 'result']
+
+        self.assertRaises(sqlalchemy.exc.OperationalError,
+                          repositories.retry_read_on_disconnect(self.read),
+                          self.repo, 'id')
+        self.assertFalse(self.session.rollback.called)
+
+    def test_should_not_retry_other_errors(self):
+        self.read.side_effect = [
+            sqlalchemy.exc.OperationalError('select', {}, 'syntax error'),
+            'result']
+
+        self.assertRaises(sqlalchemy.exc.OperationalError,
+                          repositories.retry_read_on_disconnect(self.read),
+                          self.repo, 'id')
+        self.assertEqual(1, self.read.call_count)
+
+
 class WhenTestingGetEnginePrivate(utils.BaseTestCase):
 
     def setUp(self):
@@ -286,6 +684,75 @@ class WhenTestingGetEnginePrivate(utils.BaseTestCase):
         )
 
 
+class WhenStartingReadOnlyRequests(utils.BaseTestCase):
+
+    def setUp(self):
+        super(WhenStartingReadOnlyRequests, self).setUp()
+
+        self.replica1 = mock.MagicMock()
+        self.replica2 = mock.MagicMock()
+        self.session_factory = mock.MagicMock()
+        self.session_factory.registry.has.return_value = False
+        self.session = self.session_factory.return_value
+        self.session.info = {}
+
+        patches = [
+            mock.patch.object(repositories, '_READ_ENGINES',
+                              [self.replica1, self.replica2]),
+            mock.patch.object(repositories, '_READ_ENGINES_SKIPPED_UNTIL',
+                              {}),
+            mock.patch.object(repositories, '_SESSION_FACTORY',
+                              self.session_factory),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_should_bind_session_to_a_replica(self):
+        repositories.start_read_only()
+
+        _, kwargs = self.session_factory.call_args_list[0]
+        self.assertIn(kwargs['bind'], (self.replica1, self.replica2))
+        self.session.connection.assert_called_once_with()
+        self.assertTrue(self.session.info['read_only'])
+
+    def test_should_not_use_replica_if_not_requested(self):
+        repositories.start_read_only(use_replica=False)
+
+        self.session_factory.assert_called_once_with()
+        self.assertTrue(self.session.info['read_only'])
+
+    def test_should_skip_replica_that_cannot_be_connected_to(self):
+        self.session.connection.side_effect = [
+            sqlalchemy.exc.OperationalError('select', {}, 'Abort!'), None]
+
+        repositories.start_read_only()
+
+        self.assertEqual(3, self.session_factory.call_count)
+        self.session_factory.remove.assert_called_once_with()
+        _, kwargs = self.session_factory.call_args_list[0]
+        self.assertIn(kwargs['bind'],
+                      repositories._READ_ENGINES_SKIPPED_UNTIL)
+
+        # The failed replica is then skipped until its retry interval ends.
+        self.session_factory.reset_mock()
+        self.session.connection.side_effect = None
+        for _ in range(5):
+            self.session_factory.reset_mock()
+            repositories.start_read_only()
+            _, bound = self.session_factory.call_args_list[0]
+            self.assertNotEqual(kwargs['bind'], bound['bind'])
+
+    def test_should_fall_back_to_primary_if_no_replica_available(self):
+        self.session.connection.side_effect = (
+            sqlalchemy.exc.OperationalError('select', {}, 'Abort!'))
+
+        repositories.start_read_only()
+
+        self.assertEqual(2, self.session_factory.remove.call_count)
+        self.assertEqual(2, len(repositories._READ_ENGINES_SKIPPED_UNTIL))
+
+
 class WhenTestingAutoGenerateTables(utils.BaseTestCase):
 
     @mock.patch('barbican.model.migration.commands.upgrade')
@@ -321,3 +788,9 @@ class WhenTestingIsDbConnectionError(utils.BaseTestCase):
         result = repositories.is_db_connection_error(args)
 
         self.assertTrue(result)
+
+    def test_should_return_true_for_postgresql_connection_errors(self):
+        result = repositories.is_db_connection_error(
+            'server closed the connection unexpectedly')
+
+        self.assertTrue(result)
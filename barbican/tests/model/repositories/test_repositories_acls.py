@@ -60,6 +60,7 @@ class WhenTestingSecretACLRepository(database_utils.RepositoryTestCase,
         project_secret = models.ProjectSecret()
         project_secret.secret_id = secret.id
         project_secret.project_id = project_id
+        secret.project_id = project_id
         project_secret.save(session=session)
 
         session.commit()
@@ -0,0 +1,83 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+
+from barbican.model import models
+from barbican.model import repositories
+from barbican.tests import database_utils
+
+
+class WhenListingWithIndexes(database_utils.RepositoryTestCase):
+    """Checks that list queries are served by the indexes meant for them."""
+
+    def setUp(self):
+        super(WhenListingWithIndexes, self).setUp()
+        self.session = repositories.get_session()
+        self.project = database_utils.create_project(session=self.session)
+
+    def _assert_uses_index(self, index_name, plans):
+        self.assertTrue(
+            any(index_name in plan for plan in plans),
+            '{0} not used by query plans: {1}'.format(index_name, plans))
+
+    def test_secrets_list_uses_project_deleted_created_at_index(self):
+        with database_utils.explain_query_plans() as plans:
+            repositories.get_secret_repository().get_by_create_date(
+                self.project.external_id, suppress_exception=True,
+                session=self.session)
+
+        self._assert_uses_index('secrets_project_deleted_created_at_id_idx',
+                                plans)
+
+    def test_orders_list_uses_project_deleted_created_at_index(self):
+        with database_utils.explain_query_plans() as plans:
+            repositories.get_order_repository().get_by_create_date(
+                self.project.external_id, suppress_exception=True,
+                session=self.session)
+
+        self._assert_uses_index('orders_project_deleted_created_at_id_idx',
+                                plans)
+
+    def test_containers_list_uses_project_deleted_created_at_index(self):
+        with database_utils.explain_query_plans() as plans:
+            repositories.get_container_repository().get_by_create_date(
+                self.project.external_id, suppress_exception=True,
+                session=self.session)
+
+        self._assert_uses_index(
+            'containers_project_deleted_created_at_id_idx', plans)
+
+    def test_retry_tasks_list_uses_deleted_retry_at_index(self):
+        retry_task_repo = repositories.get_order_retry_tasks_repository()
+
+        with database_utils.explain_query_plans() as plans:
+            retry_task_repo.get_by_create_date(
+                only_at_or_before_this_date=datetime.datetime.utcnow(),
+                suppress_exception=True, session=self.session)
+
+        self._assert_uses_index('order_retry_tasks_deleted_retry_at_idx',
+                                plans)
+
+    def test_consumer_lookup_uses_values_index(self):
+        container = models.Container()
+        container.project_id = self.project.id
+        container.save(session=self.session)
+        consumer = models.ContainerConsumerMetadatum(
+            container.id, {'name': 'name', 'URL': 'www.foo.com'})
+        consumer.save(session=self.session)
+
+        with database_utils.explain_query_plans() as plans:
+            repositories.get_container_consumer_repository().get_by_values(
+                container.id, 'name', 'www.foo.com', session=self.session)
+
+        self._assert_uses_index('values_index', plans)
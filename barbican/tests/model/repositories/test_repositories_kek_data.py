@@ -0,0 +1,92 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from barbican.model import repositories
+from barbican.tests import database_utils
+
+
+class WhenTestingKEKDatumRepository(database_utils.RepositoryTestCase):
+
+    def setUp(self):
+        super(WhenTestingKEKDatumRepository, self).setUp()
+        self.repo = repositories.get_kek_datum_repository()
+        self.plugin_name = 'my.crypto.Plugin'
+
+        session = self.repo.get_session()
+        self.project_id = database_utils.create_project(session=session).id
+        session.commit()
+
+    def _get_project(self, session):
+        return repositories.get_project_repository().get(
+            self.project_id, session=session)
+
+    def _create_bound_kek_datum(self):
+        session = self.repo.get_session()
+        kek_datum = self.repo.find_or_create_kek_datum(
+            self._get_project(session), self.plugin_name, session=session)
+        kek_datum.bind_completed = True
+        kek_datum_id = kek_datum.id
+        session.commit()
+        database_utils.in_memory_cleanup()
+        return kek_datum_id
+
+    def test_should_create_kek_datum_once(self):
+        session = self.repo.get_session()
+        project = self._get_project(session)
+
+        kek_datum = self.repo.find_or_create_kek_datum(
+            project, self.plugin_name, session=session)
+        kek_datum_again = self.repo.find_or_create_kek_datum(
+            project, self.plugin_name, session=session)
+
+        self.assertEqual(kek_datum.id, kek_datum_again.id)
+        self.assertTrue(kek_datum.active)
+        self.assertFalse(kek_datum.bind_completed)
+
+    def test_should_not_cache_kek_datum_created_by_session(self):
+        session = self.repo.get_session()
+        project = self._get_project(session)
+        kek_datum = self.repo.find_or_create_kek_datum(
+            project, self.plugin_name, session=session)
+        kek_datum.bind_completed = True
+        session.flush()
+
+        self.repo.find_or_create_kek_datum(project, self.plugin_name,
+                                           session=session)
+
+        self.assertIsNone(
+            repositories.get_kek_datum_cache().get(self.project_id))
+
+    def test_should_find_cached_bound_kek_datum(self):
+        kek_datum_id = self._create_bound_kek_datum()
+        session = self.repo.get_session()
+        project = self._get_project(session)
+
+        self.repo.find_or_create_kek_datum(project, self.plugin_name,
+                                           session=session)
+        with database_utils.query_budget(max_queries=0):
+            kek_datum = self.repo.find_or_create_kek_datum(
+                project, self.plugin_name, session=session)
+
+        self.assertEqual(kek_datum_id, kek_datum.id)
+        self.assertTrue(kek_datum.bind_completed)
+
+    def test_should_invalidate_cached_kek_data(self):
+        self._create_bound_kek_datum()
+        session = self.repo.get_session()
+        self.repo.find_or_create_kek_datum(
+            self._get_project(session), self.plugin_name, session=session)
+
+        self.repo.invalidate_cache(self.project_id)
+
+        self.assertIsNone(
+            repositories.get_kek_datum_cache().get(self.project_id))
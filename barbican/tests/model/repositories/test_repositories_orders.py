@@ -66,3 +66,54 @@ class WhenTestingOrderRepository(database_utils.RepositoryTestCase):
         )
 
         self.assertEqual(order.id, order_from_get.id)
+
+    def test_get_by_create_date_with_marker(self):
+        session = self.repo.get_session()
+
+        project = models.Project()
+        project.external_id = "my keystone id"
+        project.save(session=session)
+
+        orders = []
+        for _ in range(3):
+            order = models.Order()
+            order.project_id = project.id
+            self.repo.create_from(order, session=session)
+            orders.append(order)
+
+        session.commit()
+
+        expected_ids = [o.id for o in sorted(
+            orders, key=lambda o: (o.created_at, o.id))]
+        marker = repositories.encode_paging_marker(
+            self.repo.get(expected_ids[0], "my keystone id", session=session))
+
+        entities, offset, limit, total = self.repo.get_by_create_date(
+            "my keystone id", session=session, marker_arg=marker)
+
+        self.assertEqual(expected_ids[1:], [o.id for o in entities])
+        self.assertEqual(3, total)
+
+    def test_get_by_create_date_with_estimated_total(self):
+        session = self.repo.get_session()
+
+        project = repositories.get_project_repository().create_from(
+            models.Project(), session=session)
+        project.external_id = "my keystone id"
+        project.save(session=session)
+
+        for _ in range(5):
+            order = models.Order()
+            order.project_id = project.id
+            self.repo.create_from(order, session=session)
+
+        self.repo.delete_entity_by_id(order.id, "my keystone id",
+                                      session=session)
+        session.commit()
+
+        entities, _, _, total = self.repo.get_by_create_date(
+            "my keystone id", limit_arg=1, session=session,
+            total_arg=repositories.TOTAL_ESTIMATE)
+
+        self.assertEqual(1, len(entities))
+        self.assertEqual(4, total)
@@ -47,3 +47,44 @@ class WhenTestingProjectRepository(database_utils.RepositoryTestCase):
             "my keystone id",
             session=session,
             suppress_exception=False)
+
+    def test_should_create_or_find_existing_project(self):
+        session = self.repo.get_session()
+
+        project = self.repo.create_or_find_by_external_project_id(
+            'my keystone id', session=session)
+        self.assertIsNotNone(project.id)
+        self.assertEqual(models.States.ACTIVE, project.status)
+        session.commit()
+
+        # A concurrent request that lost the race gets the same project.
+        project_again = self.repo.create_or_find_by_external_project_id(
+            'my keystone id', session=session)
+        self.assertEqual(project.id, project_again.id)
+
+    def test_should_find_cached_project_after_commit(self):
+        session = self.repo.get_session()
+        project = self.repo.create_or_find_by_external_project_id(
+            'my keystone id', session=session)
+        project_id = project.id
+        session.commit()
+
+        # Not cached yet, as it was created by this session.
+        self.assertIsNone(
+            repositories.get_project_cache().get('my keystone id'))
+
+        database_utils.in_memory_cleanup()
+        session = self.repo.get_session()
+        self.repo.find_by_external_project_id('my keystone id',
+                                              session=session)
+        cached = repositories.get_project_cache().get('my keystone id')
+        self.assertEqual(project_id, cached['id'])
+
+        project_cached = self.repo.find_by_external_project_id(
+            'my keystone id', session=session)
+        self.assertEqual(project_id, project_cached.id)
+        self.assertEqual('my keystone id', project_cached.external_id)
+
+        self.repo.invalidate_cache('my keystone id')
+        self.assertIsNone(
+            repositories.get_project_cache().get('my keystone id'))
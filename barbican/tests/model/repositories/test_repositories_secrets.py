@@ -10,6 +10,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import datetime
+
 from barbican.common import exception
 from barbican.model import models
 from barbican.model import repositories
@@ -27,6 +29,31 @@ class WhenTestingSecretRepository(database_utils.RepositoryTestCase):
             'secret_2_dict': dict(name="name2"),
             'query_dict': dict(name="name1")
         },
+        'query_by_name_ignoring_case': {
+            'secret_1_dict': dict(name="Name1"),
+            'secret_2_dict': dict(name="name2"),
+            'query_dict': dict(name="NAME1")
+        },
+        'query_by_name_with_wildcard': {
+            'secret_1_dict': dict(name="name1"),
+            'secret_2_dict': dict(name="other2"),
+            'query_dict': dict(name="na%")
+        },
+        'query_by_name_with_single_char_wildcard': {
+            'secret_1_dict': dict(name="Name1"),
+            'secret_2_dict': dict(name="name22"),
+            'query_dict': dict(name="name_")
+        },
+        'query_by_name_prefix': {
+            'secret_1_dict': dict(name="prod-db"),
+            'secret_2_dict': dict(name="staging-db"),
+            'query_dict': dict(name_prefix="PROD")
+        },
+        'query_by_name_prefix_with_like_chars': {
+            'secret_1_dict': dict(name="a_b%c"),
+            'secret_2_dict': dict(name="axbxc"),
+            'query_dict': dict(name_prefix="a_b%")
+        },
         'query_by_algorithm': {
             'secret_1_dict': dict(algorithm="algorithm1"),
             'secret_2_dict': dict(algorithm="algorithm2"),
@@ -64,6 +91,7 @@ class WhenTestingSecretRepository(database_utils.RepositoryTestCase):
         project_secret = models.ProjectSecret()
         project_secret.secret_id = secret.id
         project_secret.project_id = project.id
+        secret.project_id = project.id
         project_secret.save(session=session)
 
         session.commit()
@@ -78,6 +106,125 @@ class WhenTestingSecretRepository(database_utils.RepositoryTestCase):
         self.assertEqual(limit, 10)
         self.assertEqual(total, 1)
 
+    def test_get_by_create_date_loads_metadata_only(self):
+        session = self.repo.get_session()
+
+        project = models.Project()
+        project.external_id = "my keystone id"
+        project.save(session=session)
+
+        secret = models.Secret()
+        secret.project_id = project.id
+        self.repo.create_from(secret, session=session)
+        session.commit()
+        session.expunge_all()
+
+        secrets, _, _, _ = self.repo.get_by_create_date(
+            "my keystone id", session=session)
+
+        # The listed secrets' encrypted data and ACLs are loaded lazily, if
+        # at all, while their store metadata is already loaded.
+        self.assertEqual(1, len(secrets))
+        self.assertNotIn('encrypted_data', secrets[0].__dict__)
+        self.assertNotIn('secret_acls', secrets[0].__dict__)
+        self.assertIn('secret_store_metadata', secrets[0].__dict__)
+        self.assertEqual([], secrets[0].encrypted_data)
+
+    def test_get_by_create_date_with_marker(self):
+        session = self.repo.get_session()
+
+        project = models.Project()
+        project.external_id = "my keystone id"
+        project.save(session=session)
+
+        secrets = []
+        for _ in range(5):
+            secret = self.repo.create_from(models.Secret(), session=session)
+            project_secret = models.ProjectSecret()
+            project_secret.secret_id = secret.id
+            project_secret.project_id = project.id
+            secret.project_id = project.id
+            project_secret.save(session=session)
+            secrets.append(secret)
+
+        session.commit()
+
+        expected_ids = [s.id for s in sorted(
+            secrets, key=lambda s: (s.created_at, s.id))]
+
+        first_page, _, _, total = self.repo.get_by_create_date(
+            "my keystone id", limit_arg=2, session=session)
+        marker = repositories.encode_paging_marker(first_page[-1])
+
+        second_page, offset, limit, total = self.repo.get_by_create_date(
+            "my keystone id", offset_arg=2, limit_arg=2, session=session,
+            marker_arg=marker)
+
+        self.assertEqual(expected_ids[:2], [s.id for s in first_page])
+        self.assertEqual(expected_ids[2:4], [s.id for s in second_page])
+        self.assertEqual(2, offset)
+        self.assertEqual(2, limit)
+        self.assertEqual(5, total)
+
+    def _create_project_secrets(self, session, count):
+        project = repositories.get_project_repository().create_from(
+            models.Project(), session=session)
+        project.external_id = "my keystone id"
+        project.save(session=session)
+
+        secrets = []
+        for _ in range(count):
+            secret = models.Secret()
+            secret.project_id = project.id
+            self.repo.create_from(secret, session=session)
+            project_secret = models.ProjectSecret()
+            project_secret.secret_id = secret.id
+            project_secret.project_id = project.id
+            project_secret.save(session=session)
+            secrets.append(secret)
+
+        session.commit()
+        return secrets
+
+    def test_get_by_create_date_without_total(self):
+        session = self.repo.get_session()
+        self._create_project_secrets(session, 5)
+
+        entities, _, _, total = self.repo.get_by_create_date(
+            "my keystone id", limit_arg=2, session=session,
+            total_arg=repositories.TOTAL_NONE)
+        self.assertEqual(2, len(entities))
+        self.assertEqual(3, total)
+
+        entities, _, _, total = self.repo.get_by_create_date(
+            "my keystone id", offset_arg=4, limit_arg=2, session=session,
+            total_arg=repositories.TOTAL_NONE)
+        self.assertEqual(1, len(entities))
+        self.assertEqual(5, total)
+
+    def test_get_by_create_date_with_estimated_total(self):
+        session = self.repo.get_session()
+        secrets = self._create_project_secrets(session, 5)
+
+        self.repo.delete_entity_by_id(secrets[0].id, "my keystone id",
+                                      session=session)
+        session.commit()
+
+        entities, _, _, total = self.repo.get_by_create_date(
+            "my keystone id", limit_arg=2, session=session,
+            total_arg=repositories.TOTAL_ESTIMATE)
+        self.assertEqual(2, len(entities))
+        self.assertEqual(4, total)
+
+    def test_get_by_create_date_estimated_total_ignored_when_filtered(self):
+        session = self.repo.get_session()
+        self._create_project_secrets(session, 3)
+
+        _, _, _, total = self.repo.get_by_create_date(
+            "my keystone id", name="foo", session=session,
+            suppress_exception=True, total_arg=repositories.TOTAL_ESTIMATE)
+        self.assertEqual(0, total)
+
     def test_get_secret_by_id(self):
         session = self.repo.get_session()
 
@@ -89,12 +236,73 @@ class WhenTestingSecretRepository(database_utils.RepositoryTestCase):
         project_secret = models.ProjectSecret()
         project_secret.secret_id = secret.id
         project_secret.project_id = project.id
+        secret.project_id = project.id
         project_secret.save(session=session)
         session.commit()
 
         db_secret = self.repo.get_secret_by_id(secret.id)
         self.assertIsNotNone(db_secret)
 
+    def test_get_secret_for_retrieval_loads_related_in_two_queries(self):
+        session = self.repo.get_session()
+        project = database_utils.create_project(session=session)
+
+        secret = models.Secret()
+        secret.project_id = project.id
+        secret = self.repo.create_from(secret, session=session)
+        for key, value in (('content_type', 'text/plain'),
+                           ('plugin_name', 'plugin')):
+            meta = models.SecretStoreMetadatum(key, value)
+            meta.secret = secret
+            meta.save(session=session)
+        acl = models.SecretACL(secret.id, 'read',
+                               user_ids=['user1', 'user2'])
+        acl.save(session=session)
+        secret_id = secret.id
+        session.commit()
+        session.expunge_all()
+
+        with database_utils.query_budget(max_queries=2):
+            db_secret = self.repo.get_secret_for_retrieval(secret_id)
+
+            self.assertEqual('my keystone id',
+                             db_secret.project.external_id)
+            self.assertEqual(
+                ['user1', 'user2'],
+                sorted(u.user_id for u in db_secret.secret_acls[0].acl_users))
+            self.assertEqual(
+                {'content_type': 'text/plain', 'plugin_name': 'plugin'},
+                dict((k, m.value) for k, m in
+                     db_secret.secret_store_metadata.items()))
+
+    def test_get_secrets_for_retrieval_loads_secrets_in_two_queries(self):
+        session = self.repo.get_session()
+        project = database_utils.create_project(session=session)
+
+        secret_ids = []
+        for i in range(3):
+            secret = models.Secret()
+            secret.project_id = project.id
+            secret = self.repo.create_from(secret, session=session)
+            meta = models.SecretStoreMetadatum('content_type', 'text/plain')
+            meta.secret = secret
+            meta.save(session=session)
+            secret_ids.append(secret.id)
+        session.commit()
+        session.expunge_all()
+
+        with database_utils.query_budget(max_queries=2):
+            db_secrets = self.repo.get_secrets_for_retrieval(
+                secret_ids + ['invalid_id'])
+
+            self.assertEqual(set(secret_ids), set(db_secrets))
+            for db_secret in db_secrets.values():
+                self.assertEqual('my keystone id',
+                                 db_secret.project.external_id)
+                self.assertEqual(
+                    'text/plain',
+                    db_secret.secret_store_metadata['content_type'].value)
+
     def test_should_raise_notfound_exception(self):
         self.assertRaises(exception.NotFound, self.repo.get_secret_by_id,
                           "invalid_id", suppress_exception=False)
@@ -123,11 +331,13 @@ class WhenTestingSecretRepository(database_utils.RepositoryTestCase):
         project_secret1 = models.ProjectSecret()
         project_secret1.secret_id = secret1.id
         project_secret1.project_id = project.id
+        secret1.project_id = project.id
         project_secret1.save(session=session)
 
         project_secret2 = models.ProjectSecret()
         project_secret2.secret_id = secret2.id
         project_secret2.project_id = project.id
+        secret2.project_id = project.id
         project_secret2.save(session=session)
 
         session.commit()
@@ -143,6 +353,32 @@ class WhenTestingSecretRepository(database_utils.RepositoryTestCase):
         self.assertEqual(limit, 10)
         self.assertEqual(total, 1)
 
+    def test_get_expired(self):
+        session = self.repo.get_session()
+        project = database_utils.create_project(session=session)
+        now = datetime.datetime.utcnow()
+
+        secrets = []
+        for hours in (-1, -2, 1, None):
+            secret = models.Secret()
+            secret.project_id = project.id
+            if hours is not None:
+                secret.expiration = now + datetime.timedelta(hours=hours)
+            secrets.append(self.repo.create_from(secret, session=session))
+        session.commit()
+
+        expired = self.repo.get_expired(10, session=session)
+
+        self.assertEqual([secrets[1].id, secrets[0].id],
+                         [s.id for s in expired])
+        self.assertEqual([secrets[1].id],
+                         [s.id for s in self.repo.get_expired(
+                             1, session=session)])
+        self.assertEqual([secrets[0].id],
+                         [s.id for s in self.repo.get_expired(
+                             10, exclude_ids=[secrets[1].id],
+                             session=session)])
+
     def test_get_by_create_date_nothing(self):
         session = self.repo.get_session()
         secrets, offset, limit, total = self.repo.get_by_create_date(
@@ -18,6 +18,7 @@ import os
 from Crypto.PublicKey import DSA
 from Crypto.PublicKey import RSA
 from Crypto.Util import asn1
+from cryptography import exceptions
 from cryptography import fernet
 import mock
 import six
@@ -114,6 +115,7 @@ class WhenTestingSimpleCryptoPlugin(utils.BaseTestCase):
 
         unencrypted = 'PlainTextSecret'
         encrypt_dto = plugin.EncryptDTO(unencrypted)
+        self.plugin.cipher = simple.FERNET
         response_dto = self.plugin.encrypt(encrypt_dto,
                                            kek_meta_dto,
                                            mock.MagicMock())
@@ -122,6 +124,50 @@ class WhenTestingSimpleCryptoPlugin(utils.BaseTestCase):
         decrypted = project_encryptor.decrypt(response_dto.cypher_text)
         self.assertEqual(unencrypted, decrypted)
 
+    def test_should_cache_unwrapped_kek(self):
+        kek_meta_dto = self._get_mocked_kek_meta_dto()
+        encrypt_dto = plugin.EncryptDTO(b'some_secret')
+
+        response_dto = self.plugin.encrypt(encrypt_dto, kek_meta_dto,
+                                           mock.MagicMock())
+        # The KEK, and the AES-256-GCM key derived from it.
+        self.assertEqual(2, len(self.plugin.kek_cache))
+
+        decrypted = self.plugin.decrypt(
+            plugin.DecryptDTO(response_dto.cypher_text), kek_meta_dto,
+            None, mock.MagicMock())
+        self.assertEqual(b'some_secret', decrypted)
+        self.assertEqual(2, len(self.plugin.kek_cache))
+
+    def test_should_wipe_unwrapped_kek_when_dropped(self):
+        kek_meta_dto = self._get_mocked_kek_meta_dto()
+        self.plugin.encrypt(plugin.EncryptDTO(b'some_secret'), kek_meta_dto,
+                            mock.MagicMock())
+        cache_key = list(self.plugin.kek_cache._entries)[0]
+        kek = self.plugin.kek_cache.get(cache_key)
+
+        self.plugin.kek_cache.clear()
+
+        self.assertEqual(bytearray(len(kek)), kek)
+
+    def test_should_not_cache_unwrapped_kek_when_disabled(self):
+        simple.CONF.set_override('kek_cache_size', 0,
+                                 group='simple_crypto_plugin')
+        self.addCleanup(simple.CONF.clear_override, 'kek_cache_size',
+                        group='simple_crypto_plugin')
+        crypto_plugin = simple.SimpleCryptoPlugin()
+        kek_meta_dto = self._get_mocked_kek_meta_dto()
+
+        response_dto = crypto_plugin.encrypt(
+            plugin.EncryptDTO(b'some_secret'), kek_meta_dto,
+            mock.MagicMock())
+
+        self.assertEqual(0, len(crypto_plugin.kek_cache))
+        decrypted = crypto_plugin.decrypt(
+            plugin.DecryptDTO(response_dto.cypher_text), kek_meta_dto,
+            None, mock.MagicMock())
+        self.assertEqual(b'some_secret', decrypted)
+
     def test_decrypt_kek_not_created(self):
         kek_meta_dto = mock.MagicMock()
         kek_meta_dto.plugin_meta = None
@@ -147,6 +193,73 @@ class WhenTestingSimpleCryptoPlugin(utils.BaseTestCase):
                                         mock.MagicMock())
         self.assertEqual(unencrypted, decrypted)
 
+    def test_batch_encryption_unwraps_kek_once(self):
+        simple.CONF.set_override('kek_cache_size', 0,
+                                 group='simple_crypto_plugin')
+        self.addCleanup(simple.CONF.clear_override, 'kek_cache_size',
+                        group='simple_crypto_plugin')
+        crypto_plugin = simple.SimpleCryptoPlugin()
+        unencrypted = [b'some_secret', b'other_secret']
+        kek_meta_dto = self._get_mocked_kek_meta_dto()
+
+        with mock.patch.object(crypto_plugin, '_get_kek',
+                               wraps=crypto_plugin._get_kek) as get_kek:
+            response_dtos = crypto_plugin.encrypt_batch(
+                [plugin.EncryptDTO(u) for u in unencrypted], kek_meta_dto,
+                mock.MagicMock())
+            decrypted = crypto_plugin.decrypt_batch(
+                [plugin.DecryptDTO(r.cypher_text) for r in response_dtos],
+                kek_meta_dto, [r.kek_meta_extended for r in response_dtos],
+                mock.MagicMock())
+
+        self.assertEqual(unencrypted, decrypted)
+        self.assertEqual(2, get_kek.call_count)
+
+    def test_should_encrypt_with_aes_256_gcm_by_default(self):
+        encrypt_dto = plugin.EncryptDTO(b'some_secret')
+        kek_meta_dto = self._get_mocked_kek_meta_dto()
+        response_dto = self.plugin.encrypt(encrypt_dto, kek_meta_dto,
+                                           mock.MagicMock())
+        self.assertEqual(b'\x01', response_dto.cypher_text[:1])
+
+        decrypted = self.plugin.decrypt(
+            plugin.DecryptDTO(response_dto.cypher_text), kek_meta_dto,
+            None, mock.MagicMock())
+        self.assertEqual(b'some_secret', decrypted)
+
+    def test_aes_256_gcm_is_shorter_than_fernet(self):
+        kek_meta_dto = self._get_mocked_kek_meta_dto()
+        gcm_dto = self.plugin.encrypt(plugin.EncryptDTO(b'some_secret'),
+                                      kek_meta_dto, mock.MagicMock())
+        self.plugin.cipher = simple.FERNET
+        fernet_dto = self.plugin.encrypt(plugin.EncryptDTO(b'some_secret'),
+                                         kek_meta_dto, mock.MagicMock())
+        self.assertLess(len(gcm_dto.cypher_text),
+                        len(fernet_dto.cypher_text))
+
+    def test_should_decrypt_fernet_secrets_with_aes_256_gcm(self):
+        kek_meta_dto = self._get_mocked_kek_meta_dto()
+        self.plugin.cipher = simple.FERNET
+        response_dto = self.plugin.encrypt(plugin.EncryptDTO(b'some_secret'),
+                                           kek_meta_dto, mock.MagicMock())
+        self.plugin.cipher = simple.AES_256_GCM
+
+        decrypted = self.plugin.decrypt(
+            plugin.DecryptDTO(response_dto.cypher_text), kek_meta_dto,
+            None, mock.MagicMock())
+        self.assertEqual(b'some_secret', decrypted)
+
+    def test_should_not_decrypt_tampered_aes_256_gcm_secret(self):
+        kek_meta_dto = self._get_mocked_kek_meta_dto()
+        response_dto = self.plugin.encrypt(plugin.EncryptDTO(b'some_secret'),
+                                           kek_meta_dto, mock.MagicMock())
+        cypher_text = bytearray(response_dto.cypher_text)
+        cypher_text[-1] ^= 1
+
+        self.assertRaises(exceptions.InvalidTag, self.plugin.decrypt,
+                          plugin.DecryptDTO(bytes(cypher_text)),
+                          kek_meta_dto, None, mock.MagicMock())
+
     def test_random_bytes_encryption(self):
         unencrypted = os.urandom(10)
         encrypt_dto = plugin.EncryptDTO(unencrypted)
@@ -395,3 +508,26 @@ class WhenTestingSimpleCryptoPlugin(utils.BaseTestCase):
                                   response_dto.kek_meta_extended,
                                   mock.MagicMock())
         self.assertEqual(len(key), 16)
+
+
+class WhenTestingCryptoPluginBase(utils.BaseTestCase):
+
+    def setUp(self):
+        super(WhenTestingCryptoPluginBase, self).setUp()
+        self.plugin = TestCryptoPlugin()
+
+    def test_encrypt_batch_encrypts_each_secret(self):
+        response_dtos = self.plugin.encrypt_batch(
+            [plugin.EncryptDTO(b'one'), plugin.EncryptDTO(b'two')],
+            mock.MagicMock(), mock.MagicMock())
+
+        self.assertEqual([b'cypher_text', b'cypher_text'],
+                         [r.cypher_text for r in response_dtos])
+
+    def test_decrypt_batch_decrypts_each_secret(self):
+        decrypted = self.plugin.decrypt_batch(
+            [plugin.DecryptDTO(b'one'), plugin.DecryptDTO(b'two')],
+            mock.MagicMock(), [None, None], mock.MagicMock())
+
+        self.assertEqual([b'unencrypted_data', b'unencrypted_data'],
+                         decrypted)
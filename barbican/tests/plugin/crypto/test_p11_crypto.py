@@ -15,6 +15,7 @@
 
 import base64
 import json
+import threading
 
 import mock
 
@@ -44,6 +45,8 @@ class WhenTestingP11CryptoPlugin(utils.BaseTestCase):
         self.lib.C_FindObjectsFinal.return_value = pkcs11.CKR_OK
         self.lib.C_GenerateKey.return_value = pkcs11.CKR_OK
         self.lib.C_Login.return_value = pkcs11.CKR_OK
+        self.lib.C_GetSessionInfo.return_value = pkcs11.CKR_OK
+        self.lib.C_DestroyObject.return_value = pkcs11.CKR_OK
         self.lib.C_GenerateRandom.side_effect = write_random_first_byte
         self.ffi = pkcs11.build_ffi()
         setattr(self.ffi, 'dlopen', lambda x: self.lib)
@@ -53,6 +56,11 @@ class WhenTestingP11CryptoPlugin(utils.BaseTestCase):
         self.cfg_mock.p11_crypto_plugin.hmac_label = "hmac"
         self.cfg_mock.p11_crypto_plugin.mkek_length = 32
         self.cfg_mock.p11_crypto_plugin.slot_id = 1
+        self.cfg_mock.p11_crypto_plugin.session_pool_size = 1
+        self.cfg_mock.p11_crypto_plugin.session_check_interval = 60
+        self.cfg_mock.p11_crypto_plugin.session_max_open = 0
+        self.cfg_mock.p11_crypto_plugin.session_wait_timeout = 30
+        self.cfg_mock.p11_crypto_plugin.unwrapped_key_cache_size = 2
         with mock.patch.object(pkcs11.PKCS11, 'get_key_handle') as mocked:
             mocked.return_value = long(1)
             self.plugin = p11_crypto.P11CryptoPlugin(
@@ -142,6 +150,131 @@ class WhenTestingP11CryptoPlugin(utils.BaseTestCase):
             self.assertEqual(self.lib.C_Encrypt.call_count, 1)
             self.assertEqual(response_dto.cypher_text, b"\x00" * 32)
 
+    def test_encrypt_batch_unwraps_key_once(self):
+        self.lib.C_EncryptInit.return_value = pkcs11.CKR_OK
+        self.lib.C_Encrypt.return_value = pkcs11.CKR_OK
+        encrypt_dtos = [plugin_import.EncryptDTO('encrypt me!!'),
+                        plugin_import.EncryptDTO('and me!!')]
+        with mock.patch.object(self.plugin.pkcs11, 'unwrap_key') as key_mock:
+            response_dtos = self.plugin.encrypt_batch(encrypt_dtos,
+                                                      mock.MagicMock(),
+                                                      mock.MagicMock())
+
+            self.assertEqual(1, key_mock.call_count)
+        self.assertEqual(2, len(response_dtos))
+        self.assertEqual(2, self.lib.C_Encrypt.call_count)
+
+    def test_encrypt_reuses_pooled_session(self):
+        self.lib.C_EncryptInit.return_value = pkcs11.CKR_OK
+        self.lib.C_Encrypt.return_value = pkcs11.CKR_OK
+        encrypt_dto = plugin_import.EncryptDTO('encrypt me!!')
+        open_count = self.lib.C_OpenSession.call_count
+        with mock.patch.object(self.plugin.pkcs11, 'unwrap_key'):
+            self.plugin.encrypt(encrypt_dto, mock.MagicMock(),
+                                mock.MagicMock())
+            self.plugin.encrypt(encrypt_dto, mock.MagicMock(),
+                                mock.MagicMock())
+
+        self.assertEqual(open_count, self.lib.C_OpenSession.call_count)
+        self.assertEqual(1, len(self.plugin.pkcs11._idle_sessions))
+
+    def test_encrypt_retries_with_new_session_when_session_invalid(self):
+        self.lib.C_EncryptInit.return_value = pkcs11.CKR_OK
+        self.lib.C_Encrypt.side_effect = [pkcs11.CKR_SESSION_HANDLE_INVALID,
+                                          pkcs11.CKR_OK]
+        encrypt_dto = plugin_import.EncryptDTO('encrypt me!!')
+        open_count = self.lib.C_OpenSession.call_count
+        with mock.patch.object(self.plugin.pkcs11, 'unwrap_key'):
+            self.plugin.encrypt(encrypt_dto, mock.MagicMock(),
+                                mock.MagicMock())
+
+        self.assertEqual(2, self.lib.C_Encrypt.call_count)
+        self.assertEqual(open_count + 1, self.lib.C_OpenSession.call_count)
+
+    def test_encrypt_closes_session_on_error(self):
+        self.lib.C_EncryptInit.return_value = pkcs11.CKR_OK
+        self.lib.C_Encrypt.return_value = 0x21  # CKR_DATA_LEN_RANGE
+        encrypt_dto = plugin_import.EncryptDTO('encrypt me!!')
+        with mock.patch.object(self.plugin.pkcs11, 'unwrap_key'):
+            self.assertRaises(pkcs11.P11CryptoPluginException,
+                              self.plugin.encrypt, encrypt_dto,
+                              mock.MagicMock(), mock.MagicMock())
+
+        self.assertEqual(1, self.lib.C_Encrypt.call_count)
+        self.assertEqual(0, len(self.plugin.pkcs11._idle_sessions))
+
+    def test_return_session_closes_sessions_beyond_pool_size(self):
+        close_count = self.lib.C_CloseSession.call_count
+
+        self.plugin.pkcs11.return_session(self.test_session)
+
+        self.assertEqual(close_count + 1, self.lib.C_CloseSession.call_count)
+
+    @mock.patch('time.time')
+    def test_get_session_replaces_unusable_idle_session(self, mock_time):
+        mock_time.return_value = 1000
+        self.plugin.pkcs11.discard_idle_sessions()
+        self.plugin.pkcs11.return_session(self.test_session)
+        self.lib.C_GetSessionInfo.return_value = (
+            pkcs11.CKR_SESSION_HANDLE_INVALID)
+        open_count = self.lib.C_OpenSession.call_count
+
+        mock_time.return_value = 1030
+        self.plugin.pkcs11.get_session()
+        self.assertEqual(open_count, self.lib.C_OpenSession.call_count)
+
+        self.plugin.pkcs11.return_session(self.test_session)
+        mock_time.return_value = 1100
+        self.plugin.pkcs11.get_session()
+        self.assertEqual(open_count + 1, self.lib.C_OpenSession.call_count)
+
+    def test_get_session_times_out_when_max_sessions_open(self):
+        p11 = self.plugin.pkcs11
+        p11.discard_idle_sessions()
+        p11.session_max_open = 1
+        p11.session_wait_timeout = 0
+        session = p11.get_session()
+
+        self.assertRaises(pkcs11.P11CryptoPluginException, p11.get_session)
+
+        p11.return_session(session)
+        self.assertEqual(session, p11.get_session())
+
+    def test_get_session_waits_for_returned_session(self):
+        p11 = self.plugin.pkcs11
+        p11.discard_idle_sessions()
+        p11.session_max_open = 1
+        p11.session_wait_timeout = 5
+        session = p11.get_session()
+
+        returner = threading.Timer(0.1, p11.return_session, [session])
+        returner.start()
+        self.addCleanup(returner.join)
+
+        self.assertEqual(session, p11.get_session())
+
+    def test_closed_sessions_make_room_for_new_ones(self):
+        p11 = self.plugin.pkcs11
+        p11.discard_idle_sessions()
+        p11.session_max_open = 1
+        p11.session_wait_timeout = 0
+        open_count = self.lib.C_OpenSession.call_count
+        self.lib.C_EncryptInit.return_value = pkcs11.CKR_OK
+        self.lib.C_Encrypt.return_value = 0x21  # CKR_DATA_LEN_RANGE
+        encrypt_dto = plugin_import.EncryptDTO('encrypt me!!')
+        with mock.patch.object(p11, 'unwrap_key'):
+            self.assertRaises(pkcs11.P11CryptoPluginException,
+                              self.plugin.encrypt, encrypt_dto,
+                              mock.MagicMock(), mock.MagicMock())
+
+        p11.get_session()
+        self.assertEqual(open_count + 2, self.lib.C_OpenSession.call_count)
+
+    def test_login_when_already_logged_in(self):
+        self.lib.C_Login.return_value = pkcs11.CKR_USER_ALREADY_LOGGED_IN
+
+        self.plugin.pkcs11.login('mypassword', self.test_session)
+
     def test_decrypt(self):
         def c_decrypt(session, ct, ctlen, pt, ptlen):
             pt[ptlen[0] - 1] = 1
@@ -161,6 +294,27 @@ class WhenTestingP11CryptoPlugin(utils.BaseTestCase):
                                 mock.MagicMock())
             self.assertEqual(self.lib.C_Decrypt.call_count, 1)
 
+    def test_decrypt_batch_unwraps_key_once(self):
+        def c_decrypt(session, ct, ctlen, pt, ptlen):
+            pt[ptlen[0] - 1] = 1
+            return pkcs11.CKR_OK
+
+        self.lib.C_Decrypt.side_effect = c_decrypt
+        self.lib.C_DecryptInit.return_value = pkcs11.CKR_OK
+        ct = b"somedatasomedatasomedatasomedata"
+        kek_meta_extended = '{"iv": "AQIDBAUGBwgJCgsMDQ4PEA=="}'
+
+        with mock.patch.object(self.plugin.pkcs11, 'unwrap_key') as key_mock:
+            decrypted = self.plugin.decrypt_batch(
+                [plugin_import.DecryptDTO(ct), plugin_import.DecryptDTO(ct)],
+                mock.MagicMock(),
+                [kek_meta_extended, kek_meta_extended],
+                mock.MagicMock())
+
+            self.assertEqual(1, key_mock.call_count)
+        self.assertEqual(2, len(decrypted))
+        self.assertEqual(2, self.lib.C_Decrypt.call_count)
+
     def test_generate_wrapped_kek(self):
         self.lib.C_GenerateKey.return_value = pkcs11.CKR_OK
         self.lib.C_WrapKey.return_value = pkcs11.CKR_OK
@@ -170,6 +324,7 @@ class WhenTestingP11CryptoPlugin(utils.BaseTestCase):
         self.assertEqual(self.lib.C_WrapKey.call_count, 1)
         self.assertEqual(self.lib.C_SignInit.call_count, 1)
         self.assertEqual(self.lib.C_Sign.call_count, 1)
+        self.assertEqual(self.lib.C_DestroyObject.call_count, 1)
 
     def test_bind_kek_metadata_without_existing_key(self):
         with mock.patch.object(self.plugin.pkcs11, 'generate_wrapped_kek'):
@@ -220,6 +375,42 @@ class WhenTestingP11CryptoPlugin(utils.BaseTestCase):
         self.assertEqual(self.lib.C_UnwrapKey.call_count, 1)
         self.assertEqual(self.lib.C_Verify.call_count, 1)
 
+    def _unwrap_keys(self, count, session):
+        self.lib.C_UnwrapKey.return_value = pkcs11.CKR_OK
+        self.lib.C_VerifyInit.return_value = pkcs11.CKR_OK
+        self.lib.C_Verify.return_value = pkcs11.CKR_OK
+        for i in range(count):
+            plugin_meta = {
+                'iv': base64.b64encode(b"\x00" * 16),
+                'hmac': base64.b64encode(b"\x00" * 32),
+                'wrapped_key': base64.b64encode(chr(i) * 48),
+                'mkek_label': 'mkek',
+                'hmac_label': 'hmac',
+            }
+            self.plugin.pkcs11.unwrap_key(json.dumps(plugin_meta), session)
+
+    def test_unwrap_key_reuses_key_unwrapped_in_session(self):
+        self._unwrap_keys(1, self.test_session)
+        self._unwrap_keys(1, self.test_session)
+
+        self.assertEqual(self.lib.C_UnwrapKey.call_count, 1)
+        self.assertEqual(self.lib.C_Verify.call_count, 1)
+        self.assertEqual(self.lib.C_DestroyObject.call_count, 0)
+
+    def test_unwrap_key_destroys_evicted_keys(self):
+        self._unwrap_keys(3, self.test_session)
+
+        self.assertEqual(self.lib.C_UnwrapKey.call_count, 3)
+        self.assertEqual(self.lib.C_DestroyObject.call_count, 1)
+
+    def test_unwrap_key_unwraps_again_after_session_closed(self):
+        self._unwrap_keys(1, self.test_session)
+        self.plugin.pkcs11.close_session(self.test_session)
+        self._unwrap_keys(1, self.test_session)
+
+        self.assertEqual(self.lib.C_UnwrapKey.call_count, 2)
+        self.assertEqual(self.lib.C_DestroyObject.call_count, 0)
+
     def test_generate_asymmetric_raises_error(self):
         self.assertRaises(NotImplementedError,
                           self.plugin.generate_asymmetric,
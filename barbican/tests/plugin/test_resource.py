@@ -60,6 +60,11 @@ class WhenTestingPluginResource(testtools.TestCase,
         self.moc_plugin_manager = self.moc_plugin_patcher.start()
         self.addCleanup(self.moc_plugin_patcher.stop)
 
+        deferred_flush_patcher = mock.patch(
+            'barbican.model.repositories.deferred_flush')
+        self.deferred_flush = deferred_flush_patcher.start()
+        self.addCleanup(deferred_flush_patcher.stop)
+
         self.setup_project_repository_mock()
 
         self.secret_repo = mock.MagicMock()
@@ -105,6 +110,32 @@ class WhenTestingPluginResource(testtools.TestCase,
         self.assertEqual(spec['bit_length'], dto.key_spec.bit_length)
         self.assertEqual(self.content_type, dto.content_type)
 
+    def _store_secrets(self, count):
+        spec = {'algorithm': 'AES', 'bit_length': 256,
+                'secret_type': 'symmetric'}
+        secret = base64.b64encode('ABCDEFABCDEFABCDEFABCDEF')
+        new_secrets = [(models.Secret(spec), secret, self.content_type,
+                        'base64') for _ in range(count)]
+        return self.plugin_resource.store_secrets(new_secrets,
+                                                  self.project_model)
+
+    def test_store_secrets_deletes_stored_secrets_on_failure(self):
+        self.moc_plugin.store_secret.side_effect = [
+            {'key_id': 'first'}, ValueError()]
+
+        self.assertRaises(ValueError, self._store_secrets, 2)
+
+        self.moc_plugin.delete_secret.assert_called_once_with(
+            {'key_id': 'first'})
+
+    def test_store_secrets_raises_original_error_if_delete_fails(self):
+        self.secret_repo.create_from.side_effect = ValueError()
+        self.moc_plugin.delete_secret.side_effect = KeyError()
+
+        self.assertRaises(ValueError, self._store_secrets, 2)
+
+        self.assertEqual(2, self.moc_plugin.delete_secret.call_count)
+
     @utils.parameterized_dataset({
         'general_secret_store': {
             'moc_plugin': None
@@ -181,6 +212,7 @@ class WhenTestingPluginResource(testtools.TestCase,
                          create_from.call_count, 1)
         self.assertEqual(self.container_secret_repo.
                          create_from.call_count, 3)
+        self.deferred_flush.assert_called_once_with()
 
     def test_generate_asymmetric_without_passphrase(self):
         """test asymmetric secret generation without passphrase."""
@@ -217,6 +249,32 @@ class WhenTestingPluginResource(testtools.TestCase,
         self.secret_repo.delete_entity_by_id.assert_called_once_with(
             entity_id=secret_model.id, external_project_id=project_id)
 
+    def test_delete_expired_secret(self):
+        secret_model = mock.MagicMock()
+        secret_meta = mock.MagicMock()
+        self.secret_meta_repo.get_metadata_for_secret.return_value = (
+            secret_meta)
+
+        self.plugin_resource.delete_expired_secret(secret_model)
+
+        self.moc_plugin.delete_secret.assert_called_once_with(secret_meta)
+        self.secret_repo.delete_entity.assert_called_once_with(secret_model)
+        self.assertFalse(self.secret_repo.delete_entity_by_id.called)
+
+    def test_delete_secret_already_deleted_from_plugin(self):
+        project_id = "some_id"
+        secret_model = mock.MagicMock()
+        self.secret_meta_repo.get_metadata_for_secret.return_value = (
+            mock.MagicMock())
+        self.moc_plugin.delete_secret.side_effect = (
+            secret_store.SecretNotFoundException())
+
+        self.plugin_resource.delete_secret(secret_model=secret_model,
+                                           project_id=project_id)
+
+        self.secret_repo.delete_entity_by_id.assert_called_once_with(
+            entity_id=secret_model.id, external_project_id=project_id)
+
     def test_delete_secret_w_out_metadata(self):
         project_id = "some_id"
         secret_model = mock.MagicMock()
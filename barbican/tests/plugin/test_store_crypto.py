@@ -225,6 +225,29 @@ class WhenTestingStoreCrypto(TestSecretStoreBase):
         self.assertEqual(self.kek_meta_dto, test_kek_meta_dto)
         self.assertEqual(self.project_id, test_project_id)
 
+    @mock.patch('barbican.model.repositories.deferred_flush')
+    def test_store_secrets_encrypts_secrets_in_one_batch(self,
+                                                         deferred_flush):
+        self.encrypting_plugin.encrypt_batch.return_value = [
+            self.response_dto, self.response_dto]
+        other_context = store_crypto.StoreCryptoContext(
+            self.project_model, secret_model=models.Secret())
+
+        response = self.plugin_to_test.store_secrets(
+            [self.secret_dto, self.secret_dto], [self.context, other_context])
+
+        self.assertEqual([None, None], response)
+        self.assertEqual(0, self.encrypting_plugin.encrypt.call_count)
+        self.assertEqual(1, self.encrypting_plugin.encrypt_batch.call_count)
+        args, kwargs = self.encrypting_plugin.encrypt_batch.call_args
+        test_encrypt_dtos, test_kek_meta_dto, test_project_id = tuple(args)
+        self.assertEqual(['secret', 'secret'],
+                         [d.unencrypted for d in test_encrypt_dtos])
+        self.assertEqual(self.kek_meta_dto, test_kek_meta_dto)
+        self.assertEqual(self.project_id, test_project_id)
+        self.assertEqual(2, store_crypto._store_secret_and_datum.call_count)
+        self.assertEqual(self.content_type, other_context.content_type)
+
     def test_get_secret(self):
         """Test getting a secret."""
 
@@ -275,6 +298,49 @@ class WhenTestingStoreCrypto(TestSecretStoreBase):
 
         self.assertEqual(self.project_id, test_project_id)
 
+    def test_get_secrets_decrypts_secrets_of_a_kek_in_one_batch(self):
+        self.retrieving_plugin.decrypt_batch.return_value = [
+            'first_secret', 'second_secret']
+        no_data_context = store_crypto.StoreCryptoContext(
+            self.project_model, secret_model=models.Secret())
+
+        results = self.plugin_to_test.get_secrets(
+            [self.context, no_data_context, self.context])
+
+        self.assertEqual(3, len(results))
+        self.assertEqual(base64.b64encode('first_secret'),
+                         results[0].secret)
+        self.assertIsInstance(results[1],
+                              secret_store.SecretNotFoundException)
+        self.assertEqual(base64.b64encode('second_secret'),
+                         results[2].secret)
+
+        self.assertEqual(1, self.retrieving_plugin.decrypt_batch.call_count)
+        self.assertEqual(0, self.retrieving_plugin.decrypt.call_count)
+        args, kwargs = self.retrieving_plugin.decrypt_batch.call_args
+        (
+            test_decrypts,
+            test_kek_meta,
+            test_kek_meta_extended_list,
+            test_project_id
+        ) = tuple(args)
+        self.assertEqual(2, len(test_decrypts))
+        self.assertEqual(['extended_meta', 'extended_meta'],
+                         test_kek_meta_extended_list)
+        self.assertEqual(self.project_id, test_project_id)
+
+    def test_get_secrets_decrypts_one_by_one_when_batch_fails(self):
+        self.retrieving_plugin.decrypt_batch.side_effect = ValueError()
+        self.retrieving_plugin.decrypt.side_effect = [
+            ValueError(), self.decrypted_secret]
+
+        results = self.plugin_to_test.get_secrets(
+            [self.context, self.context])
+
+        self.assertIsInstance(results[0], ValueError)
+        self.assertEqual(base64.b64encode(self.decrypted_secret),
+                         results[1].secret)
+
     @test_utils.parameterized_dataset(dataset_for_pem)
     def test_get_secret_encoding(self, input_secret_dto):
         """Test getting a secret that should be returend in PEM format."""
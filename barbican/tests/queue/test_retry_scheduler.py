@@ -113,6 +113,73 @@ class WhenRunningPeriodicServerRetryLogic(database_utils.RepositoryTestCase):
             suppress_exception=True)
         self.assertEqual(1, total)
 
+    def test_should_delete_expired_secrets(self):
+        project = database_utils.create_project()
+        now = datetime.datetime.utcnow()
+        expired_id = self._create_secret(
+            project, now - datetime.timedelta(hours=1))
+        unexpired_id = self._create_secret(
+            project, now + datetime.timedelta(hours=1))
+        database_utils.get_session().commit()
+
+        self.periodic_server._sweep_expired_secrets()
+
+        secret_repo = repositories.get_secret_repository()
+        self.assertIsNotNone(secret_repo.get_secret_by_id(
+            unexpired_id, suppress_exception=True))
+        self.assertEqual([], secret_repo.get_expired(10))
+        self.assertTrue(database_utils.get_session().query(
+            models.Secret).get(expired_id).deleted)
+
+    @mock.patch('barbican.plugin.resources.delete_expired_secret')
+    def test_should_continue_sweep_past_failures(self, mock_delete):
+        mock_delete.side_effect = [Exception(), None]
+        project = database_utils.create_project()
+        expiration = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+        self._create_secret(project, expiration)
+        self._create_secret(project, expiration)
+        database_utils.get_session().commit()
+
+        self.periodic_server._sweep_expired_secrets()
+
+        self.assertEqual(2, mock_delete.call_count)
+
+    @mock.patch('barbican.plugin.resources.delete_expired_secret')
+    def test_should_skip_recently_failed_secrets(self, mock_delete):
+        mock_delete.side_effect = Exception()
+        project = database_utils.create_project()
+        expiration = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+        failed_id = self._create_secret(project, expiration)
+        database_utils.get_session().commit()
+
+        self.periodic_server._sweep_expired_secrets()
+        self.periodic_server._sweep_expired_secrets()
+
+        self.assertEqual(1, mock_delete.call_count)
+        self.assertIn(failed_id, self.periodic_server.sweep_retry_times)
+
+    @mock.patch('barbican.plugin.resources.delete_expired_secret')
+    def test_should_retry_failed_secrets_later(self, mock_delete):
+        mock_delete.side_effect = [Exception(), None]
+        project = database_utils.create_project()
+        expiration = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+        failed_id = self._create_secret(project, expiration)
+        database_utils.get_session().commit()
+
+        self.periodic_server._sweep_expired_secrets()
+        self.periodic_server.sweep_retry_times[failed_id] = 0
+        self.periodic_server._sweep_expired_secrets()
+
+        self.assertEqual(2, mock_delete.call_count)
+        self.assertEqual({}, self.periodic_server.sweep_retry_times)
+
+    def _create_secret(self, project, expiration):
+        secret = models.Secret()
+        secret.project_id = project.id
+        secret.expiration = expiration
+        repositories.get_secret_repository().create_from(secret)
+        return secret.id
+
     def _create_retry_task(self):
         # Add one retry task:
         task = 'test_task'
@@ -200,6 +267,10 @@ class _PeriodicServerStub(retry_scheduler.PeriodicServer):
 
         return NEXT_RETRY_SECONDS
 
+    def _sweep_expired_secrets(self):
+        """Override the sweeper, which these tests do not track."""
+        return 60.0
+
 
 class _DatabasePatcherHelper(object):
     """This test suite does not test database interactions, so just stub it."""
@@ -172,6 +172,7 @@ class BaseCertificateRequestsTestCase(utils.BaseTestCase):
         ps = models.ProjectSecret()
         ps.project_id = self.project.id
         ps.secret_id = self.private_key.id
+        self.private_key.project_id = self.project.id
         project_secret_repo.save(ps)
 
         self.public_key = models.Secret()
@@ -189,6 +190,7 @@ class BaseCertificateRequestsTestCase(utils.BaseTestCase):
         ps = models.ProjectSecret()
         ps.project_id = self.project.id
         ps.secret_id = self.passphrase.id
+        self.passphrase.project_id = self.project.id
         project_secret_repo.save(ps)
 
         self.parsed_container_with_passphrase = {
@@ -341,18 +341,53 @@ class WhenUsingKeystoneEventConsumerProcessMethod(
         self.assertEqual(self.project_id1, kwargs['project_id'])
         self.assertEqual('project', kwargs['resource_type'])
         self.assertEqual('deleted', kwargs['operation_type'])
-        # Make sure entities are still present after rollback
+        # Entities deleted in bulk were committed chunk by chunk, so only
+        # the project itself is still present after rollback
         db_secrets = secret_repo.get_project_entities(project1_id)
-        self.assertEqual(1, len(db_secrets))
-        self.assertEqual(secret_id, db_secrets[0].id)
+        self.assertEqual(0, len(db_secrets))
+        self.assertRaises(exception.NotFound, secret_repo.get,
+                          entity_id=secret_id,
+                          external_project_id=self.project_id1)
 
         db_project_secret = project_secret_repo.get_project_entities(
             project1_id)
-        self.assertEqual(1, len(db_project_secret))
+        self.assertEqual(0, len(db_project_secret))
 
         db_kek = kek_repo.get_project_entities(project1_id)
-        self.assertEqual(1, len(db_kek))
+        self.assertEqual(0, len(db_kek))
 
         project_repo = rep.get_project_repository()
         db_project = project_repo.get_project_entities(project1_id)
         self.assertEqual(1, len(db_project))
+
+    @mock.patch.object(consumer.KeystoneEventConsumer, 'handle_success')
+    def test_existing_project_entities_cleanup_in_chunks(
+            self, mock_handle_success):
+        self._init_memory_db_setup()
+        rep.CONF.set_override('project_cleanup_chunk_size', 2)
+        self.addCleanup(rep.CONF.clear_override,
+                        'project_cleanup_chunk_size')
+
+        secret_ids = [self._create_secret_for_project(self.project1_data).id
+                      for _ in range(5)]
+        other_secret = self._create_secret_for_project(self.project2_data)
+        project1_id = self.project1_data.id
+        project2_id = self.project2_data.id
+        rep.commit()
+
+        self.task.process(project_id=self.project_id1,
+                          resource_type='project',
+                          operation_type='deleted')
+
+        secret_repo = rep.get_secret_repository()
+        for secret_id in secret_ids:
+            self.assertRaises(exception.NotFound, secret_repo.get,
+                              entity_id=secret_id,
+                              external_project_id=self.project_id1)
+        self.assertEqual(
+            0, len(secret_repo.get_project_entities(project1_id)))
+
+        # Other projects' secrets are left alone
+        db_secrets = secret_repo.get_project_entities(project2_id)
+        self.assertEqual(1, len(db_secrets))
+        self.assertEqual(other_secret.id, db_secrets[0].id)
@@ -27,6 +27,7 @@ class DatabaseManager:
         self.add_upgrade_args()
         self.add_history_args()
         self.add_current_args()
+        self.add_purge_args()
 
     def get_main_parser(self):
         """Create top-level parser and arguments."""
@@ -88,6 +89,28 @@ class DatabaseManager:
                                         'revision.')
         create_parser.set_defaults(func=self.current)
 
+    def add_purge_args(self):
+        """Create 'purge' command parser and arguments."""
+        create_parser = self.subparsers.add_parser(
+            'purge',
+            help='Permanently delete rows soft deleted a while ago.')
+        create_parser.add_argument('--age-in-days', '-a', type=int,
+                                   default=90,
+                                   help='purge rows soft deleted more than '
+                                        'this many days ago.')
+        create_parser.add_argument('--chunk-size', '-c', type=int,
+                                   default=1000,
+                                   help='the number of rows deleted per '
+                                        'transaction.')
+        create_parser.add_argument('--sleep', '-s', type=float, default=0,
+                                   help='seconds to pause between '
+                                        'transactions, to limit the load on '
+                                        'the database.')
+        create_parser.add_argument('--dry-run', action="store_true",
+                                   help='only count the rows that would be '
+                                        'purged.')
+        create_parser.set_defaults(func=self.purge)
+
     def revision(self, args):
         """Process the 'revision' Alembic command."""
         commands.generate(autogenerate=args.autogenerate,
@@ -108,6 +131,15 @@ class DatabaseManager:
     def current(self, args):
         commands.current(args.verbose, sql_url=args.dburl)
 
+    def purge(self, args):
+        """Purge rows soft deleted over args.age_in_days ago."""
+        stats = commands.purge(args.age_in_days, args.chunk_size,
+                               sleep_interval=args.sleep,
+                               dry_run=args.dry_run, sql_url=args.dburl)
+        action = 'would be purged' if args.dry_run else 'purged'
+        for table_name, count in stats.items():
+            print('{0}: {1} rows {2}'.format(table_name, count, action))
+
     def execute(self):
         """Parse the command line arguments."""
         args = self.parser.parse_args()